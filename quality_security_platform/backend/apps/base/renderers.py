@@ -0,0 +1,19 @@
+import json
+from rest_framework.renderers import BaseRenderer
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Server-Sent Events：让 Accept: text/event-stream 的请求通过内容协商，
+    正常响应由视图直接返回 StreamingHttpResponse，错误响应（404/403 等）按 JSON 文本输出
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, bytes):
+            return data
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Pipeline, PipelineStage, BuildRecord, BuildStageRecord
+from .models import Pipeline, PipelineStage, BuildRecord, BuildStageRecord, BuildLogChunk, StageCacheEntry, BuildEvent, PipelineHealthRollup, ArchivedBuild
 
 
 @admin.register(Pipeline)
@@ -17,7 +17,7 @@ class PipelineAdmin(admin.ModelAdmin):
 
 @admin.register(PipelineStage)
 class PipelineStageAdmin(admin.ModelAdmin):
-    list_display = ('id', 'pipeline', 'name', 'order', 'timeout')
+    list_display = ('id', 'pipeline', 'name', 'order', 'timeout', 'cache_enabled')
     search_fields = ('pipeline__name', 'name')
     list_filter = ('pipeline',)
     ordering = ('pipeline', 'order')
@@ -25,9 +25,9 @@ class PipelineStageAdmin(admin.ModelAdmin):
 
 @admin.register(BuildRecord)
 class BuildRecordAdmin(admin.ModelAdmin):
-    list_display = ('id', 'build_id', 'pipeline', 'version', 'status', 'triggered_by', 'started_at', 'finished_at', 'duration', 'created_at')
-    search_fields = ('build_id', 'pipeline__name', 'version', 'status')
-    list_filter = ('pipeline', 'status', 'triggered_by')
+    list_display = ('id', 'build_id', 'pipeline', 'version', 'status', 'priority', 'trigger_count', 'triggered_by', 'dispatched_at', 'started_at', 'finished_at', 'duration', 'created_at')
+    search_fields = ('build_id', 'pipeline__name', 'version', 'status', 'external_id')
+    list_filter = ('pipeline', 'status', 'priority', 'triggered_by')
     ordering = ('-created_at',)
     
     def save_model(self, request, obj, form, change):
@@ -38,7 +38,49 @@ class BuildRecordAdmin(admin.ModelAdmin):
 
 @admin.register(BuildStageRecord)
 class BuildStageRecordAdmin(admin.ModelAdmin):
-    list_display = ('id', 'build', 'stage', 'status', 'started_at', 'finished_at')
+    list_display = ('id', 'build', 'stage', 'status', 'cached', 'started_at', 'finished_at')
     search_fields = ('build__build_id', 'stage__name', 'status')
-    list_filter = ('build__pipeline', 'stage', 'status')
+    list_filter = ('build__pipeline', 'stage', 'status', 'cached')
     ordering = ('build', 'stage__order')
+
+
+@admin.register(BuildLogChunk)
+class BuildLogChunkAdmin(admin.ModelAdmin):
+    list_display = ('id', 'build', 'seq', 'offset', 'length', 'compressed', 'created_at')
+    search_fields = ('build__build_id',)
+    list_filter = ('compressed',)
+    ordering = ('build', 'seq')
+    exclude = ('data',)
+
+
+@admin.register(StageCacheEntry)
+class StageCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'pipeline', 'stage', 'version', 'duration', 'hit_count', 'source_build', 'created_at', 'last_used_at')
+    search_fields = ('key', 'pipeline__name', 'stage__name', 'version')
+    list_filter = ('pipeline',)
+    ordering = ('-last_used_at',)
+
+
+@admin.register(BuildEvent)
+class BuildEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'build', 'type', 'stage', 'status', 'occurred_at')
+    search_fields = ('build__build_id', 'stage__name')
+    list_filter = ('type', 'status')
+    ordering = ('-id',)
+
+
+@admin.register(PipelineHealthRollup)
+class PipelineHealthRollupAdmin(admin.ModelAdmin):
+    list_display = ('id', 'granularity', 'bucket', 'pipeline', 'project', 'total', 'success', 'failed', 'aborted', 'updated_at')
+    search_fields = ('pipeline__name', 'project__name')
+    list_filter = ('granularity', 'project')
+    ordering = ('granularity', '-bucket')
+    exclude = ('duration_sketch',)
+
+
+@admin.register(ArchivedBuild)
+class ArchivedBuildAdmin(admin.ModelAdmin):
+    list_display = ('id', 'build_id', 'pipeline_name', 'version', 'status', 'created_at', 'file', 'archived_at')
+    search_fields = ('build_id', 'pipeline_name', 'version')
+    list_filter = ('status',)
+    ordering = ('-created_at',)
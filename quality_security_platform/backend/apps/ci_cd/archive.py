@@ -0,0 +1,193 @@
+"""
+构建归档：超过保留天数的已结束构建（每条流水线保留最近 N 个）连同阶段记录、事件和日志块导出到冷存储，再从热表分批删除
+
+归档文件按 流水线 / 构建创建月份 存放（<归档目录>/<流水线主键>/<YYYY-MM>.jsonl.gz），每个构建是一行 JSON，
+单独压缩为一个 gzip 成员追加到文件末尾（逐个构建流式写入，日志块分批读取）：整个文件仍可用 zcat 按 JSONL 读取，ArchivedBuild 记录每个构建的偏移和长度，
+读取单个构建只需定位并解压一个成员。文件写入并 fsync 后才在同一事务中写索引、删热表，中途失败最多留下无索引的冗余字节
+"""
+import fcntl
+import gzip
+import json
+import os
+import zlib
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from .models import ArchivedBuild, BuildEvent, BuildLogChunk, BuildRecord, BuildStageRecord, Pipeline, PipelineStage
+from .buildlog import ACTIVE_STATUSES
+
+DEFAULT_AFTER_DAYS = 90
+DEFAULT_KEEP_LAST = 20
+CHUNK_SIZE = 200
+LOG_CHUNK_BATCH = 100
+FORMAT_VERSION = 1
+
+
+class ArchiveError(Exception):
+    """归档文件缺失或内容与索引不符，或构建无法恢复"""
+
+
+def archive_root():
+    return getattr(settings, 'CICD_ARCHIVE_ROOT', os.path.join(settings.BASE_DIR, 'archive'))
+
+
+def candidates(before, keep_last, pipeline_id=None):
+    """待归档构建的主键（按流水线、主键升序）：已结束、创建早于 before，且不在所属流水线最近 keep_last 个构建中"""
+    pipelines = Pipeline.objects.order_by('id').values_list('id', flat=True)
+    if pipeline_id:
+        pipelines = pipelines.filter(id=pipeline_id)
+    for pipeline in pipelines.iterator():
+        builds = BuildRecord.objects.filter(pipeline_id=pipeline)
+        kept = list(builds.order_by('-created_at', '-id').values_list('id', flat=True)[:keep_last])
+        yield from (builds.filter(created_at__lt=before).exclude(status__in=ACTIVE_STATUSES).exclude(id__in=kept)
+                    .order_by('id').values_list('id', flat=True).iterator())
+
+
+def _serialize(queryset):
+    # python 格式由模型字段完成转换（二进制字段为 base64），恢复时按字段类型还原
+    return serializers.serialize('python', queryset)
+
+
+def _write_member(fp, build):
+    """
+    将一个构建写为一个 gzip 成员，返回 (偏移, 长度)：构建记录、阶段记录和事件一次序列化，
+    日志块用 iterator 分批读取并逐块压缩写入，内存中不保留整个构建的日志
+    """
+    offset = fp.tell()
+    head = dict(format=FORMAT_VERSION, build=_serialize([build])[0], pipeline_name=build.pipeline.name,
+                project_id=build.pipeline.project_id,
+                stages=_serialize(BuildStageRecord.objects.filter(build=build).order_by('id')),
+                events=_serialize(BuildEvent.objects.filter(build=build).order_by('id')))
+    with gzip.GzipFile(fileobj=fp, mode='wb') as member:
+        # 文档以 log_chunks 结尾：先写去掉结尾 "}" 的头部，再逐块追加日志块数组
+        member.write(json.dumps(head, cls=DjangoJSONEncoder, ensure_ascii=False)[:-1].encode() + b', "log_chunks": [')
+        chunks = BuildLogChunk.objects.filter(build=build).order_by('seq').iterator(chunk_size=LOG_CHUNK_BATCH)
+        for index, chunk in enumerate(chunks):
+            if index:
+                member.write(b', ')
+            member.write(json.dumps(_serialize([chunk])[0], cls=DjangoJSONEncoder, ensure_ascii=False).encode())
+        member.write(b']}\n')
+    return offset, fp.tell() - offset
+
+
+def _archive_path(build):
+    return os.path.join(str(build.pipeline_id), f'{build.created_at:%Y-%m}.jsonl.gz')
+
+
+def _append(builds):
+    """按归档文件逐个构建追加 gzip 成员，返回 {构建主键: (相对路径, 偏移, 长度)}；文件锁避免多个归档进程交错写入"""
+    members, locations = {}, {}
+    for build in builds:
+        members.setdefault(_archive_path(build), []).append(build)
+    for path, items in members.items():
+        full_path = os.path.join(archive_root(), path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'ab') as fp:
+            fcntl.flock(fp, fcntl.LOCK_EX)
+            try:
+                fp.seek(0, os.SEEK_END)
+                for build in items:
+                    locations[build.id] = (path, *_write_member(fp, build))
+                fp.flush()
+                os.fsync(fp.fileno())
+            finally:
+                fcntl.flock(fp, fcntl.LOCK_UN)
+    return locations
+
+
+def archive_chunk(build_ids):
+    """归档一批构建并从热表删除，返回归档数；同一批内任一步失败时热表保持不变"""
+    builds = list(BuildRecord.objects.filter(id__in=build_ids).select_related('pipeline').order_by('id'))
+    locations = _append(builds)
+    with transaction.atomic():
+        ArchivedBuild.objects.bulk_create([
+            ArchivedBuild(build_id=build.build_id, original_id=build.id, pipeline_id=build.pipeline_id,
+                          pipeline_name=build.pipeline.name, project_id=build.pipeline.project_id, version=build.version,
+                          status=build.status, created_at=build.created_at, finished_at=build.finished_at,
+                          duration=build.duration, file=path, offset=offset, length=length)
+            for build in builds for path, offset, length in [locations[build.id]]
+        ])
+        ids = [build.id for build in builds]
+        # 子表没有下级引用，按构建主键整批删除
+        for model in (BuildLogChunk, BuildEvent, BuildStageRecord):
+            model.objects.filter(build_id__in=ids).delete()
+        BuildRecord.objects.filter(id__in=ids).delete()
+    return len(builds)
+
+
+def archive_builds(days=None, keep_last=None, pipeline_id=None, chunk_size=CHUNK_SIZE, dry_run=False):
+    """归档超过保留期的构建，返回归档（dry_run 时为待归档）的构建数"""
+    days = getattr(settings, 'CICD_ARCHIVE_AFTER_DAYS', DEFAULT_AFTER_DAYS) if days is None else days
+    keep_last = getattr(settings, 'CICD_ARCHIVE_KEEP_LAST', DEFAULT_KEEP_LAST) if keep_last is None else keep_last
+    pending = list(candidates(timezone.now() - timedelta(days=days), keep_last, pipeline_id))
+    if dry_run:
+        return len(pending)
+    archived = 0
+    for start in range(0, len(pending), chunk_size):
+        archived += archive_chunk(pending[start:start + chunk_size])
+    return archived
+
+
+def read_document(archived):
+    """读取单个已归档构建的完整文档"""
+    path = os.path.join(archive_root(), archived.file)
+    try:
+        with open(path, 'rb') as fp:
+            fp.seek(archived.offset)
+            data = fp.read(archived.length)
+        document = json.loads(gzip.decompress(data))
+    except (OSError, EOFError, ValueError) as e:
+        raise ArchiveError(f'归档文件读取失败: {archived.file}@{archived.offset}') from e
+    if document['build']['fields']['build_id'] != str(archived.build_id):
+        raise ArchiveError(f'归档内容与索引不符: {archived.build_id}')
+    return document
+
+
+def read_log(document, tail=None):
+    """
+    归档文档中的日志，返回 (日志字节, 日志总长度)；指定 tail 时只解压覆盖尾部 tail 字节的日志块并截取，
+    不解压、拼接整个日志
+    """
+    rows = document['log_chunks']
+    size = sum(row['fields']['length'] for row in rows)
+    if tail is not None:
+        start = max(size - tail, 0)
+        rows = [row for row in rows if row['fields']['offset'] + row['fields']['length'] > start]
+    chunks = [obj.object for obj in serializers.deserialize('python', rows)]
+    data = b''.join(zlib.decompress(chunk.data) if chunk.compressed else bytes(chunk.data) for chunk in chunks)
+    if tail is not None and chunks:
+        data = data[max(size - tail, 0) - chunks[0].offset:]
+    return data, size
+
+
+def restore(archived):
+    """
+    将已归档构建恢复到热表（保留原主键与 build_id）并删除归档索引，归档文件中的数据保留，
+    恢复的构建再次满足条件时会被重新归档；所属流水线或阶段已删除的构建无法恢复
+    """
+    document = read_document(archived)
+    build = document['build']['fields']
+    stage_ids = {row['fields']['stage'] for row in document['stages']}
+    if not Pipeline.objects.filter(id=build['pipeline']).exists() or \
+            PipelineStage.objects.filter(id__in=stage_ids).count() != len(stage_ids):
+        raise ArchiveError(f'构建无法恢复，所属流水线或阶段已删除: {archived.build_id}')
+    # 可空引用按原删除策略置空：触发人已删除、事件引用的阶段已删除
+    if build['triggered_by'] and not get_user_model().objects.filter(id=build['triggered_by']).exists():
+        build['triggered_by'] = None
+    existing = set(PipelineStage.objects.filter(id__in={row['fields']['stage'] for row in document['events']})
+                   .values_list('id', flat=True))
+    for row in document['events']:
+        if row['fields']['stage'] not in existing:
+            row['fields']['stage'] = None
+    with transaction.atomic():
+        if BuildRecord.objects.filter(build_id=archived.build_id).exists():
+            raise ArchiveError(f'构建已存在: {archived.build_id}')
+        for obj in serializers.deserialize('python', [document['build'], *document['stages'], *document['events'],
+                                                      *document['log_chunks']]):
+            obj.save()
+        archived.delete()
+    return BuildRecord.objects.get(build_id=archived.build_id)
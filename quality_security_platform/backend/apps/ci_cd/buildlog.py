@@ -0,0 +1,203 @@
+"""
+构建日志分块存储：日志按块只追加写入 BuildLogChunk（可选 zlib 压缩），读取按字节偏移定位所需的块
+
+追加一行日志不会重写已有数据，读取任意区间 / 尾部只加载覆盖该区间的块，代价与请求的字节数成正比。
+并行阶段的输出按整行写入并加上 [阶段名] 前缀，避免不同阶段的半行交错
+"""
+import logging
+import threading
+import time
+import zlib
+from django.conf import settings
+from django.db import connection
+from .models import BuildLogChunk, BuildRecord
+
+DEFAULT_CHUNK_SIZE = 256 * 1024
+FLUSH_INTERVAL = 1.0
+# 缓冲区超过该倍数的块大小时阻塞写入方（即阶段输出读取线程），由子进程管道形成背压
+MAX_BUFFERED_CHUNKS = 4
+ACTIVE_STATUSES = ('pending', 'running')
+# 长时间没有新日志时发送心跳，避免代理断开空闲连接
+HEARTBEAT_SECONDS = 15
+DEFAULT_STREAM_SECONDS = 30
+logger = logging.getLogger(__name__)
+
+
+def chunk_size():
+    return getattr(settings, 'CICD_LOG_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+
+class BuildLogWriter:
+    """
+    构建日志写入器：write 可在任意线程调用，数据由后台线程按块（或每 FLUSH_INTERVAL 秒）落库
+
+    后台线程使用独立的数据库连接，退出时关闭；重试的构建从已有的最后一块之后继续追加
+    """
+
+    def __init__(self, build_id, size=None, compress=None, flush_interval=FLUSH_INTERVAL):
+        self.build_id = build_id
+        self.size = size or chunk_size()
+        self.compress = getattr(settings, 'CICD_LOG_COMPRESS', True) if compress is None else compress
+        self.flush_interval = flush_interval
+        self.buffer = bytearray()
+        self.partial = {}
+        self.condition = threading.Condition()
+        self.closed = False
+        self.error = None
+        last = BuildLogChunk.objects.filter(build_id=build_id).order_by('-seq').values('seq', 'offset', 'length').first()
+        self.seq, self.offset = (last['seq'] + 1, last['offset'] + last['length']) if last else (0, 0)
+        self.thread = threading.Thread(target=self._run, name=f'build-log-{build_id}', daemon=True)
+        self.thread.start()
+
+    def write(self, text):
+        data = text.encode('utf-8')
+        with self.condition:
+            while len(self.buffer) >= self.size * MAX_BUFFERED_CHUNKS and not self.error:
+                self.condition.wait()
+            if self.error:
+                return
+            self.buffer += data
+            if len(self.buffer) >= self.size:
+                self.condition.notify_all()
+
+    def write_stage(self, name, text):
+        """阶段输出：只写入完整的行，未换行的部分留到下一次输出或阶段结束"""
+        with self.condition:
+            lines = (self.partial.pop(name, '') + text).split('\n')
+            if lines[-1]:
+                self.partial[name] = lines[-1]
+        if len(lines) > 1:
+            self.write(''.join(f'[{name}] {line}\n' for line in lines[:-1]))
+
+    def end_stage(self, name, message=''):
+        with self.condition:
+            rest = self.partial.pop(name, '')
+        lines = ([rest] if rest else []) + ([message] if message else [])
+        if lines:
+            self.write(''.join(f'[{name}] {line}\n' for line in lines))
+
+    def close(self):
+        """写入剩余数据并等待后台线程退出，返回日志总字节数"""
+        with self.condition:
+            for name in list(self.partial):
+                self.buffer += f'[{name}] {self.partial.pop(name)}\n'.encode('utf-8')
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+        return self.offset
+
+    def _run(self):
+        try:
+            while True:
+                with self.condition:
+                    self.condition.wait_for(lambda: self.closed or len(self.buffer) >= self.size, timeout=self.flush_interval)
+                    data = bytes(self.buffer[:self.size * MAX_BUFFERED_CHUNKS])
+                    del self.buffer[:len(data)]
+                    done = self.closed and not self.buffer
+                    self.condition.notify_all()
+                for start in range(0, len(data), self.size):
+                    self._store(data[start:start + self.size])
+                if done:
+                    return
+        except Exception as e:
+            logger.exception('构建日志写入失败: build=%s', self.build_id)
+            with self.condition:
+                self.error = e
+                self.buffer.clear()
+                self.condition.notify_all()
+        finally:
+            connection.close()
+
+    def _store(self, data):
+        payload, compressed = data, False
+        if self.compress:
+            packed = zlib.compress(data, 6)
+            if len(packed) < len(data):
+                payload, compressed = packed, True
+        BuildLogChunk.objects.create(build_id=self.build_id, seq=self.seq, offset=self.offset, length=len(data),
+                                     compressed=compressed, data=payload)
+        self.seq += 1
+        self.offset += len(data)
+
+
+def log_size(build_id):
+    last = BuildLogChunk.objects.filter(build_id=build_id).order_by('-offset').values('offset', 'length').first()
+    return last['offset'] + last['length'] if last else 0
+
+
+def read_range(build_id, start, end):
+    """读取 [start, end) 字节：先定位包含 start 的块，再按偏移顺序读取到 end 为止"""
+    if end <= start:
+        return b''
+    chunks = BuildLogChunk.objects.filter(build_id=build_id)
+    first = chunks.filter(offset__lte=start).order_by('-offset').values_list('offset', flat=True).first()
+    parts = []
+    for offset, compressed, data in (chunks.filter(offset__gte=first or 0, offset__lt=end).order_by('offset')
+                                     .values_list('offset', 'compressed', 'data')):
+        data = zlib.decompress(data) if compressed else bytes(data)
+        parts.append(data[max(start - offset, 0):end - offset])
+    return b''.join(parts)
+
+
+def utf8_boundary(data):
+    """返回不截断多字节字符的最长前缀长度，剩余字节留给下一次读取"""
+    for back in range(1, min(len(data), 3) + 1):
+        byte = data[-back]
+        if byte < 0x80:
+            return len(data)
+        if byte >= 0xC0:
+            # 多字节字符的首字节：所需长度大于已有长度时截断
+            needed = 2 if byte < 0xE0 else 3 if byte < 0xF0 else 4
+            return len(data) if needed <= back else len(data) - back
+    return len(data)
+
+
+def read_text(build_id, start, limit):
+    """读取从 start 开始不超过 limit 字节的文本，返回 (文本, 下一次读取的偏移)"""
+    data = read_range(build_id, start, start + limit)
+    data = data[:utf8_boundary(data)]
+    return data.decode('utf-8', 'replace'), start + len(data)
+
+
+def read_tail(build_id, limit, size=None):
+    """读取最后 limit 字节，丢弃开头不完整的行；返回 (文本, 起始偏移, 日志总字节数)"""
+    size = log_size(build_id) if size is None else size
+    start = max(size - limit, 0)
+    data = read_range(build_id, start, size)
+    if start > 0:
+        newline = data.find(b'\n')
+        if 0 <= newline < len(data) - 1:
+            start += newline + 1
+            data = data[newline + 1:]
+    data = data[:utf8_boundary(data)]
+    return data.decode('utf-8', 'replace'), start, size
+
+
+def stream_seconds():
+    return getattr(settings, 'CICD_LOG_STREAM_SECONDS', DEFAULT_STREAM_SECONDS)
+
+
+def follow(build_id, offset=0, limit=None, poll_interval=1.0, max_seconds=None):
+    """
+    实时跟踪运行中构建的日志，逐个产出 (事件, 数据, 偏移)
+
+    先读构建状态再读日志：写入器在构建状态落库前已关闭，状态结束且没有新数据即表示日志完整，立即结束；
+    超过 max_seconds（默认 settings.CICD_LOG_STREAM_SECONDS）后结束本次连接，客户端以最后的偏移重连
+    """
+    limit = limit or chunk_size()
+    deadline = time.monotonic() + (stream_seconds() if max_seconds is None else max_seconds)
+    last_sent = time.monotonic()
+    while time.monotonic() < deadline:
+        status = BuildRecord.objects.filter(id=build_id).values_list('status', flat=True).first()
+        text, next_offset = read_text(build_id, offset, limit)
+        if next_offset > offset:
+            offset, last_sent = next_offset, time.monotonic()
+            yield 'log', text, offset
+            continue
+        if status not in ACTIVE_STATUSES:
+            yield 'end', status, offset
+            return
+        if time.monotonic() - last_sent >= HEARTBEAT_SECONDS:
+            last_sent = time.monotonic()
+            yield 'ping', '', offset
+        time.sleep(poll_interval)
@@ -0,0 +1,178 @@
+"""
+流水线执行器：order 相同的阶段构成 DAG 的一层并行执行，层与层之间串行，构建耗时为关键路径而非各阶段之和
+
+阶段脚本在独立进程组的子进程中运行，超时后先 SIGTERM、宽限期后 SIGKILL 整个进程组。
+工作线程只负责等待子进程，不访问数据库；阶段开始/结束回调在调用线程中执行
+"""
+import codecs
+import os
+import signal
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import groupby
+from django.utils import timezone
+
+LOG_TAIL_BYTES = 64 * 1024
+READ_SIZE = 64 * 1024
+KILL_GRACE_SECONDS = 5
+DEFAULT_MAX_WORKERS = 8
+
+
+class StageResult:
+    def __init__(self, stage, status, started_at, finished_at, exit_code=None, output='', timed_out=False, cached=False):
+        self.stage = stage
+        self.status = status
+        self.started_at = started_at
+        self.finished_at = finished_at
+        self.exit_code = exit_code
+        self.output = output
+        self.timed_out = timed_out
+        self.cached = cached
+
+    @property
+    def duration(self):
+        return (self.finished_at - self.started_at).total_seconds()
+
+
+def stage_levels(stages):
+    """按 order 分层，返回 [[阶段, ...], ...]"""
+    ordered = sorted(stages, key=lambda stage: (stage.order, stage.id or 0))
+    return [list(level) for _, level in groupby(ordered, key=lambda stage: stage.order)]
+
+
+def _terminate(proc):
+    """终止整个进程组：脚本派生的子进程一并结束"""
+    for sig, grace in ((signal.SIGTERM, KILL_GRACE_SECONDS), (signal.SIGKILL, None)):
+        try:
+            os.killpg(proc.pid, sig)
+        except ProcessLookupError:
+            return
+        try:
+            proc.wait(timeout=grace)
+            return
+        except subprocess.TimeoutExpired:
+            continue
+
+
+def run_script(script, timeout=None, env=None, cwd=None, on_output=None):
+    """
+    在 /bin/sh -e 中执行脚本，stdout/stderr 合并读取
+
+    只在内存中保留最后 LOG_TAIL_BYTES 字节，完整输出通过 on_output(text) 交给调用方；
+    返回 (退出码, 输出尾部, 是否超时)
+    """
+    proc = subprocess.Popen(['/bin/sh', '-ec', script], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            stdin=subprocess.DEVNULL, cwd=cwd, env=env, start_new_session=True)
+    tail = bytearray()
+
+    def read():
+        decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        while True:
+            try:
+                data = os.read(proc.stdout.fileno(), READ_SIZE)
+            except (OSError, ValueError):
+                # 脱离进程组的后台进程仍持有管道时，超时后由主线程关闭
+                break
+            if not data:
+                break
+            tail.extend(data)
+            del tail[:-LOG_TAIL_BYTES]
+            if on_output:
+                on_output(decoder.decode(data))
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    timed_out = False
+    try:
+        proc.wait(timeout=timeout or None)
+    except subprocess.TimeoutExpired:
+        timed_out = True
+        _terminate(proc)
+    reader.join(KILL_GRACE_SECONDS)
+    proc.stdout.close()
+    return proc.returncode, tail.decode('utf-8', 'replace'), timed_out
+
+
+def run_stage(stage, env=None, cwd=None, on_output=None):
+    started_at = timezone.now()
+    if not (stage.script or '').strip():
+        return StageResult(stage, 'success', started_at, timezone.now(), exit_code=0)
+    try:
+        exit_code, output, timed_out = run_script(stage.script, stage.timeout, env, cwd,
+                                                  on_output=(lambda text: on_output(stage, text)) if on_output else None)
+    except OSError as e:
+        output = f'无法启动阶段脚本: {e}\n'
+        if on_output:
+            on_output(stage, output)
+        return StageResult(stage, 'failed', started_at, timezone.now(), output=output)
+    note = f'阶段超时（{stage.timeout} 秒），已终止\n' if timed_out else f'阶段脚本退出码 {exit_code}\n' if exit_code else ''
+    if note:
+        if output and not output.endswith('\n'):
+            note = '\n' + note
+        output += note
+        if on_output:
+            on_output(stage, note)
+    status = 'success' if exit_code == 0 and not timed_out else 'failed'
+    return StageResult(stage, status, started_at, timezone.now(), exit_code, output, timed_out)
+
+
+class PipelineExecutor:
+    """
+    逐层执行阶段：一层内并行，任一阶段失败则该层结束后停止，后续层的阶段标记为终止
+
+    on_level_start(stages)、on_stage_finish(result)、on_skipped(stages) 在调用线程中回调；
+    on_output(stage, text) 在工作线程中回调；resolve(stage) 在阶段执行前于调用线程中回调，
+    返回 StageResult 时（如命中结果缓存）直接采用该结果，不再执行脚本
+    """
+
+    def __init__(self, stages, env=None, cwd=None, max_workers=DEFAULT_MAX_WORKERS,
+                 on_level_start=None, on_stage_finish=None, on_skipped=None, on_output=None, resolve=None):
+        self.levels = stage_levels(stages)
+        self.env = env
+        self.cwd = cwd
+        self.max_workers = max_workers
+        self.on_level_start = on_level_start
+        self.on_stage_finish = on_stage_finish
+        self.on_skipped = on_skipped
+        self.on_output = on_output
+        self.resolve = resolve
+
+    def run(self):
+        """返回 (构建状态, 阶段结果列表)"""
+        results = []
+        for index, level in enumerate(self.levels):
+            if self.on_level_start:
+                self.on_level_start(level)
+            level_results = self._run_level(level)
+            results += level_results
+            if any(result.status != 'success' for result in level_results):
+                skipped = [stage for rest in self.levels[index + 1:] for stage in rest]
+                if skipped and self.on_skipped:
+                    self.on_skipped(skipped)
+                return 'failed', results
+        return 'success', results
+
+    def _run_level(self, level):
+        results, pending = [], []
+        for stage in level:
+            result = self.resolve(stage) if self.resolve else None
+            if result is None:
+                pending.append(stage)
+            else:
+                results.append(result)
+                self._finished(result)
+        if len(pending) == 1:
+            results.append(run_stage(pending[0], self.env, self.cwd, self.on_output))
+            self._finished(results[-1])
+        elif pending:
+            with ThreadPoolExecutor(max_workers=min(len(pending), self.max_workers)) as pool:
+                futures = [pool.submit(run_stage, stage, self.env, self.cwd, self.on_output) for stage in pending]
+                for future in as_completed(futures):
+                    results.append(future.result())
+                    self._finished(results[-1])
+        return results
+
+    def _finished(self, result):
+        if self.on_stage_finish:
+            self.on_stage_finish(result)
@@ -0,0 +1,232 @@
+"""
+流水线健康汇总：构建结束时增量更新所在小时 / 天的 PipelineHealthRollup，趋势与健康分只读汇总表
+
+耗时分位数来自对数分桶草图（DDSketch 思路）：桶边界按 (1+α)/(1-α) 的幂增长，任意分位数的相对误差不超过 α；
+草图按桶计数相加即可合并，项目级、跨时间段的分位数由各流水线 / 各时间桶的草图合并得到，不需要原始数据
+"""
+import math
+from collections import Counter, defaultdict
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.utils import timezone
+from .models import ArchivedBuild, BuildRecord, Pipeline, PipelineHealthRollup
+
+RELATIVE_ACCURACY = 0.02
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+# 小于 1 秒的耗时计入零桶
+MIN_DURATION = 1.0
+ZERO_BUCKET = -1
+GRANULARITIES = ('hour', 'day')
+COUNTED_STATUSES = ('success', 'failed', 'aborted')
+
+
+class DurationSketch:
+    """可合并的耗时分布草图，序列化为 {桶序号: 计数}"""
+
+    def __init__(self, buckets=None):
+        self.buckets = Counter({int(key): count for key, count in (buckets or {}).items()})
+
+    @staticmethod
+    def index(value):
+        return ZERO_BUCKET if value < MIN_DURATION else math.ceil(math.log(value) / LOG_GAMMA)
+
+    def add(self, value, count=1):
+        self.buckets[self.index(value)] += count
+
+    def merge(self, other):
+        self.buckets.update(other.buckets)
+        return self
+
+    @property
+    def count(self):
+        return sum(self.buckets.values())
+
+    def quantile(self, q):
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                # 桶内取使相对误差最小的代表值
+                return 0.0 if index == ZERO_BUCKET else round(2 * GAMMA ** index / (GAMMA + 1), 1)
+        return None
+
+    def to_dict(self):
+        return {str(index): count for index, count in sorted(self.buckets.items()) if count}
+
+
+def truncate(value, granularity):
+    """
+    时间桶起点；天桶按 settings.TIME_ZONE 的本地日期划分：USE_TZ=False 时时间本身就是本地时间，
+    USE_TZ=True 时先转为本地时间再截断，避免按 UTC 划分导致"天"在本地 08:00（东八区）切分
+    """
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    value = value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0) if granularity == 'day' else value
+
+
+def _apply(rollup, status, duration):
+    rollup.total += 1
+    setattr(rollup, status, getattr(rollup, status) + 1)
+    if duration is not None and status != 'aborted':
+        rollup.duration_sum += duration
+        rollup.duration_count += 1
+        sketch = DurationSketch(rollup.duration_sketch)
+        sketch.add(duration)
+        rollup.duration_sketch = sketch.to_dict()
+
+
+def record_build(build):
+    """构建结束后更新其结束时间所在的小时 / 天汇总；行锁保证并发结束的构建不会互相覆盖草图"""
+    record_builds([build])
+
+
+def record_builds(builds):
+    """批量版本：按 (粒度, 流水线, 时间桶) 分组，每个汇总行只加锁更新一次"""
+    groups = defaultdict(list)
+    for build in builds:
+        if build.status in COUNTED_STATUSES and build.finished_at:
+            for granularity in GRANULARITIES:
+                groups[granularity, build.pipeline_id, truncate(build.finished_at, granularity)].append(build)
+    if not groups:
+        return
+    projects = dict(Pipeline.objects.filter(id__in={pipeline_id for _, pipeline_id, _ in groups})
+                    .values_list('id', 'project_id'))
+    for (granularity, pipeline_id, bucket), items in groups.items():
+        for attempt in range(2):
+            try:
+                with transaction.atomic():
+                    rollup, _ = (PipelineHealthRollup.objects.select_for_update()
+                                 .get_or_create(granularity=granularity, pipeline_id=pipeline_id, bucket=bucket,
+                                                defaults={'project_id': projects[pipeline_id]}))
+                    for build in items:
+                        _apply(rollup, build.status, build.duration)
+                    rollup.save()
+                break
+            except IntegrityError:
+                # 另一个构建同时创建了该时间桶，重试时读取已有行
+                if attempt:
+                    raise
+
+
+def archive_cutoffs(pipeline_id=None):
+    """
+    各流水线可按热表重算的起点：最后一个已归档构建结束当天的次日零点。
+    归档构建已不在热表中，此前的汇总行（含与归档构建同一天的小时桶）只能保留，不能按热表重算
+    """
+    archived = ArchivedBuild.objects.filter(finished_at__isnull=False)
+    if pipeline_id:
+        archived = archived.filter(pipeline_id=pipeline_id)
+    return {pipeline: truncate(finished_at, 'day') + timedelta(days=1) for pipeline, finished_at in
+            archived.values('pipeline_id').annotate(last=Max('finished_at')).values_list('pipeline_id', 'last').order_by()}
+
+
+def backfill(start=None, end=None, pipeline_id=None, batch_size=2000):
+    """
+    按构建记录重算 [start, end) 内的汇总（按天对齐），返回写入的汇总行数
+
+    按流水线逐个流式读取并在内存中聚合，内存只与单条流水线的时间桶数有关；已有的汇总行先删除再批量写入。
+    有构建已归档的流水线只重算最后一个归档构建之后的天（见 archive_cutoffs），更早的汇总保持不变，
+    避免删除汇总后只按热表重建而丢失已归档构建的历史
+    """
+    builds = BuildRecord.objects.filter(status__in=COUNTED_STATUSES, finished_at__isnull=False)
+    rollups = PipelineHealthRollup.objects.all()
+    start = truncate(start, 'day') if start else None
+    if start:
+        builds = builds.filter(finished_at__gte=start)
+        rollups = rollups.filter(bucket__gte=start)
+    if end:
+        builds = builds.filter(finished_at__lt=truncate(end, 'day'))
+        rollups = rollups.filter(bucket__lt=truncate(end, 'day'))
+    if pipeline_id:
+        builds = builds.filter(pipeline_id=pipeline_id)
+        rollups = rollups.filter(pipeline_id=pipeline_id)
+    cutoffs = archive_cutoffs(pipeline_id)
+    rows = (builds.order_by('pipeline_id', 'finished_at')
+            .values_list('pipeline_id', 'pipeline__project_id', 'status', 'finished_at', 'duration').iterator(chunk_size=batch_size))
+    written = 0
+    with transaction.atomic():
+        rollups.exclude(pipeline_id__in=cutoffs).delete()
+        for pipeline, cutoff in cutoffs.items():
+            rollups.filter(pipeline_id=pipeline, bucket__gte=max(start, cutoff) if start else cutoff).delete()
+        current, pending = None, {}
+        for pipeline, project_id, status, finished_at, duration in rows:
+            if pipeline != current:
+                written += _write(pending, batch_size)
+                current, pending = pipeline, {}
+            if pipeline in cutoffs and truncate(finished_at, 'day') < cutoffs[pipeline]:
+                continue
+            for granularity in GRANULARITIES:
+                bucket = truncate(finished_at, granularity)
+                rollup = pending.get((granularity, bucket))
+                if rollup is None:
+                    rollup = pending[granularity, bucket] = PipelineHealthRollup(
+                        granularity=granularity, bucket=bucket, pipeline_id=pipeline, project_id=project_id, duration_sketch={})
+                _apply(rollup, status, duration)
+        written += _write(pending, batch_size)
+    return written
+
+
+def _write(pending, batch_size):
+    if pending:
+        PipelineHealthRollup.objects.bulk_create(pending.values(), batch_size=batch_size)
+    return len(pending)
+
+
+def summarize(rows):
+    """合并若干汇总行：计数相加、草图合并，返回成功率与耗时分位数"""
+    total = success = failed = aborted = duration_count = 0
+    duration_sum = 0.0
+    sketch = DurationSketch()
+    for row in rows:
+        total += row['total']
+        success += row['success']
+        failed += row['failed']
+        aborted += row['aborted']
+        duration_sum += row['duration_sum']
+        duration_count += row['duration_count']
+        sketch.merge(DurationSketch(row['duration_sketch']))
+    finished = success + failed
+    return {
+        'total': total, 'success': success, 'failed': failed, 'aborted': aborted,
+        'success_rate': round(success / finished, 4) if finished else None,
+        'avg_duration': round(duration_sum / duration_count, 1) if duration_count else None,
+        'p50_duration': sketch.quantile(0.5),
+        'p95_duration': sketch.quantile(0.95),
+    }
+
+
+ROLLUP_FIELDS = ('bucket', 'total', 'success', 'failed', 'aborted', 'duration_sum', 'duration_count', 'duration_sketch')
+
+
+def rollup_queryset(granularity, start=None, end=None, pipeline_id=None, project_id=None):
+    queryset = PipelineHealthRollup.objects.filter(granularity=granularity)
+    if pipeline_id:
+        queryset = queryset.filter(pipeline_id=pipeline_id)
+    if project_id:
+        queryset = queryset.filter(project_id=project_id)
+    if start:
+        queryset = queryset.filter(bucket__gte=start)
+    if end:
+        queryset = queryset.filter(bucket__lt=end)
+    return queryset
+
+
+def trends(granularity='day', start=None, end=None, pipeline_id=None, project_id=None):
+    """趋势序列：按时间桶合并所选流水线（或项目下全部流水线）的汇总"""
+    series = {}
+    for row in rollup_queryset(granularity, start, end, pipeline_id, project_id).order_by('bucket').values(*ROLLUP_FIELDS):
+        series.setdefault(row['bucket'], []).append(row)
+    return [dict(bucket=bucket, **summarize(rows)) for bucket, rows in series.items()]
+
+
+def window_summary(days=30, pipeline_id=None, project_id=None):
+    """最近 days 天的汇总，读取天粒度汇总行"""
+    start = truncate(timezone.now() - timedelta(days=days), 'day')
+    return summarize(rollup_queryset('day', start, None, pipeline_id, project_id).values(*ROLLUP_FIELDS))
@@ -0,0 +1,119 @@
+"""
+构建事件日志：构建 / 阶段的状态变化先追加为 BuildEvent，再按批写入；BuildRecord / BuildStageRecord 是事件的投影
+
+一批事件与对应的投影更新在同一事务中写入：阶段记录每层一次 bulk_create，结束状态合并为一次
+bulk_update（只更新状态相关字段），构建记录只在开始 / 结束时按需更新几列，不再整行 save()
+"""
+import time
+from django.db import transaction
+from django.utils import timezone
+from .health import record_build
+from .models import BuildEvent, BuildRecord, BuildStageRecord
+
+STAGE_FIELDS = ('status', 'started_at', 'finished_at', 'log_snippet', 'cache_key', 'cached')
+# 距上次写入超过该秒数或积压事件达到上限时，阶段结束事件立即落库
+FLUSH_INTERVAL = 2.0
+MAX_PENDING = 200
+
+
+def duration_seconds(started_at, finished_at):
+    """构建耗时（秒），用 total_seconds 计算，超过一天的构建不会被截断"""
+    if not started_at or not finished_at:
+        return None
+    return int(round((finished_at - started_at).total_seconds()))
+
+
+class BuildJournal:
+    """
+    单个构建的事件写入器，只在执行构建的线程中使用
+
+    阶段开始时立即写入（界面需要看到运行中的阶段），阶段结束事件按时间 / 数量批量写入，
+    构建结束时写入剩余事件
+    """
+
+    def __init__(self, build, flush_interval=FLUSH_INTERVAL, max_pending=MAX_PENDING):
+        self.build = build
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.events = []
+        self.created = []
+        self.dirty = {}
+        self.records = {}
+        self.last_flush = time.monotonic()
+
+    def append(self, type, stage=None, status='', at=None, **payload):
+        self.events.append(BuildEvent(build_id=self.build.id, type=type, stage=stage, status=status, payload=payload,
+                                      occurred_at=at or timezone.now()))
+
+    def build_started(self, attempt=0):
+        if attempt:
+            # 重试沿用同一构建记录：上一次尝试的阶段记录重新投影，历史保留在事件日志中
+            BuildStageRecord.objects.filter(build_id=self.build.id).delete()
+        self.append('build_started', status='running', at=self.build.started_at, version=self.build.version, attempt=attempt)
+
+    def stages_started(self, stages, at=None):
+        at = at or timezone.now()
+        for stage in stages:
+            self.append('stage_started', stage, 'running', at)
+        with transaction.atomic():
+            BuildStageRecord.objects.bulk_create([
+                BuildStageRecord(build_id=self.build.id, stage=stage, status='running', started_at=at) for stage in stages
+            ])
+            self.records.update(BuildStageRecord.objects.filter(build_id=self.build.id, stage__in=stages)
+                                .values_list('stage_id', 'id'))
+            self.flush()
+
+    def stage_finished(self, result, cache_key=''):
+        self.append('stage_finished', result.stage, result.status, result.finished_at, started_at=result.started_at,
+                    duration=round(result.duration, 3), exit_code=result.exit_code, timed_out=result.timed_out,
+                    cached=result.cached)
+        self.dirty[result.stage.id] = BuildStageRecord(
+            id=self.records[result.stage.id], status=result.status, started_at=result.started_at,
+            finished_at=result.finished_at, log_snippet=result.output, cache_key=cache_key, cached=result.cached,
+        )
+        if len(self.events) >= self.max_pending or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def stages_skipped(self, stages):
+        for stage in stages:
+            self.append('stage_skipped', stage, 'aborted')
+            self.created.append(BuildStageRecord(build_id=self.build.id, stage=stage, status='aborted'))
+
+    def build_finished(self, status, at=None, type='build_finished', final=True):
+        """
+        写入结束事件和剩余事件；构建状态只在仍为运行中（或排队中）时更新，
+        执行期间已被取消的构建保持终止状态
+
+        final=False 表示本次尝试失败后还会重试：只记录事件，构建回到已派发的排队状态（pending），
+        重试倒计时期间仍计入调度器的 active()、继续占用并发额度，重试时从 pending 认领；不计入健康汇总，
+        汇总只统计构建的最后一次尝试
+        """
+        self.build.finished_at = at or timezone.now()
+        self.build.duration = duration_seconds(self.build.started_at, self.build.finished_at)
+        self.append(type, status=status, at=self.build.finished_at, duration=self.build.duration)
+        if final:
+            fields = {'status': status, 'finished_at': self.build.finished_at, 'duration': self.build.duration}
+        else:
+            # 刷新派发时间，重试倒计时内不会被 requeue_stale 当作派发后未启动的构建重新排队
+            fields = {'status': 'pending', 'dispatched_at': timezone.now()}
+        with transaction.atomic():
+            self.flush()
+            updated = BuildRecord.objects.filter(id=self.build.id, status__in=['pending', 'running']).update(**fields)
+        if updated:
+            self.build.status = fields['status']
+            # 构建结束是汇总表的唯一增量来源
+            if final:
+                record_build(self.build)
+        return updated
+
+    def flush(self):
+        if not (self.events or self.created or self.dirty):
+            return
+        with transaction.atomic():
+            BuildEvent.objects.bulk_create(self.events)
+            if self.created:
+                BuildStageRecord.objects.bulk_create(self.created)
+            if self.dirty:
+                BuildStageRecord.objects.bulk_update(list(self.dirty.values()), STAGE_FIELDS)
+        self.events, self.created, self.dirty = [], [], {}
+        self.last_flush = time.monotonic()
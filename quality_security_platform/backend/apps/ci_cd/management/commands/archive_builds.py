@@ -0,0 +1,21 @@
+import time
+from django.core.management.base import BaseCommand
+from apps.ci_cd.archive import archive_builds
+
+
+class Command(BaseCommand):
+    help = '归档超过保留期的构建（每条流水线保留最近 N 个）到 jsonl.gz 冷存储，并从热表分批删除'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='归档创建早于 N 天的构建，默认 CICD_ARCHIVE_AFTER_DAYS')
+        parser.add_argument('--keep-last', type=int, help='每条流水线保留最近 N 个构建，默认 CICD_ARCHIVE_KEEP_LAST')
+        parser.add_argument('--pipeline', type=int, help='只归档指定流水线')
+        parser.add_argument('--chunk-size', type=int, default=200)
+        parser.add_argument('--dry-run', action='store_true', help='只统计待归档的构建数')
+
+    def handle(self, *args, **options):
+        begin = time.monotonic()
+        count = archive_builds(options['days'], options['keep_last'], options['pipeline'], options['chunk_size'],
+                               options['dry_run'])
+        action = '待归档' if options['dry_run'] else '已归档'
+        self.stdout.write(self.style.SUCCESS(f'{action}构建 {count} 个，耗时 {time.monotonic() - begin:.1f}s'))
@@ -0,0 +1,36 @@
+import time
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from apps.ci_cd.health import backfill
+
+
+class Command(BaseCommand):
+    help = ('按构建记录重算流水线健康汇总（小时 / 天），用于首次上线或修复汇总数据；'
+            '有已归档构建的流水线只重算最后一个归档构建次日之后的汇总，归档前的历史汇总保持不变')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='只重算最近 N 天')
+        parser.add_argument('--since', help='起始日期 YYYY-MM-DD（含）')
+        parser.add_argument('--until', help='结束日期 YYYY-MM-DD（不含）')
+        parser.add_argument('--pipeline', type=int, help='只重算指定流水线')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        start = self.parse_date(options['since'])
+        end = self.parse_date(options['until'])
+        if options['days']:
+            start = timezone.now() - timedelta(days=options['days'])
+        begin = time.monotonic()
+        written = backfill(start, end, options['pipeline'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'写入汇总 {written} 行，耗时 {time.monotonic() - begin:.1f}s'))
+
+    @staticmethod
+    def parse_date(value):
+        if not value:
+            return None
+        try:
+            parsed = datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            raise CommandError(f'日期格式应为 YYYY-MM-DD: {value}')
+        return timezone.make_aware(parsed) if timezone.is_aware(timezone.now()) else parsed
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from apps.ci_cd.sonar_stub import StubSonarServer
+
+
+class Command(BaseCommand):
+    help = '启动本地 SonarQube 桩服务，用于联调质量门禁轮询'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=9000)
+        parser.add_argument('--latency', type=float, default=0.0, help='每个请求的响应延迟（秒）')
+        parser.add_argument('--pending-polls', type=int, default=1, help='任务完成前返回 IN_PROGRESS 的查询次数')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='返回 503 的比例')
+        parser.add_argument('--token', default='', help='要求请求携带的令牌')
+
+    def handle(self, *args, **options):
+        stub = StubSonarServer(options['host'], options['port'], options['latency'], options['pending_polls'],
+                               options['error_rate'], token=options['token'])
+        self.stdout.write(self.style.SUCCESS(f'SonarQube 桩服务已启动: {stub.url}'))
+        try:
+            stub.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stub.server.server_close()
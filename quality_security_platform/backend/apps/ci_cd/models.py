@@ -1,4 +1,5 @@
 import uuid
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from apps.projects.models import Project
 from apps.users.models import User
@@ -19,23 +20,38 @@ class PipelineStage(models.Model):
     order = models.IntegerField('执行顺序')
     script = models.TextField('执行脚本', blank=True)
     timeout = models.IntegerField('超时(秒)', default=3600)
+    cache_enabled = models.BooleanField('启用结果缓存', default=False,
+                                        help_text='仅用于结果只取决于输入、后续阶段不依赖其产物的阶段（检查、扫描、文档等）')
+    cache_inputs = models.TextField('缓存输入', blank=True, help_text='工作目录内的 glob 模式，每行一个，文件内容参与缓存键；未声明时仅在版本为提交 SHA 时缓存')
     class Meta: db_table = 'cicd_stages'; ordering = ['order']
 class BuildRecord(models.Model):
     STATUS_CHOICES = (('pending','等待中'),('running','运行中'),('success','成功'),('failed','失败'),('aborted','终止'))
+    PRIORITY_CHOICES = ((0, '低'), (5, '普通'), (10, '高'))
     build_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
     pipeline = models.ForeignKey(Pipeline, on_delete=models.CASCADE, related_name='builds')
     version = models.CharField('版本/分支', max_length=100)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     triggered_by = models.ForeignKey(User, null=True, on_delete=models.SET_NULL)
+    priority = models.IntegerField('优先级', choices=PRIORITY_CHOICES, default=5)
+    trigger_count = models.IntegerField('合并的触发次数', default=1)
+    dispatched_at = models.DateTimeField('派发时间', null=True, blank=True)
+    external_id = models.CharField('外部构建标识', max_length=200, blank=True)
     started_at = models.DateTimeField(null=True, blank=True)
     finished_at = models.DateTimeField(null=True, blank=True)
     duration = models.IntegerField(null=True, blank=True)
     sonar_task_id = models.CharField(max_length=100, blank=True)
     sonar_quality_gate = models.CharField(max_length=50, blank=True)
+    sonar_checked_at = models.DateTimeField('质量门禁上次轮询时间', null=True, blank=True)
+    sonar_poll_count = models.IntegerField('质量门禁轮询次数', default=0)
     risk_score = models.FloatField(null=True, blank=True)
     log_file = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    class Meta: db_table = 'cicd_builds'; ordering = ['-created_at']
+    class Meta:
+        db_table = 'cicd_builds'; ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'dispatched_at', 'priority'])]
+        # 外部 CI（Jenkins / GitLab）通过 Webhook 上报的构建按 流水线 + 外部标识 唯一
+        constraints = [models.UniqueConstraint(fields=['pipeline', 'external_id'], condition=~models.Q(external_id=''),
+                                               name='cicd_build_external_id_uniq')]
 class BuildStageRecord(models.Model):
     build = models.ForeignKey(BuildRecord, on_delete=models.CASCADE, related_name='stage_records')
     stage = models.ForeignKey(PipelineStage, on_delete=models.CASCADE)
@@ -43,4 +59,82 @@ class BuildStageRecord(models.Model):
     started_at = models.DateTimeField(null=True, blank=True)
     finished_at = models.DateTimeField(null=True, blank=True)
     log_snippet = models.TextField(blank=True)
+    cache_key = models.CharField('缓存键', max_length=64, blank=True)
+    cached = models.BooleanField('命中缓存', default=False)
     class Meta: db_table = 'cicd_build_stages'
+class StageCacheEntry(models.Model):
+    """阶段结果缓存：键为 (脚本哈希, 流水线, 版本, 输入指纹) 的摘要，只缓存成功的结果"""
+    key = models.CharField('缓存键', max_length=64, unique=True)
+    pipeline = models.ForeignKey(Pipeline, on_delete=models.CASCADE, related_name='stage_cache')
+    stage = models.ForeignKey(PipelineStage, on_delete=models.CASCADE, related_name='cache_entries')
+    version = models.CharField('版本/分支', max_length=100)
+    status = models.CharField(max_length=20, choices=BuildRecord.STATUS_CHOICES, default='success')
+    log_snippet = models.TextField(blank=True)
+    duration = models.FloatField('原执行耗时(秒)', default=0)
+    source_build = models.ForeignKey(BuildRecord, null=True, blank=True, on_delete=models.SET_NULL)
+    hit_count = models.IntegerField('命中次数', default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField('最近使用', auto_now_add=True, db_index=True)
+    class Meta: db_table = 'cicd_stage_cache'; ordering = ['-last_used_at']
+class BuildLogChunk(models.Model):
+    """构建日志分块：只追加不修改，offset 为该块在完整日志中的字节偏移，length 为未压缩长度"""
+    build = models.ForeignKey(BuildRecord, on_delete=models.CASCADE, related_name='log_chunks')
+    seq = models.IntegerField('块序号')
+    offset = models.BigIntegerField('字节偏移')
+    length = models.IntegerField('原始长度')
+    compressed = models.BooleanField(default=False)
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        db_table = 'cicd_build_log_chunks'
+        unique_together = ('build', 'seq')
+        indexes = [models.Index(fields=['build', 'offset'])]
+class BuildEvent(models.Model):
+    """构建事件日志：只追加，BuildRecord / BuildStageRecord 的状态是它的投影"""
+    TYPE_CHOICES = (('build_started', '构建开始'), ('stage_started', '阶段开始'), ('stage_finished', '阶段结束'),
+                    ('stage_skipped', '阶段终止'), ('build_finished', '构建结束'), ('build_cancelled', '构建取消'))
+    build = models.ForeignKey(BuildRecord, on_delete=models.CASCADE, related_name='events')
+    type = models.CharField(max_length=30, choices=TYPE_CHOICES)
+    stage = models.ForeignKey(PipelineStage, null=True, blank=True, on_delete=models.SET_NULL)
+    status = models.CharField(max_length=20, choices=BuildRecord.STATUS_CHOICES, blank=True)
+    payload = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    occurred_at = models.DateTimeField('发生时间')
+    class Meta: db_table = 'cicd_build_events'; ordering = ['build', 'id']
+class PipelineHealthRollup(models.Model):
+    """流水线健康汇总：按小时 / 天统计结束的构建数与耗时分布（可合并的对数分桶草图）"""
+    GRANULARITY_CHOICES = (('hour', '小时'), ('day', '天'))
+    granularity = models.CharField(max_length=10, choices=GRANULARITY_CHOICES)
+    bucket = models.DateTimeField('时间桶')
+    pipeline = models.ForeignKey(Pipeline, on_delete=models.CASCADE, related_name='health_rollups')
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='pipeline_health_rollups')
+    total = models.IntegerField(default=0)
+    success = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    aborted = models.IntegerField(default=0)
+    duration_sum = models.FloatField(default=0)
+    duration_count = models.IntegerField(default=0)
+    duration_sketch = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    class Meta:
+        db_table = 'cicd_pipeline_health'; ordering = ['granularity', '-bucket']
+        unique_together = ('granularity', 'pipeline', 'bucket')
+        indexes = [models.Index(fields=['granularity', 'project', 'bucket'])]
+class ArchivedBuild(models.Model):
+    """已归档构建的索引：构建及其阶段、事件、日志以独立 gzip 成员追加到归档文件，按偏移随机读取"""
+    build_id = models.UUIDField(unique=True)
+    original_id = models.IntegerField('原构建主键')
+    pipeline_id = models.IntegerField('流水线主键', db_index=True)
+    pipeline_name = models.CharField(max_length=200)
+    project_id = models.IntegerField('项目主键', db_index=True)
+    version = models.CharField('版本/分支', max_length=100)
+    status = models.CharField(max_length=20, choices=BuildRecord.STATUS_CHOICES)
+    created_at = models.DateTimeField('构建创建时间')
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration = models.IntegerField(null=True, blank=True)
+    file = models.CharField('归档文件', max_length=255)
+    offset = models.BigIntegerField('文件偏移')
+    length = models.IntegerField('压缩长度')
+    archived_at = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        db_table = 'cicd_archived_builds'; ordering = ['-created_at']
+        indexes = [models.Index(fields=['pipeline_id', 'created_at'])]
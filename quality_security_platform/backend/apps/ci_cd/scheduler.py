@@ -0,0 +1,161 @@
+"""
+构建调度：触发只创建 pending 构建并入队，由调度器在并发上限内派发给 run_pipeline
+
+- 优先级高的先派发，同一优先级内优先派发当前占用最少的项目，同项目内先到先得，
+  单个项目的推送风暴只会排满自己的队列，不会挤占其它项目
+- 全局 / 单项目并发上限（constance 动态配置）统计已派发未结束的构建
+- 同一流水线 + 版本尚未派发的构建合并为一个，只累加触发次数、提升优先级
+- 外部 CI 经 Webhook 上报的构建（external_id 非空）不由本平台执行，不排队、不占用并发额度
+"""
+import heapq
+import logging
+from collections import defaultdict, deque
+from contextlib import nullcontext
+from datetime import timedelta
+from constance import config
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from redis.exceptions import LockError
+from .models import BuildRecord
+
+LOCK_KEY = 'cicd:scheduler'
+# 单次调度最多考察的排队构建数
+CANDIDATE_LIMIT = 1000
+# 派发后超过该时间仍未被 worker 启动的构建重新入队（worker 崩溃、消息丢失）
+DISPATCH_TIMEOUT = timedelta(minutes=10)
+logger = logging.getLogger(__name__)
+
+
+def queued():
+    """排队中：尚未派发的 pending 构建"""
+    return BuildRecord.objects.filter(status='pending', dispatched_at__isnull=True, external_id='')
+
+
+def active():
+    """占用并发额度：已派发未启动或运行中"""
+    return BuildRecord.objects.filter(Q(status='running') | Q(status='pending', dispatched_at__isnull=False), external_id='')
+
+
+def enqueue(pipeline, version, user_id=None, priority=5):
+    """
+    入队一次触发，返回 (构建记录, 是否新建)；同一流水线 + 版本已有排队构建时合并
+
+    合并后立即尝试调度，空闲时新构建不等待定时任务
+    """
+    with transaction.atomic():
+        build = (queued().select_for_update().filter(pipeline=pipeline, version=version)
+                 .order_by('created_at').first())
+        if build:
+            BuildRecord.objects.filter(id=build.id).update(trigger_count=F('trigger_count') + 1,
+                                                           priority=Greatest('priority', priority))
+            build.refresh_from_db(fields=['trigger_count', 'priority'])
+            created = False
+        else:
+            build = BuildRecord.objects.create(pipeline=pipeline, version=version, triggered_by_id=user_id, priority=priority)
+            created = True
+    dispatch()
+    return build, created
+
+
+def _scheduler_lock():
+    """多个调度器（请求线程、worker、定时任务）串行执行，避免同时派发超过上限；本地缓存不支持锁时不加锁"""
+    lock = getattr(cache, 'lock', None)
+    return lock(LOCK_KEY, timeout=60, blocking_timeout=10) if lock else nullcontext()
+
+
+def plan(candidates, running, project_running, global_limit, project_limit):
+    """
+    按公平策略选出本次派发的构建
+
+    candidates 为 (构建主键, 项目主键, 优先级) 按优先级降序、创建时间升序排列；
+    同一优先级内用堆每次取当前占用最少的项目（占用相同时取队首更早的项目）
+    """
+    selected = []
+    tiers = defaultdict(lambda: defaultdict(deque))
+    for order, (build_id, project_id, priority) in enumerate(candidates):
+        tiers[priority][project_id].append((order, build_id))
+    for priority in sorted(tiers, reverse=True):
+        heap = [(project_running[project_id], queue[0][0], project_id) for project_id, queue in tiers[priority].items()]
+        heapq.heapify(heap)
+        while heap and running < global_limit:
+            count, _, project_id = heapq.heappop(heap)
+            if count >= project_limit:
+                continue
+            queue = tiers[priority][project_id]
+            selected.append(queue.popleft()[1])
+            running += 1
+            project_running[project_id] = count + 1
+            if queue:
+                heapq.heappush(heap, (count + 1, queue[0][0], project_id))
+    return selected
+
+
+def dispatch():
+    """在并发上限内派发排队构建，返回派发的构建主键；任务在释放调度锁后发送"""
+    from .tasks import run_pipeline
+    try:
+        with _scheduler_lock():
+            selected = _claim()
+    except LockError:
+        # 锁等待超时：其它调度器正在派发，本次跳过，由构建结束或定时任务再次调度
+        logger.warning('构建调度锁获取失败，跳过本次调度', exc_info=True)
+        return []
+    for build_id, pipeline_id, version, user_id in selected:
+        run_pipeline.apply_async(args=(pipeline_id, version, user_id), kwargs={'build_id': build_id})
+    return [build_id for build_id, *_ in selected]
+
+
+def _claim():
+    global_limit, project_limit = config.CICD_MAX_CONCURRENT_BUILDS, config.CICD_MAX_PROJECT_BUILDS
+    project_running = defaultdict(int, active().values_list('pipeline__project_id').annotate(count=Count('id')).order_by())
+    running = sum(project_running.values())
+    if running >= global_limit:
+        return []
+    candidates = list(queued().order_by('-priority', 'created_at', 'id')
+                      .values_list('id', 'pipeline__project_id', 'priority')[:CANDIDATE_LIMIT])
+    selected = plan(candidates, running, project_running, global_limit, project_limit)
+    if not selected:
+        return []
+    # 条件更新认领，已被取消或认领的构建不会重复派发
+    now = timezone.now()
+    BuildRecord.objects.filter(id__in=selected, status='pending', dispatched_at__isnull=True).update(dispatched_at=now)
+    return list(BuildRecord.objects.filter(id__in=selected, status='pending', dispatched_at=now)
+                .order_by('-priority', 'created_at', 'id').values_list('id', 'pipeline_id', 'version', 'triggered_by_id'))
+
+
+def requeue_stale(timeout=DISPATCH_TIMEOUT):
+    """派发后长时间未启动的构建重新排队，返回重新排队的数量"""
+    return (BuildRecord.objects.filter(status='pending', dispatched_at__lt=timezone.now() - timeout)
+            .update(dispatched_at=None))
+
+
+def queue_position(build):
+    """
+    排队位置（从 1 开始）：优先级更高，或同优先级更早创建的排队构建都排在前面
+
+    公平调度会让占用少的项目插队，位置是上限估计；已派发 / 已结束的构建返回 0
+    """
+    if build.status != 'pending' or build.dispatched_at:
+        return 0
+    ahead = queued().filter(Q(priority__gt=build.priority) | Q(priority=build.priority, created_at__lt=build.created_at)
+                            | Q(priority=build.priority, created_at=build.created_at, id__lt=build.id))
+    return ahead.count() + 1
+
+
+def queue_summary():
+    """调度概况：各优先级排队数、运行数及上限，以及按项目的排队 / 运行数"""
+    projects = defaultdict(lambda: {'queued': 0, 'active': 0})
+    for project_id, name, count in queued().values_list('pipeline__project_id', 'pipeline__project__name').annotate(count=Count('id')).order_by():
+        projects[project_id].update(project_name=name, queued=count)
+    for project_id, name, count in active().values_list('pipeline__project_id', 'pipeline__project__name').annotate(count=Count('id')).order_by():
+        projects[project_id].update(project_name=name, active=count)
+    return {
+        'queued': dict(queued().values_list('priority').annotate(count=Count('id')).order_by()),
+        'active': sum(project['active'] for project in projects.values()),
+        'global_limit': config.CICD_MAX_CONCURRENT_BUILDS,
+        'project_limit': config.CICD_MAX_PROJECT_BUILDS,
+        'projects': [dict(project_id=project_id, **project) for project_id, project in projects.items()],
+    }
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Pipeline, PipelineStage, BuildRecord, BuildStageRecord
+from .models import Pipeline, PipelineStage, BuildRecord, BuildStageRecord, StageCacheEntry, BuildEvent, PipelineHealthRollup, ArchivedBuild
 class PipelineStageSerializer(serializers.ModelSerializer):
     class Meta: model = PipelineStage; fields = '__all__'
 class PipelineSerializer(serializers.ModelSerializer):
@@ -13,3 +13,53 @@ class BuildRecordSerializer(serializers.ModelSerializer):
     project_name = serializers.CharField(source='pipeline.project.name', read_only=True)
     stage_records = BuildStageRecordSerializer(many=True, read_only=True)
     class Meta: model = BuildRecord; fields = '__all__'
+class BuildStageSummarySerializer(serializers.ModelSerializer):
+    """阶段摘要：不含日志尾部"""
+    stage_name = serializers.CharField(source='stage.name', read_only=True)
+    class Meta: model = BuildStageRecord; fields = ('id', 'stage', 'stage_name', 'status', 'started_at', 'finished_at', 'cached')
+BUILD_SUMMARY_FIELDS = ('id', 'build_id', 'pipeline', 'version', 'status', 'priority', 'trigger_count', 'triggered_by',
+                        'started_at', 'finished_at', 'duration', 'sonar_quality_gate', 'risk_score', 'created_at')
+class BuildRecordSummarySerializer(serializers.ModelSerializer):
+    """列表模式：只含摘要字段，不嵌套阶段记录"""
+    pipeline_name = serializers.CharField(source='pipeline.name', read_only=True)
+    project_name = serializers.CharField(source='pipeline.project.name', read_only=True)
+    class Meta: model = BuildRecord; fields = (*BUILD_SUMMARY_FIELDS, 'pipeline_name', 'project_name')
+class BuildRecordExpandedSerializer(BuildRecordSummarySerializer):
+    """列表模式 + ?expand=stages：附带阶段摘要"""
+    stage_records = BuildStageSummarySerializer(many=True, read_only=True)
+    class Meta: model = BuildRecord; fields = (*BUILD_SUMMARY_FIELDS, 'pipeline_name', 'project_name', 'stage_records')
+class PipelineTriggerSerializer(serializers.Serializer):
+    version = serializers.CharField(max_length=100, default='main')
+    priority = serializers.ChoiceField(choices=BuildRecord.PRIORITY_CHOICES, default=5)
+class StageCacheEntrySerializer(serializers.ModelSerializer):
+    pipeline_name = serializers.CharField(source='pipeline.name', read_only=True)
+    stage_name = serializers.CharField(source='stage.name', read_only=True)
+    class Meta: model = StageCacheEntry; fields = '__all__'
+class BuildEventSerializer(serializers.ModelSerializer):
+    stage_name = serializers.CharField(source='stage.name', read_only=True, default=None)
+    class Meta: model = BuildEvent; fields = ('id', 'type', 'stage', 'stage_name', 'status', 'payload', 'occurred_at')
+class PipelineHealthRollupSerializer(serializers.ModelSerializer):
+    pipeline_name = serializers.CharField(source='pipeline.name', read_only=True)
+    class Meta: model = PipelineHealthRollup; exclude = ('duration_sketch',)
+class ArchivedBuildSerializer(serializers.ModelSerializer):
+    class Meta: model = ArchivedBuild; fields = '__all__'
+class WebhookEventSerializer(serializers.Serializer):
+    """外部 CI 上报的构建 / 阶段事件；build 为外部构建标识（如 Jenkins 的 job#number）"""
+    TYPE_CHOICES = ('build_started', 'stage_started', 'stage_finished', 'build_finished')
+    FINAL_STATUSES = ('success', 'failed', 'aborted')
+    delivery_id = serializers.CharField(max_length=200)
+    pipeline = serializers.IntegerField(min_value=1)
+    build = serializers.CharField(max_length=200)
+    type = serializers.ChoiceField(choices=TYPE_CHOICES)
+    version = serializers.CharField(max_length=100, required=False, default='', allow_blank=True)
+    stage = serializers.CharField(max_length=100, required=False, default='', allow_blank=True)
+    order = serializers.IntegerField(required=False, allow_null=True, default=None)
+    status = serializers.ChoiceField(choices=FINAL_STATUSES, required=False, default='', allow_blank=True)
+    timestamp = serializers.DateTimeField(required=False, allow_null=True, default=None)
+    output = serializers.CharField(required=False, default='', allow_blank=True, trim_whitespace=False)
+    def validate(self, attrs):
+        if attrs['type'].startswith('stage_') and not attrs['stage']:
+            raise serializers.ValidationError({'stage': '阶段事件必须指定 stage'})
+        if attrs['type'].endswith('_finished') and not attrs['status']:
+            raise serializers.ValidationError({'status': '结束事件必须指定 status'})
+        return attrs
@@ -0,0 +1,179 @@
+"""
+SonarQube 质量门禁轮询：构建阶段输出中的 CE 任务 ID 记入 sonar_task_id，定时任务批量查询分析结果并写回 sonar_quality_gate
+
+一次轮询把所有到期的任务交给事件循环并发查询，请求经共享 Session 的连接池复用 HTTP 连接，
+同时进行的请求数不超过连接池大小；429 / 5xx / 连接错误按指数退避（或 Retry-After）重试，单次等待不超过 MAX_BACKOFF 秒，单个任务失败不影响其它任务。
+尚未完成的任务按轮询次数退避（POLL_INTERVAL 起翻倍，最长 MAX_POLL_INTERVAL），结果与轮询状态一次 bulk_update 写回
+"""
+import asyncio
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import requests
+from constance import config
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+from apps.risk.dirty import mark_dirty
+from .models import BuildRecord
+
+# sonar-scanner 结束时输出的 CE 任务地址：.../api/ce/task?id=<任务ID>
+TASK_URL_RE = re.compile(r'/api/ce/task\?id=([\w-]+)')
+PENDING_STATUSES = ('PENDING', 'IN_PROGRESS')
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+POLL_INTERVAL = 60
+MAX_POLL_INTERVAL = 900
+# 单次重试等待上限（秒）
+MAX_BACKOFF = 30
+BATCH_SIZE = 1000
+DEFAULT_CONCURRENCY = 10
+DEFAULT_TIMEOUT_HOURS = 24
+POLL_FIELDS = ('sonar_quality_gate', 'sonar_checked_at', 'sonar_poll_count')
+logger = logging.getLogger(__name__)
+
+
+class SonarError(Exception):
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def extract_task_id(output):
+    match = TASK_URL_RE.search(output or '')
+    return match.group(1) if match else ''
+
+
+class SonarClient:
+    """
+    SonarQube Web API 客户端：协程接口，HTTP 请求在与连接池同样大小的线程池中执行
+
+    同一个客户端在一次轮询内共享连接，用完需 close()（或作为上下文管理器使用）
+    """
+
+    def __init__(self, base_url, token='', concurrency=DEFAULT_CONCURRENCY, timeout=10, retries=3, backoff=0.5,
+                 max_backoff=MAX_BACKOFF):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if token:
+            # SonarQube 令牌作为 Basic 认证的用户名，密码为空
+            self.session.auth = (token, '')
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='sonar')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
+
+    async def get(self, path, **params):
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.retries + 1):
+            delay = self.backoff * 2 ** attempt
+            try:
+                response = await loop.run_in_executor(
+                    self.executor, lambda: self.session.get(self.base_url + path, params=params, timeout=self.timeout))
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = SonarError(f'SonarQube 请求失败: {path}: {e}')
+            else:
+                if response.status_code not in RETRY_STATUS_CODES:
+                    if response.status_code != 200:
+                        raise SonarError(f'SonarQube 返回 {response.status_code}: {path}', response.status_code)
+                    return response.json()
+                error = SonarError(f'SonarQube 返回 {response.status_code}: {path}', response.status_code)
+                retry_after = response.headers.get('Retry-After', '')
+                if retry_after.isdigit():
+                    delay = max(delay, int(retry_after))
+            if attempt < self.retries:
+                # Retry-After 由服务端决定，同样不超过 max_backoff，避免一次轮询被挂起数小时
+                await asyncio.sleep(min(delay, self.max_backoff))
+        raise error
+
+    async def quality_gate(self, task_id):
+        """返回 (CE 任务状态, 质量门禁状态)；分析未完成时门禁状态为 None，分析失败 / 取消时为任务状态"""
+        task = (await self.get('/api/ce/task', id=task_id))['task']
+        if task['status'] in PENDING_STATUSES:
+            return task['status'], None
+        if task['status'] != 'SUCCESS' or not task.get('analysisId'):
+            return task['status'], task['status']
+        project_status = await self.get('/api/qualitygates/project_status', analysisId=task['analysisId'])
+        return task['status'], project_status['projectStatus']['status']
+
+    async def quality_gates(self, task_ids):
+        """并发查询多个任务，返回 {任务ID: (任务状态, 门禁状态) 或异常}"""
+        results = await asyncio.gather(*(self.quality_gate(task_id) for task_id in task_ids), return_exceptions=True)
+        return dict(zip(task_ids, results))
+
+
+def client():
+    return SonarClient(config.SONAR_HOST_URL, config.SONAR_TOKEN,
+                       getattr(settings, 'CICD_SONAR_CONCURRENCY', DEFAULT_CONCURRENCY))
+
+
+def next_poll_at(build):
+    if build.sonar_checked_at is None:
+        return None
+    return build.sonar_checked_at + timedelta(seconds=min(POLL_INTERVAL * 2 ** build.sonar_poll_count, MAX_POLL_INTERVAL))
+
+
+def poll_pending(limit=BATCH_SIZE, sonar=None):
+    """轮询到期的未出结果的构建并批量写回，返回各类结果的数量"""
+    now = timezone.now()
+    deadline = now - timedelta(hours=getattr(settings, 'CICD_SONAR_POLL_TIMEOUT_HOURS', DEFAULT_TIMEOUT_HOURS))
+    pending = (BuildRecord.objects.exclude(sonar_task_id='').filter(sonar_quality_gate='')
+               .order_by(F('sonar_checked_at').asc(nulls_first=True), 'id')
+               .only('id', 'sonar_task_id', 'sonar_checked_at', 'sonar_poll_count', 'created_at')[:limit])
+    counts = {'polled': 0, 'completed': 0, 'pending': 0, 'errors': 0, 'timed_out': 0}
+    due, changed = {}, []
+    for build in pending:
+        if build.created_at < deadline:
+            build.sonar_quality_gate = 'TIMEOUT'
+            counts['timed_out'] += 1
+            changed.append(build)
+        elif next_poll_at(build) is None or next_poll_at(build) <= now:
+            due.setdefault(build.sonar_task_id, []).append(build)
+    if due:
+        owned = sonar is None
+        sonar = sonar or client()
+        try:
+            results = asyncio.run(sonar.quality_gates(list(due)))
+        finally:
+            if owned:
+                sonar.close()
+        for task_id, result in results.items():
+            if isinstance(result, SonarError) and result.status_code == 404:
+                # SonarQube 中已不存在的任务（被清理或 ID 错误）不再轮询
+                result = ('NOT_FOUND', 'NOT_FOUND')
+            elif isinstance(result, Exception):
+                logger.warning('SonarQube 任务 %s 查询失败: %s', task_id, result)
+                counts['errors'] += 1
+                result = (None, None)
+            gate = result[1]
+            if gate:
+                counts['completed'] += len(due[task_id])
+            elif result[0]:
+                counts['pending'] += len(due[task_id])
+            for build in due[task_id]:
+                build.sonar_quality_gate = gate or ''
+                build.sonar_checked_at = now
+                build.sonar_poll_count += 1
+                changed.append(build)
+        counts['polled'] = len(due)
+    if changed:
+        BuildRecord.objects.bulk_update(changed, POLL_FIELDS, batch_size=500)
+        # 有新的门禁结果时重算对应项目的代码质量分
+        done = [build.id for build in changed if build.sonar_quality_gate]
+        mark_dirty(BuildRecord.objects.filter(id__in=done).values_list('pipeline__project_id', flat=True).distinct())
+    return counts
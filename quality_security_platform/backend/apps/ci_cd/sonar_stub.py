@@ -0,0 +1,131 @@
+"""
+本地 SonarQube 桩服务：实现质量门禁轮询用到的 /api/ce/task 与 /api/qualitygates/project_status，
+用于联调和压测轮询任务，不依赖真实的 SonarQube
+
+任务被查询 pending_polls 次之前返回 IN_PROGRESS，之后返回 SUCCESS 及登记的门禁状态；
+可模拟响应延迟、按比例返回 503 或让接下来的 fail_requests 个请求返回 503（带 Retry-After 时附带该响应头），
+未登记的任务 ID 默认视为门禁通过（auto_create=False 时返回 404）
+"""
+import base64
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class StubSonarServer:
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, pending_polls=1, error_rate=0.0, auto_create=True, token='',
+                 fail_requests=0, retry_after=None):
+        self.latency = latency
+        self.pending_polls = pending_polls
+        self.error_rate = error_rate
+        self.fail_requests = fail_requests
+        self.retry_after = retry_after
+        self.auto_create = auto_create
+        self.token = token
+        self.tasks = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def add_task(self, task_id, gate='OK', status='SUCCESS', pending_polls=None):
+        self.tasks[task_id] = {'gate': gate, 'status': status, 'polls': 0,
+                               'pending_polls': self.pending_polls if pending_polls is None else pending_polls}
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='sonar-stub', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def task_status(self, task_id):
+        with self.lock:
+            task = self.tasks.get(task_id)
+            if task is None and self.auto_create:
+                self.add_task(task_id)
+                task = self.tasks[task_id]
+            if task is None:
+                return None
+            task['polls'] += 1
+            status = 'IN_PROGRESS' if task['polls'] <= task['pending_polls'] else task['status']
+        return {'task': {'id': task_id, 'type': 'REPORT', 'status': status,
+                         'analysisId': f'AN-{task_id}' if status == 'SUCCESS' else None}}
+
+    def gate_status(self, analysis_id):
+        task = self.tasks.get(analysis_id[3:]) if analysis_id.startswith('AN-') else None
+        if task is None:
+            return None
+        return {'projectStatus': {'status': task['gate'], 'conditions': []}}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # 保持连接，客户端的连接池可以复用
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with stub.lock:
+                    stub.requests += 1
+                    failing = stub.fail_requests > 0
+                    if failing:
+                        stub.fail_requests -= 1
+                url = urlparse(self.path)
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if stub.token and self.headers.get('Authorization', '') != self.basic_auth(stub.token):
+                    return self.reply(401, {'errors': [{'msg': 'Unauthorized'}]})
+                if failing or (stub.error_rate and random.random() < stub.error_rate):
+                    headers = {'Retry-After': str(stub.retry_after)} if stub.retry_after is not None else {}
+                    return self.reply(503, {'errors': [{'msg': 'Service Unavailable'}]}, headers)
+                if url.path == '/api/ce/task':
+                    data = stub.task_status(params.get('id', ''))
+                elif url.path == '/api/qualitygates/project_status':
+                    data = stub.gate_status(params.get('analysisId', ''))
+                else:
+                    data = None
+                if data is None:
+                    return self.reply(404, {'errors': [{'msg': 'Not found'}]})
+                self.reply(200, data)
+
+            @staticmethod
+            def basic_auth(token):
+                return 'Basic ' + base64.b64encode(f'{token}:'.encode()).decode()
+
+            def reply(self, code, data, headers=None):
+                body = json.dumps(data).encode()
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                try:
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # 客户端已超时断开
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,125 @@
+"""
+阶段结果缓存：启用缓存的阶段在执行前按 (脚本哈希, 流水线, 阶段, 版本, 输入指纹) 计算缓存键，
+命中时直接复用上次成功的结果和日志尾部，不再启动子进程
+
+版本通常是分支名，同一分支的不同提交版本相同，因此只有声明了输入（cache_inputs）、
+或版本本身是提交 SHA 的阶段才使用缓存，否则同一分支的后续提交会一直复用第一次的结果
+
+输入指纹为阶段声明的 glob 模式在工作目录内匹配到的文件（相对路径 + 内容摘要），在阶段执行前计算，
+因此可以依赖前序阶段（如检出）产生的文件。只缓存成功的结果，失败的阶段每次都重新执行；
+过期（TTL）和超出容量（按最近使用淘汰）的条目由定时任务清理
+"""
+import glob
+import hashlib
+import os
+import re
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Count, ExpressionWrapper, F, FloatField, Q, Sum
+from django.utils import timezone
+from .models import BuildStageRecord, StageCacheEntry
+
+DEFAULT_TTL_DAYS = 7
+DEFAULT_MAX_ENTRIES = 10000
+READ_SIZE = 1024 * 1024
+# 完整的 SHA-1 / SHA-256 提交哈希
+COMMIT_SHA = re.compile(r'[0-9a-f]{40}|[0-9a-f]{64}')
+
+
+def ttl():
+    return timedelta(days=getattr(settings, 'CICD_STAGE_CACHE_TTL_DAYS', DEFAULT_TTL_DAYS))
+
+
+def input_patterns(stage):
+    return [line.strip() for line in (stage.cache_inputs or '').splitlines() if line.strip()]
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fp:
+        for block in iter(lambda: fp.read(READ_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def input_fingerprint(workspace, patterns):
+    """声明输入的指纹：匹配文件按相对路径排序后逐个摘要；没有声明输入时为空串"""
+    if not patterns:
+        return ''
+    root = os.path.realpath(workspace)
+    paths = set()
+    for pattern in patterns:
+        for path in glob.glob(os.path.join(root, pattern), recursive=True):
+            # 不允许通过 ../ 或符号链接引用工作目录外的文件
+            if os.path.isfile(path) and os.path.realpath(path).startswith(root + os.sep):
+                paths.add(os.path.relpath(path, root))
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        digest.update(f'{path}\0{file_digest(os.path.join(root, path))}\n'.encode())
+    return digest.hexdigest()
+
+
+def cacheable(stage, version):
+    """阶段结果能否缓存：声明了输入，或版本是确定的提交 SHA"""
+    return bool(input_patterns(stage)) or bool(COMMIT_SHA.fullmatch(version or ''))
+
+
+def cache_key(stage, version, workspace):
+    """缓存键；不可缓存时返回空串"""
+    if not cacheable(stage, version):
+        return ''
+    script_hash = hashlib.sha256((stage.script or '').encode()).hexdigest()
+    fingerprint = input_fingerprint(workspace, input_patterns(stage))
+    return hashlib.sha256(f'{script_hash}\0{stage.pipeline_id}\0{stage.id}\0{version}\0{fingerprint}'.encode()).hexdigest()
+
+
+def lookup(key):
+    """查找未过期的缓存条目，命中时更新命中次数与最近使用时间"""
+    now = timezone.now()
+    entry = StageCacheEntry.objects.filter(key=key, created_at__gte=now - ttl()).first()
+    if entry:
+        StageCacheEntry.objects.filter(id=entry.id).update(hit_count=F('hit_count') + 1, last_used_at=now)
+    return entry
+
+
+def store(key, result, version, build_id=None):
+    """保存成功阶段的结果；同一键被并行构建同时写入时保留最新的一份"""
+    if result.status != 'success':
+        return None
+    entry, _ = StageCacheEntry.objects.update_or_create(key=key, defaults={
+        'pipeline_id': result.stage.pipeline_id, 'stage': result.stage, 'version': version, 'status': result.status,
+        'log_snippet': result.output, 'duration': result.duration, 'source_build_id': build_id,
+        'created_at': timezone.now(), 'last_used_at': timezone.now(),
+    })
+    return entry
+
+
+def prune(max_entries=None):
+    """删除过期条目，超出容量时按最近使用时间淘汰最久未用的条目，返回删除数"""
+    max_entries = max_entries or getattr(settings, 'CICD_STAGE_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+    deleted, _ = StageCacheEntry.objects.filter(created_at__lt=timezone.now() - ttl()).delete()
+    boundary = StageCacheEntry.objects.order_by('-last_used_at', '-id').values_list('last_used_at', 'id')[max_entries:max_entries + 1]
+    if boundary:
+        last_used_at, pk = boundary[0]
+        evicted, _ = StageCacheEntry.objects.filter(Q(last_used_at__lt=last_used_at) | Q(last_used_at=last_used_at, id__lte=pk)).delete()
+        deleted += evicted
+    return deleted
+
+
+def stats(days=7, pipeline_id=None):
+    """命中率：窗口内启用缓存的阶段执行次数与命中次数，以及当前条目累计节省的执行时间"""
+    records = BuildStageRecord.objects.exclude(cache_key='').filter(started_at__gte=timezone.now() - timedelta(days=days))
+    entries = StageCacheEntry.objects.all()
+    if pipeline_id:
+        records = records.filter(build__pipeline_id=pipeline_id)
+        entries = entries.filter(pipeline_id=pipeline_id)
+    counts = records.aggregate(lookups=Count('id'), hits=Count('id', filter=Q(cached=True)))
+    totals = entries.aggregate(entries=Count('id'), saved_seconds=Sum(ExpressionWrapper(F('duration') * F('hit_count'), output_field=FloatField())))
+    return {
+        'days': days,
+        'lookups': counts['lookups'],
+        'hits': counts['hits'],
+        'hit_rate': round(counts['hits'] / counts['lookups'], 4) if counts['lookups'] else None,
+        'entries': totals['entries'],
+        'saved_seconds': round(totals['saved_seconds'] or 0, 1),
+    }
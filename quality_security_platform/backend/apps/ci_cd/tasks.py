@@ -1,41 +1,132 @@
 from celery import shared_task
-import time
 @shared_task(bind=True, max_retries=3)
-def run_pipeline(self, pipeline_id, version, user_id):
-    from .models import Pipeline, BuildRecord, BuildStageRecord
+def run_pipeline(self, pipeline_id, version, user_id, build_id=None):
+    from .models import Pipeline, BuildRecord
+    from .buildlog import BuildLogWriter
+    from .executor import PipelineExecutor, StageResult
+    from .journal import BuildJournal
+    from .scheduler import dispatch
+    from . import sonar, stagecache
+    from apps.risk.dirty import mark_dirty
+    from django.conf import settings
     from django.utils import timezone
+    import os
+    import shutil
     pipeline = Pipeline.objects.get(id=pipeline_id)
-    build = BuildRecord.objects.create(
-        pipeline=pipeline,
-        version=version,
-        status='running',
-        triggered_by_id=user_id,
-        started_at=timezone.now()
-    )
+    if build_id:
+        # 调度器派发的排队构建：条件更新认领，排队期间被取消的构建不再执行；
+        # 重试时沿用同一条记录，失败的尝试已将构建置回 pending（见 BuildJournal.build_finished）
+        if not BuildRecord.objects.filter(id=build_id, status='pending').update(status='running', started_at=timezone.now()):
+            return build_id
+        build = BuildRecord.objects.get(id=build_id)
+    else:
+        build = BuildRecord.objects.create(
+            pipeline=pipeline,
+            version=version,
+            status='running',
+            triggered_by_id=user_id,
+            started_at=timezone.now()
+        )
+    workspace = os.path.join(settings.CICD_WORKSPACE_ROOT, str(build.build_id))
+    os.makedirs(workspace, exist_ok=True)
+    env = dict(os.environ, BUILD_ID=str(build.build_id), PIPELINE_ID=str(pipeline.id), PIPELINE_NAME=pipeline.name,
+               PROJECT_ID=str(pipeline.project_id), BUILD_VERSION=version, WORKSPACE=workspace)
+    cache_keys = {}
+    # 完整日志分块追加写入，阶段记录只保留输出尾部
+    log = BuildLogWriter(build.id)
+    # 状态变化写入事件日志，阶段 / 构建记录按批投影更新
+    journal = BuildJournal(build)
+    journal.build_started(self.request.retries)
+
+    def level_started(stages):
+        # 同一层的阶段同时开始
+        journal.stages_started(stages)
+        for stage in stages:
+            log.write(f'==> 阶段 {stage.name} 开始\n')
+
+    def resolve_cached(stage):
+        # 启用缓存的阶段执行前按脚本、版本与声明输入计算缓存键，命中则复用上次成功的结果
+        if not stage.cache_enabled:
+            return None
+        key = stagecache.cache_key(stage, version, workspace)
+        if not key:
+            log.write_stage(stage.name, '未声明缓存输入且版本不是提交 SHA，不使用结果缓存\n')
+            return None
+        cache_keys[stage.id] = key
+        entry = stagecache.lookup(key)
+        if entry is None:
+            return None
+        now = timezone.now()
+        log.write_stage(stage.name, f'命中结果缓存（来源构建 #{entry.source_build_id}，原耗时 {entry.duration:.1f}s）\n')
+        return StageResult(stage, entry.status, now, now, exit_code=0, output=entry.log_snippet, cached=True)
+
+    def stage_finished(result):
+        cache_key = cache_keys.get(result.stage.id, '')
+        journal.stage_finished(result, cache_key)
+        if cache_key and not result.cached:
+            stagecache.store(cache_key, result, version, build.id)
+        log.end_stage(result.stage.name, f'阶段结束: {result.status}，耗时 {result.duration:.1f}s')
+        # 扫描阶段输出中的 CE 任务 ID，由质量门禁轮询任务查询结果
+        task_id = '' if build.sonar_task_id else sonar.extract_task_id(result.output)
+        if task_id:
+            build.sonar_task_id = task_id
+            BuildRecord.objects.filter(id=build.id).update(sonar_task_id=task_id, sonar_quality_gate='')
+
+    def stages_skipped(stages):
+        journal.stages_skipped(stages)
+        log.write(f'==> 前序阶段失败，终止: {", ".join(stage.name for stage in stages)}\n')
+
+    status = 'failed'
+    error = None
     try:
-        # 按顺序执行阶段
-        for stage in pipeline.stages.all():
-            stage_record = BuildStageRecord.objects.create(
-                build=build,
-                stage=stage,
-                status='running',
-                started_at=timezone.now()
-            )
-            # 模拟执行
-            time.sleep(2)
-            stage_record.status = 'success'
-            stage_record.finished_at = timezone.now()
-            stage_record.save()
-        build.status = 'success'
+        # order 相同的阶段并行执行，层与层之间串行
+        executor = PipelineExecutor(
+            list(pipeline.stages.all()), env=env, cwd=workspace, max_workers=settings.CICD_MAX_PARALLEL_STAGES,
+            on_level_start=level_started, on_stage_finish=stage_finished, on_skipped=stages_skipped,
+            on_output=lambda stage, text: log.write_stage(stage.name, text), resolve=resolve_cached,
+        )
+        status, _ = executor.run()
     except Exception as e:
-        build.status = 'failed'
-        raise self.retry(exc=e)
+        error = e
     finally:
-        build.finished_at = timezone.now()
-        build.duration = (build.finished_at - build.started_at).seconds
-        build.save()
+        log.close()
+        # 还会重试的失败尝试不计入健康汇总，构建置回 pending 等待重试认领
+        journal.build_finished(status, final=error is None or self.request.retries >= self.max_retries)
+        shutil.rmtree(workspace, ignore_errors=True)
+        # 释放的并发额度立即派发给排队的构建
+        dispatch()
+        mark_dirty([pipeline.project_id])
+    if error is not None:
+        # 构建已置回 pending 后再投递重试任务；重试次数用尽时 retry 重新抛出原异常
+        raise self.retry(exc=error, kwargs={'build_id': build.id})
     return build.id
 @shared_task
+def schedule_builds():
+    """定时调度：回收派发后未启动的构建，并在并发额度内派发排队构建"""
+    from .scheduler import dispatch, requeue_stale
+    requeue_stale()
+    return len(dispatch())
+@shared_task
+def prune_stage_cache():
+    """清理过期及超出容量的阶段结果缓存"""
+    from .stagecache import prune
+    return prune()
+@shared_task
+def archive_old_builds():
+    """归档超过保留期的构建，移出热表"""
+    from .archive import archive_builds
+    return archive_builds()
+@shared_task
+def poll_sonar_quality_gates():
+    """并发轮询未出结果的 SonarQube 分析任务，批量写回质量门禁状态"""
+    from .sonar import poll_pending
+    return poll_pending()
+@shared_task
+def apply_webhook_events():
+    """批量应用外部 CI 上报的 Webhook 事件"""
+    from .webhook import consume
+    return consume()
+@shared_task
 def send_build_notification(build_id):
     """构建失败通知"""
     from .models import BuildRecord
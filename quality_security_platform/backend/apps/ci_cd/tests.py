@@ -0,0 +1,416 @@
+import json
+import tempfile
+import zlib
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from apps.projects.models import Environment, Project
+from apps.users.models import User
+from . import archive, buildlog, health, scheduler, sonar, stagecache, webhook
+from .journal import BuildJournal
+from .models import ArchivedBuild, BuildEvent, BuildLogChunk, BuildRecord, BuildStageRecord, Pipeline, PipelineHealthRollup, PipelineStage
+from .sonar_stub import StubSonarServer
+from .tasks import run_pipeline
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def create_pipeline(name='demo', stages=2):
+    environment, _ = Environment.objects.get_or_create(name='test')
+    project = Project.objects.create(name=name, git_repo='https://git.example.com/demo.git', environment=environment,
+                                     deploy_dir='/opt/demo', start_script='start.sh', stop_script='stop.sh')
+    pipeline = Pipeline.objects.create(name=f'{name}-pipeline', project=project)
+    for order in range(1, stages + 1):
+        PipelineStage.objects.create(pipeline=pipeline, name=f'stage{order}', order=order, script='true')
+    return pipeline
+
+
+def create_builds(pipeline, count, user=None):
+    stages = list(pipeline.stages.all())
+    builds = []
+    for _ in range(count):
+        build = BuildRecord.objects.create(pipeline=pipeline, version='main', status='success', triggered_by=user)
+        BuildStageRecord.objects.bulk_create([BuildStageRecord(build=build, stage=stage, status='success', log_snippet='ok')
+                                              for stage in stages])
+        builds.append(build)
+    return builds
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BuildRecordQueryCountTests(APITestCase):
+    """构建列表 / 详情的查询数与返回行数、阶段数无关"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='tester', password='tester')
+        self.client.force_authenticate(self.user)
+        self.pipeline = create_pipeline()
+
+    def assertListQueries(self, rows, queries, params=None):
+        BuildRecord.objects.all().delete()
+        create_builds(self.pipeline, rows, self.user)
+        with self.assertNumQueries(queries):
+            response = self.client.get('/api/cicd/builds/', params or {})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), rows)
+        return response
+
+    def test_list_constant_queries(self):
+        # 计数 + 一页构建（流水线 / 项目名称随主查询 JOIN 取出）
+        for rows in (3, 20):
+            response = self.assertListQueries(rows, 2)
+        result = response.data['results'][0]
+        self.assertEqual(result['pipeline_name'], 'demo-pipeline')
+        self.assertEqual(result['project_name'], 'demo')
+        self.assertNotIn('stage_records', result)
+
+    def test_list_expand_stages_constant_queries(self):
+        # 另加一条阶段记录预取
+        for rows in (3, 20):
+            response = self.assertListQueries(rows, 3, {'expand': 'stages'})
+        stages = response.data['results'][0]['stage_records']
+        self.assertEqual(len(stages), 2)
+        self.assertNotIn('log_snippet', stages[0])
+
+    def test_detail_constant_queries(self):
+        build = create_builds(self.pipeline, 1, self.user)[0]
+        PipelineStage.objects.create(pipeline=self.pipeline, name='stage3', order=3, script='true')
+        BuildStageRecord.objects.create(build=build, stage=self.pipeline.stages.get(name='stage3'), status='success')
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/cicd/builds/{build.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['stage_records']), 3)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SchedulerExternalBuildTests(APITestCase):
+    """外部 CI 上报的构建不进入调度队列，也不占用并发额度"""
+
+    def test_external_builds_excluded(self):
+        pipeline = create_pipeline()
+        BuildRecord.objects.create(pipeline=pipeline, version='main', external_id='jenkins-1')
+        BuildRecord.objects.create(pipeline=pipeline, version='main', external_id='jenkins-2', status='running')
+        own = BuildRecord.objects.create(pipeline=pipeline, version='main')
+        self.assertEqual(list(scheduler.queued().values_list('id', flat=True)), [own.id])
+        self.assertFalse(scheduler.active().exists())
+        summary = scheduler.queue_summary()
+        self.assertEqual(summary['active'], 0)
+        self.assertEqual(summary['queued'], {5: 1})
+
+
+
+@mock.patch('apps.risk.dirty.mark_dirty')
+class RunPipelineRetryTests(TestCase):
+    """失败后重试的构建在重试倒计时内保持已派发的排队状态，继续占用并发额度"""
+
+    def test_retry_keeps_slot(self, mark_dirty):
+        build = BuildRecord.objects.create(pipeline=create_pipeline(), version='main', dispatched_at=timezone.now())
+        states = []
+
+        def dispatch():
+            build.refresh_from_db()
+            states.append((build.status, scheduler.active().filter(id=build.id).exists()))
+            return []
+
+        executor = mock.Mock()
+        executor.return_value.run.side_effect = [RuntimeError('agent lost'), ('success', [])]
+        with tempfile.TemporaryDirectory() as workspace, override_settings(CICD_WORKSPACE_ROOT=workspace), \
+                mock.patch('apps.ci_cd.executor.PipelineExecutor', executor), \
+                mock.patch('apps.ci_cd.scheduler.dispatch', dispatch):
+            result = run_pipeline.apply(args=(build.pipeline_id, 'main', None), kwargs={'build_id': build.id})
+        self.assertEqual(result.get(), build.id)
+        self.assertEqual(states, [('pending', True), ('success', False)])
+        self.assertEqual(list(PipelineHealthRollup.objects.values_list('total', 'success')), [(1, 1)] * 2)
+
+class StageCacheKeyTests(SimpleTestCase):
+    """缓存键区分阶段；未声明输入时只有提交 SHA 版本可缓存"""
+
+    def test_cache_key(self):
+        sha = 'a' * 40
+        with tempfile.TemporaryDirectory() as workspace:
+            first = PipelineStage(id=1, pipeline_id=1, name='lint', order=1, script='make lint')
+            second = PipelineStage(id=2, pipeline_id=1, name='lint-copy', order=2, script='make lint')
+            self.assertEqual(stagecache.cache_key(first, 'main', workspace), '')
+            self.assertNotEqual(stagecache.cache_key(first, sha, workspace), '')
+            self.assertNotEqual(stagecache.cache_key(first, sha, workspace), stagecache.cache_key(second, sha, workspace))
+            first.cache_inputs = second.cache_inputs = '*.py'
+            self.assertNotEqual(stagecache.cache_key(first, 'main', workspace), '')
+            self.assertNotEqual(stagecache.cache_key(first, 'main', workspace), stagecache.cache_key(second, 'main', workspace))
+
+
+class HealthRollupTests(TestCase):
+    """健康汇总只统计构建的最后一次尝试，天桶按本地日期划分"""
+
+    def test_retried_attempt_not_counted(self):
+        build = create_builds(create_pipeline(), 1)[0]
+        BuildRecord.objects.filter(id=build.id).update(status='running', started_at=timezone.now())
+        build.refresh_from_db()
+        BuildJournal(build).build_finished('failed', final=False)
+        self.assertFalse(PipelineHealthRollup.objects.exists())
+        BuildRecord.objects.filter(id=build.id).update(status='running')
+        BuildJournal(build).build_finished('success')
+        # 小时、天各一行，均只计入最后一次成功的尝试
+        self.assertEqual(list(PipelineHealthRollup.objects.values_list('total', 'success', 'failed')), [(1, 1, 0)] * 2)
+
+    @override_settings(USE_TZ=True, TIME_ZONE='Asia/Shanghai')
+    def test_day_bucket_local_date(self):
+        # UTC 17:30 为东八区次日 01:30
+        bucket = health.truncate(datetime(2024, 3, 1, 17, 30, tzinfo=dt_timezone.utc), 'day')
+        self.assertEqual(timezone.localtime(bucket).replace(tzinfo=None), datetime(2024, 3, 2))
+
+    def test_backfill_keeps_archived_history(self):
+        pipeline = create_pipeline()
+        archived_day, later_day = datetime(2024, 3, 1, 10), datetime(2024, 3, 3, 10)
+        hot, later = create_builds(pipeline, 2)
+        BuildRecord.objects.filter(id=hot.id).update(finished_at=archived_day - timedelta(hours=2), duration=30)
+        BuildRecord.objects.filter(id=later.id).update(finished_at=later_day, duration=30)
+        # 3 月 1 日的汇总含一个已归档构建，热表中只剩同一天的另一个构建
+        PipelineHealthRollup.objects.create(granularity='day', bucket=datetime(2024, 3, 1), pipeline=pipeline,
+                                            project=pipeline.project, total=2, success=2, duration_sketch={})
+        ArchivedBuild.objects.create(build_id=uuid.uuid4(), original_id=0, pipeline_id=pipeline.id, pipeline_name=pipeline.name,
+                                     project_id=pipeline.project_id, version='main', status='success', created_at=archived_day,
+                                     finished_at=archived_day, file='x', offset=0, length=0)
+        self.assertEqual(health.backfill(), 2)
+        self.assertEqual(sorted(PipelineHealthRollup.objects.values_list('granularity', 'bucket', 'total')),
+                         [('day', datetime(2024, 3, 1), 2), ('day', datetime(2024, 3, 3), 1),
+                          ('hour', datetime(2024, 3, 3, 10), 1)])
+
+
+@mock.patch('apps.ci_cd.sonar.mark_dirty')
+class SonarPollTests(TestCase):
+    """质量门禁轮询：对本地 SonarQube 桩服务执行 poll_pending"""
+
+    def setUp(self):
+        self.pipeline = create_pipeline()
+
+    def start_stub(self, **kwargs):
+        stub = StubSonarServer(**kwargs).start()
+        self.addCleanup(stub.stop)
+        return stub
+
+    def poll(self, stub, **kwargs):
+        with sonar.SonarClient(stub.url, **dict({'concurrency': 4, 'backoff': 0.01}, **kwargs)) as client:
+            return sonar.poll_pending(sonar=client)
+
+    def create_build(self, task_id):
+        return BuildRecord.objects.create(pipeline=self.pipeline, version='main', status='success', sonar_task_id=task_id)
+
+    def test_in_progress_backoff(self, mark_dirty):
+        stub = self.start_stub(pending_polls=1)
+        stub.add_task('t1', gate='ERROR')
+        build = self.create_build('t1')
+        self.assertEqual(self.poll(stub)['pending'], 1)
+        build.refresh_from_db()
+        self.assertEqual((build.sonar_quality_gate, build.sonar_poll_count), ('', 1))
+        self.assertEqual(sonar.next_poll_at(build), build.sonar_checked_at + timedelta(seconds=sonar.POLL_INTERVAL * 2))
+        # 未到下次轮询时间的任务不查询
+        self.assertEqual(self.poll(stub)['polled'], 0)
+        BuildRecord.objects.filter(id=build.id).update(sonar_checked_at=build.sonar_checked_at - timedelta(seconds=sonar.POLL_INTERVAL * 2))
+        self.assertEqual(self.poll(stub)['completed'], 1)
+        build.refresh_from_db()
+        self.assertEqual((build.sonar_quality_gate, build.sonar_poll_count), ('ERROR', 2))
+        self.assertEqual(list(mark_dirty.call_args[0][0]), [self.pipeline.project_id])
+
+    def test_retry_after(self, mark_dirty):
+        stub = self.start_stub(pending_polls=0, fail_requests=1, retry_after=1)
+        build = self.create_build('t1')
+        begin = time.monotonic()
+        self.assertEqual(self.poll(stub)['completed'], 1)
+        self.assertGreaterEqual(time.monotonic() - begin, 1)
+        # 503 一次 + 任务状态 + 门禁状态
+        self.assertEqual(stub.requests, 3)
+        build.refresh_from_db()
+        self.assertEqual(build.sonar_quality_gate, 'OK')
+
+    def test_retry_after_capped(self, mark_dirty):
+        stub = self.start_stub(pending_polls=0, fail_requests=1, retry_after=86400)
+        build = self.create_build('t1')
+        begin = time.monotonic()
+        self.assertEqual(self.poll(stub, max_backoff=0.2)['completed'], 1)
+        self.assertLess(time.monotonic() - begin, 5)
+        build.refresh_from_db()
+        self.assertEqual(build.sonar_quality_gate, 'OK')
+
+    def test_retries_exhausted(self, mark_dirty):
+        stub = self.start_stub(pending_polls=0, fail_requests=10)
+        build = self.create_build('t1')
+        counts = self.poll(stub, retries=2)
+        self.assertEqual((counts['errors'], counts['completed']), (1, 0))
+        self.assertEqual(stub.requests, 3)
+        build.refresh_from_db()
+        self.assertEqual((build.sonar_quality_gate, build.sonar_poll_count), ('', 1))
+
+    def test_not_found(self, mark_dirty):
+        stub = self.start_stub(auto_create=False)
+        build = self.create_build('missing')
+        self.assertEqual(self.poll(stub, retries=0)['completed'], 1)
+        build.refresh_from_db()
+        self.assertEqual(build.sonar_quality_gate, 'NOT_FOUND')
+
+    def test_request_timeout(self, mark_dirty):
+        stub = self.start_stub(pending_polls=0, latency=0.5)
+        build = self.create_build('t1')
+        self.assertEqual(self.poll(stub, timeout=0.1, retries=0)['errors'], 1)
+        build.refresh_from_db()
+        self.assertEqual(build.sonar_quality_gate, '')
+
+    def test_poll_timeout(self, mark_dirty):
+        stub = self.start_stub()
+        build = self.create_build('t1')
+        BuildRecord.objects.filter(id=build.id).update(created_at=timezone.now() - timedelta(hours=sonar.DEFAULT_TIMEOUT_HOURS + 1))
+        counts = self.poll(stub)
+        self.assertEqual((counts['timed_out'], counts['polled'], stub.requests), (1, 0, 0))
+        build.refresh_from_db()
+        self.assertEqual(build.sonar_quality_gate, 'TIMEOUT')
+
+    def test_bulk_write_back(self, mark_dirty):
+        stub = self.start_stub(pending_polls=0)
+        for task_id, gate in (('t1', 'OK'), ('t2', 'ERROR'), ('t3', 'WARN')):
+            stub.add_task(task_id, gate=gate, pending_polls=0)
+        builds = [self.create_build(task_id) for task_id in ('t1', 't2', 't3', 't3')]
+        with CaptureQueriesContext(connection) as queries:
+            counts = self.poll(stub)
+        self.assertEqual((counts['polled'], counts['completed']), (3, 4))
+        self.assertEqual(sum(query['sql'].startswith('UPDATE') for query in queries), 1)
+        self.assertEqual(dict(BuildRecord.objects.filter(id__in=[build.id for build in builds]).values_list('id', 'sonar_quality_gate')),
+                         {builds[0].id: 'OK', builds[1].id: 'ERROR', builds[2].id: 'WARN', builds[3].id: 'WARN'})
+
+
+@mock.patch('apps.ci_cd.webhook.mark_dirty')
+class WebhookApplyTests(TestCase):
+    """Webhook 事件出队后的校验、批量应用与死信"""
+
+    def setUp(self):
+        self.pipeline = create_pipeline(stages=0)
+        self.redis = mock.Mock()
+        self.start = timezone.now().replace(microsecond=0)
+
+    def item(self, delivery_id, type, seconds=0, **fields):
+        event = dict({'delivery_id': delivery_id, 'pipeline': self.pipeline.id, 'build': 'job#1', 'type': type,
+                      'timestamp': (self.start + timedelta(seconds=seconds)).isoformat()}, **fields)
+        return json.dumps(event).encode()
+
+    def dead_letters(self):
+        return [json.loads(item) for call in self.redis.rpush.call_args_list for item in call[0][1:]]
+
+    def test_invalid_event_dead_lettered(self, mark_dirty):
+        items = [self.item('d1', 'build_started'), b'{"delivery_id": "d2", "type": "build_started"}', b'not json',
+                 self.item('d3', 'build_finished', 5, status='success')]
+        self.assertEqual(webhook._apply_items(self.redis, items), 2)
+        self.assertEqual([json.loads(letter['event']).get('delivery_id') for letter in self.dead_letters()[:1]], ['d2'])
+        self.assertEqual(len(self.dead_letters()), 2)
+        self.redis.delete.assert_called_once_with(webhook.PROCESSING_KEY)
+        self.assertEqual(BuildRecord.objects.get(external_id='job#1').status, 'success')
+
+    def test_failing_event_isolated(self, mark_dirty):
+        items = [self.item('d1', 'build_started'), self.item('d2', 'build_finished', 5, status='success')]
+        original = webhook._project
+
+        def project(events):
+            if any(event['delivery_id'] == 'd2' for event in events):
+                raise RuntimeError('boom')
+            return original(events)
+
+        with mock.patch.object(webhook, '_project', side_effect=project):
+            self.assertEqual(webhook._apply_items(self.redis, items), 1)
+        self.assertEqual([letter['error'] for letter in self.dead_letters()], ['boom'])
+        self.redis.delete.assert_called_once_with(webhook.PROCESSING_KEY)
+        self.assertEqual(BuildRecord.objects.get(external_id='job#1').status, 'running')
+
+
+    def test_out_of_order_events(self, mark_dirty):
+        # 同一批内按发生时间应用：先到达的构建结束事件最后应用
+        items = [self.item('d3', 'build_finished', 20, status='success'),
+                 self.item('d2', 'stage_finished', 10, stage='test', status='success', output='ok'),
+                 self.item('d1', 'stage_started', 5, stage='test')]
+        self.assertEqual(webhook._apply_items(self.redis, items), 3)
+        build = BuildRecord.objects.get(external_id='job#1')
+        self.assertEqual((build.status, build.duration), ('success', 15))
+        self.assertEqual(list(build.stage_records.values_list('status', 'log_snippet')), [('success', 'ok')])
+        # 构建结束后迟到的事件只记入事件日志，不让构建 / 阶段回退
+        items = [self.item('d4', 'stage_started', 6, stage='test'), self.item('d5', 'build_started', 1)]
+        self.assertEqual(webhook._apply_items(self.redis, items), 2)
+        build.refresh_from_db()
+        self.assertEqual(build.status, 'success')
+        self.assertEqual(list(build.stage_records.values_list('status', flat=True)), ['success'])
+        self.assertEqual(build.events.count(), 5)
+
+    def test_duplicate_events(self, mark_dirty):
+        # 消费者中断后放回队列的事件会被再次应用：结束的构建只计入一次健康汇总
+        items = [self.item('d1', 'build_started'), self.item('d2', 'build_finished', 5, status='failed')]
+        webhook._apply_items(self.redis, items)
+        webhook._apply_items(self.redis, items + [self.item('d2', 'build_finished', 5, status='success')])
+        build = BuildRecord.objects.get(external_id='job#1')
+        self.assertEqual(build.status, 'failed')
+        self.assertEqual(list(PipelineHealthRollup.objects.values_list('total', 'failed')), [(1, 1)] * 2)
+        self.assertEqual(mark_dirty.call_count, 2)
+
+class ArchiveTests(TestCase):
+    """归档逐个构建流式写入 gzip 成员，读取尾部日志时只解压需要的日志块"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        archive_settings = override_settings(CICD_ARCHIVE_ROOT=directory.name)
+        archive_settings.enable()
+        self.addCleanup(archive_settings.disable)
+        self.pipeline = create_pipeline()
+        self.builds = create_builds(self.pipeline, 2)
+        self.logs = {}
+        for build in self.builds:
+            parts = [f'{build.id}-{seq}-'.encode() * 50 for seq in range(5)]
+            offset = 0
+            for seq, part in enumerate(parts):
+                compressed = seq % 2 == 0
+                BuildLogChunk.objects.create(build=build, seq=seq, offset=offset, length=len(part), compressed=compressed,
+                                             data=zlib.compress(part) if compressed else part)
+                offset += len(part)
+            self.logs[build.build_id] = b''.join(parts)
+
+    def test_archive_and_read(self):
+        self.assertEqual(archive.archive_chunk([build.id for build in self.builds]), 2)
+        self.assertFalse(BuildRecord.objects.exists())
+        self.assertFalse(BuildLogChunk.objects.exists())
+        archived = list(ArchivedBuild.objects.order_by('original_id'))
+        self.assertEqual(archived[0].file, archived[1].file)
+        self.assertEqual(archived[1].offset, archived[0].offset + archived[0].length)
+        for item in archived:
+            document = archive.read_document(item)
+            log = self.logs[item.build_id]
+            self.assertEqual(len(document['stages']), 2)
+            self.assertEqual(archive.read_log(document), (log, len(log)))
+            for tail in (0, 10, 300, len(log), len(log) + 10):
+                self.assertEqual(archive.read_log(document, tail), (log[len(log) - min(tail, len(log)):], len(log)))
+
+    def test_restore(self):
+        archive.archive_chunk([self.builds[0].id])
+        build = archive.restore(ArchivedBuild.objects.get())
+        self.assertEqual(build.id, self.builds[0].id)
+        self.assertEqual(build.stage_records.count(), 2)
+        self.assertEqual(list(build.log_chunks.order_by('seq').values_list('seq', flat=True)), list(range(5)))
+        self.assertFalse(ArchivedBuild.objects.exists())
+
+
+class FollowLogTests(TestCase):
+    """SSE 日志跟踪：构建结束即关闭，运行中的构建到期后关闭等待重连"""
+
+    def setUp(self):
+        self.build = create_builds(create_pipeline(stages=0), 1)[0]
+        BuildLogChunk.objects.create(build=self.build, seq=0, offset=0, length=6, compressed=False, data=b'hello\n')
+
+    def test_finished_build_ends(self):
+        events = list(buildlog.follow(self.build.id, poll_interval=0.01))
+        self.assertEqual(events, [('log', 'hello\n', 6), ('end', 'success', 6)])
+
+    @override_settings(CICD_LOG_STREAM_SECONDS=0.2)
+    def test_running_build_times_out(self):
+        BuildRecord.objects.filter(id=self.build.id).update(status='running')
+        begin = time.monotonic()
+        events = list(buildlog.follow(self.build.id, offset=6, poll_interval=0.01))
+        self.assertLess(time.monotonic() - begin, 2)
+        self.assertEqual(events, [])
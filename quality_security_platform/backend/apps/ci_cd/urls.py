@@ -1,6 +1,10 @@
 from rest_framework.routers import SimpleRouter
-from .views import PipelineViewSet, BuildRecordViewSet
+from .views import PipelineViewSet, BuildRecordViewSet, StageCacheEntryViewSet, PipelineHealthViewSet, ArchivedBuildViewSet, WebhookViewSet
 router = SimpleRouter()
 router.register('pipelines', PipelineViewSet, basename='pipeline')
 router.register('builds', BuildRecordViewSet, basename='build')
+router.register('stage-cache', StageCacheEntryViewSet, basename='stage-cache')
+router.register('health', PipelineHealthViewSet, basename='pipeline-health')
+router.register('archived-builds', ArchivedBuildViewSet, basename='archived-build')
+router.register('webhook', WebhookViewSet, basename='webhook')
 urlpatterns = router.urls
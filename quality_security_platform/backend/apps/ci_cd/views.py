@@ -1,12 +1,57 @@
 from rest_framework import viewsets, status, filters
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import action
+from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
+from datetime import datetime, timedelta
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from .models import Pipeline, BuildRecord
-from .serializers import PipelineSerializer, BuildRecordSerializer
+from django.utils.dateparse import parse_date, parse_datetime
+from . import archive, buildlog, health, scheduler, stagecache, webhook
+from .journal import BuildJournal
+from .models import Pipeline, BuildRecord, BuildStageRecord, StageCacheEntry, PipelineHealthRollup, ArchivedBuild
+from .serializers import (PipelineSerializer, BuildRecordSerializer, PipelineTriggerSerializer, StageCacheEntrySerializer,
+                          BuildEventSerializer, PipelineHealthRollupSerializer, BuildRecordSummarySerializer,
+                          BuildRecordExpandedSerializer, ArchivedBuildSerializer, WebhookEventSerializer,
+                          BUILD_SUMMARY_FIELDS)
+from apps.base.renderers import EventStreamRenderer
 from apps.base.viewsets import BaseModelViewSet
 
+DEFAULT_LOG_BYTES = 64 * 1024
+MAX_LOG_BYTES = 1024 * 1024
+
+
+def _byte_param(value, default, maximum=MAX_LOG_BYTES):
+    if value in (None, ''):
+        return default
+    value = int(value)
+    if value < 0:
+        raise ValueError('字节数不能为负数')
+    return value if maximum is None else min(value, maximum)
+
+
+def _time_param(value):
+    """日期或日期时间参数，无法解析时抛出 ValueError"""
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'无效的时间: {value}')
+        parsed = datetime(day.year, day.month, day.day)
+    if timezone.is_aware(timezone.now()) and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _sse(event, data, event_id):
+    """SSE 消息：数据按行拆成多个 data 字段，id 为下一次读取的字节偏移，断线重连时由 Last-Event-ID 带回"""
+    lines = ''.join(f'data: {line}\n' for line in data.split('\n'))
+    return f'id: {event_id}\nevent: {event}\n{lines}\n'
+
 
 class PipelineViewSet(BaseModelViewSet):
     """
@@ -21,10 +66,20 @@ class PipelineViewSet(BaseModelViewSet):
 
     @action(detail=True, methods=['post'])
     def trigger(self, request, pk=None):
+        """
+        触发构建：入队后由调度器按优先级和并发上限派发；同一版本已在排队时合并为一次构建
+        """
         pipeline = self.get_object()
-        version = request.data.get('version', 'main')
-        # 此处应触发 Celery 任务，现简化返回
-        return Response({'status': 'triggered', 'pipeline_id': pipeline.id, 'version': version})
+        serializer = PipelineTriggerSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        build, created = scheduler.enqueue(pipeline, serializer.validated_data['version'], request.user.id,
+                                           serializer.validated_data['priority'])
+        build.refresh_from_db(fields=['status', 'dispatched_at'])
+        return Response({
+            'status': 'queued' if created else 'coalesced', 'id': build.id, 'build_id': build.build_id,
+            'pipeline_id': pipeline.id, 'version': build.version, 'priority': build.priority,
+            'trigger_count': build.trigger_count, 'position': scheduler.queue_position(build),
+        }, status=status.HTTP_202_ACCEPTED)
 
     @action(detail=False, methods=['delete'])
     def bulk_delete(self, request):
@@ -48,16 +103,103 @@ class BuildRecordViewSet(BaseModelViewSet):
     search_fields = ['build_id', 'version', 'pipeline__name']
     ordering_fields = ['id', 'created_at', 'duration', 'started_at']
 
+    def expand_stages(self):
+        return 'stages' in self.request.query_params.get('expand', '').split(',')
+
+    def get_queryset(self):
+        # 流水线 / 项目名称随主查询 JOIN 取出，每页查询数固定
+        queryset = super().get_queryset().select_related('pipeline__project')
+        if self.action == 'list':
+            queryset = queryset.only(*BUILD_SUMMARY_FIELDS, 'pipeline__name', 'pipeline__project__name')
+            if self.expand_stages():
+                queryset = queryset.prefetch_related(Prefetch(
+                    'stage_records', BuildStageRecord.objects.select_related('stage').only(
+                        'id', 'build_id', 'stage_id', 'stage__name', 'status', 'started_at', 'finished_at', 'cached')))
+        elif self.action == 'retrieve':
+            queryset = queryset.prefetch_related(Prefetch('stage_records', BuildStageRecord.objects.select_related('stage')))
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return BuildRecordExpandedSerializer if self.expand_stages() else BuildRecordSummarySerializer
+        return BuildRecordSerializer
+
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
         build = self.get_object()
-        if build.status in ['pending', 'running']:
-            build.status = 'aborted'
-            build.finished_at = timezone.now()
-            build.save()
+        if build.status in ['pending', 'running'] and BuildJournal(build).build_finished('aborted', type='build_cancelled'):
+            scheduler.dispatch()
             return Response({'status': 'cancelled'})
         return Response({'error': '无法取消'}, status=400)
 
+    @action(detail=True, methods=['get'])
+    def events(self, request, pk=None):
+        """构建事件日志（按发生顺序）"""
+        build = self.get_log_build()
+        page = self.paginate_queryset(build.events.select_related('stage').order_by('id'))
+        return self.get_paginated_response(BuildEventSerializer(page, many=True).data)
+
+    @action(detail=True, methods=['get'], url_path='queue')
+    def queue_position(self, request, pk=None):
+        """排队位置：0 表示已派发或已结束"""
+        build = self.get_object()
+        return Response({
+            'id': build.id, 'status': build.status, 'priority': build.priority, 'trigger_count': build.trigger_count,
+            'dispatched': build.dispatched_at is not None, 'position': scheduler.queue_position(build),
+        })
+
+    @action(detail=False, methods=['get'], url_path='queue')
+    def queue_summary(self, request):
+        """调度概况：排队 / 运行数、并发上限及各项目占用"""
+        return Response(scheduler.queue_summary())
+
+    def get_log_build(self):
+        # 读日志只需要状态，不加载旧的整段日志字段
+        return get_object_or_404(self.get_queryset().select_related(None).only('id', 'build_id', 'status'), pk=self.kwargs['pk'])
+
+    @action(detail=True, methods=['get'])
+    def log(self, request, pk=None):
+        """
+        分块读取构建日志：offset/limit 读取字节区间，tail 读取最后若干字节（默认最后 64KB）
+
+        只加载覆盖所请求区间的日志块；返回 next_offset 供继续读取，complete 表示构建已结束且已读到末尾
+        """
+        build = self.get_log_build()
+        params = request.query_params
+        try:
+            size = buildlog.log_size(build.id)
+            if params.get('offset') not in (None, ''):
+                offset = _byte_param(params['offset'], 0, maximum=size)
+                content, next_offset = buildlog.read_text(build.id, offset, _byte_param(params.get('limit'), DEFAULT_LOG_BYTES))
+            else:
+                content, offset, size = buildlog.read_tail(build.id, _byte_param(params.get('tail'), DEFAULT_LOG_BYTES), size)
+                next_offset = size
+        except ValueError:
+            return Response({'detail': 'offset/limit/tail 必须为非负整数'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'build_id': build.build_id, 'status': build.status, 'size': size, 'offset': offset, 'next_offset': next_offset,
+            'complete': build.status not in buildlog.ACTIVE_STATUSES and next_offset >= size, 'content': content,
+        })
+
+    @action(detail=True, methods=['get'], url_path='log/stream', renderer_classes=[EventStreamRenderer])
+    def log_stream(self, request, pk=None):
+        """
+        SSE 实时跟踪日志：从 offset（或 Last-Event-ID）开始推送 log 事件，构建结束后推送 end 事件并关闭
+
+        断线重连时浏览器自动带上 Last-Event-ID，从上次的偏移继续
+        """
+        build = self.get_log_build()
+        try:
+            offset = _byte_param(request.headers.get('Last-Event-ID') or request.query_params.get('offset'), 0, maximum=None)
+        except ValueError:
+            return Response({'detail': 'offset 必须为非负整数'}, status=status.HTTP_400_BAD_REQUEST)
+        events = (_sse(event, data, event_offset) for event, data, event_offset in buildlog.follow(build.id, offset))
+        response = StreamingHttpResponse(events, content_type='text/event-stream; charset=utf-8')
+        response['Cache-Control'] = 'no-cache'
+        # 关闭 nginx 的响应缓冲，日志到达即推送
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
     @action(detail=False, methods=['delete'])
     def bulk_delete(self, request):
         if not request.user.is_superuser:
@@ -66,4 +208,157 @@ class BuildRecordViewSet(BaseModelViewSet):
         if not ids:
             return Response({'detail': '请提供要删除的ID列表'}, status=status.HTTP_400_BAD_REQUEST)
         deleted, _ = self.get_queryset().filter(id__in=ids).delete()
-        return Response({'deleted': deleted}, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response({'deleted': deleted}, status=status.HTTP_200_OK)
+
+
+class StageCacheEntryViewSet(BaseModelViewSet):
+    """
+    阶段结果缓存：查看、删除（使缓存失效）及命中率统计
+    """
+    queryset = StageCacheEntry.objects.select_related('pipeline', 'stage')
+    serializer_class = StageCacheEntrySerializer
+    http_method_names = ['get', 'delete', 'head', 'options']
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filterset_fields = ['pipeline', 'stage', 'version']
+    search_fields = ['version', 'stage__name', 'pipeline__name']
+    ordering_fields = ['id', 'created_at', 'last_used_at', 'hit_count', 'duration']
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """命中率统计：days 为统计窗口（默认 7 天），可按 pipeline 过滤"""
+        try:
+            days = max(1, int(request.query_params.get('days', 7)))
+        except ValueError:
+            return Response({'detail': 'days 必须为整数'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(stagecache.stats(days, request.query_params.get('pipeline') or None))
+
+    @action(detail=False, methods=['delete'])
+    def clear(self, request):
+        """清空缓存，可按 pipeline / stage 限定范围"""
+        deleted, _ = self.filter_queryset(self.get_queryset()).delete()
+        return Response({'deleted': deleted}, status=status.HTTP_200_OK)
+
+
+class PipelineHealthViewSet(BaseModelViewSet):
+    """
+    流水线健康汇总：小时 / 天粒度的构建数、成功率与耗时分位数，只读
+    """
+    queryset = PipelineHealthRollup.objects.select_related('pipeline')
+    serializer_class = PipelineHealthRollupSerializer
+    http_method_names = ['get', 'head', 'options']
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['granularity', 'pipeline', 'project']
+    ordering_fields = ['bucket', 'total']
+
+    def health_params(self, request):
+        params = request.query_params
+        granularity = params.get('granularity', 'day')
+        if granularity not in health.GRANULARITIES:
+            raise ValueError('granularity 只能为 hour 或 day')
+        days = int(params.get('days') or (2 if granularity == 'hour' else 30))
+        start = _time_param(params.get('start')) or timezone.now() - timedelta(days=days)
+        return {
+            'granularity': granularity, 'start': health.truncate(start, granularity), 'end': _time_param(params.get('end')),
+            'pipeline_id': params.get('pipeline') or None, 'project_id': params.get('project') or None,
+        }
+
+    @action(detail=False, methods=['get'])
+    def trends(self, request):
+        """
+        趋势图数据：granularity=hour|day，start/end 或 days 指定时间范围，
+        按 pipeline 或 project 过滤（项目下的流水线按时间桶合并）
+        """
+        try:
+            options = self.health_params(request)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'granularity': options['granularity'], 'series': health.trends(**options)})
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """时间范围内合并后的成功率与 p50/p95 耗时"""
+        try:
+            options = self.health_params(request)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        rows = health.rollup_queryset(**options).values(*health.ROLLUP_FIELDS)
+        return Response(dict(health.summarize(rows), start=options['start'], end=options['end']))
+
+
+class ArchivedBuildViewSet(BaseModelViewSet):
+    """
+    已归档构建：索引列表按流水线 / 状态过滤，按 build_id 读取归档内容或恢复到构建记录
+    """
+    queryset = ArchivedBuild.objects.all()
+    serializer_class = ArchivedBuildSerializer
+    lookup_field = 'build_id'
+    http_method_names = ['get', 'post', 'head', 'options']
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filterset_fields = ['pipeline_id', 'project_id', 'status']
+    search_fields = ['version', 'pipeline_name']
+    ordering_fields = ['created_at', 'archived_at', 'duration']
+
+    @action(detail=True, methods=['get'])
+    def content(self, request, build_id=None):
+        """
+        归档的构建记录、阶段记录和事件；日志默认返回尾部 tail 字节（默认 64KB），?include=log 时返回完整日志
+        """
+        archived = self.get_object()
+        try:
+            tail = _byte_param(request.query_params.get('tail'), DEFAULT_LOG_BYTES)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            document = archive.read_document(archived)
+        except archive.ArchiveError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        content, size = archive.read_log(document, None if request.query_params.get('include') == 'log' else tail)
+        return Response({
+            'build': dict(document['build']['fields'], id=document['build']['pk']),
+            'pipeline_name': document['pipeline_name'],
+            'stages': [dict(row['fields'], id=row['pk']) for row in document['stages']],
+            'events': [dict(row['fields'], id=row['pk']) for row in document['events']],
+            'log_size': size,
+            # 尾部截断可能切在多字节字符中间，忽略不完整的首字符
+            'log': content.decode('utf-8', errors='ignore'),
+        })
+
+    @action(detail=True, methods=['post'])
+    def restore(self, request, build_id=None):
+        """将归档构建恢复为构建记录（含阶段、事件、日志），恢复后从归档索引移除"""
+        archived = self.get_object()
+        try:
+            build = archive.restore(archived)
+        except archive.ArchiveError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response(BuildRecordSerializer(build).data, status=status.HTTP_201_CREATED)
+
+
+class WebhookViewSet(viewsets.ViewSet):
+    """
+    外部 CI 事件上报：单个事件，或 {"events": [...]} 批量上报；
+    校验令牌 / 签名和格式后按投递 ID 去重入队，立即返回 202，由后台任务批量写入构建记录
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def create(self, request):
+        # 签名基于原始请求体，需在解析 request.data 之前读取
+        if not webhook.verify(request.body, request.headers):
+            return Response({'detail': '令牌或签名无效'}, status=status.HTTP_403_FORBIDDEN)
+        data = request.data
+        events = data['events'] if isinstance(data, dict) and 'events' in data else [data]
+        if not isinstance(events, list) or len(events) > webhook.MAX_EVENTS_PER_REQUEST:
+            return Response({'detail': f'events 须为列表，且单次不超过 {webhook.MAX_EVENTS_PER_REQUEST} 个'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        delivery_id = request.headers.get('X-Delivery-ID') or request.headers.get('X-Gitlab-Event-UUID')
+        if len(events) == 1 and isinstance(events[0], dict) and delivery_id:
+            events[0].setdefault('delivery_id', delivery_id)
+        serializer = WebhookEventSerializer(data=events, many=True)
+        serializer.is_valid(raise_exception=True)
+        received = timezone.now()
+        for event in serializer.validated_data:
+            event['timestamp'] = event['timestamp'] or received
+        accepted = webhook.enqueue(serializer.validated_data)
+        return Response({'received': len(events), 'accepted': accepted, 'duplicates': len(events) - accepted},
+                        status=status.HTTP_202_ACCEPTED)
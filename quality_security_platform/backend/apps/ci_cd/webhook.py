@@ -0,0 +1,303 @@
+"""
+外部 CI Webhook：Jenkins / GitLab 等上报的构建、阶段事件先进入 Redis 队列，由 Celery 消费者批量投影到构建记录
+
+接收端不访问数据库：校验令牌 / 签名和事件格式后，用一个 Lua 脚本按投递 ID 去重（SET NX EX）并追加到队列，
+同一投递重复上报只入队一次。消费者每批把至多 BATCH_SIZE 个事件移到处理中列表，在一个事务中批量创建 / 更新
+构建、阶段和阶段记录并写入事件日志，提交后才删除处理中列表；消费者异常退出时，下次运行先把处理中的事件放回队首。
+出队的事件重新校验，格式错误的事件直接移入死信列表；整批应用失败时逐个事件重试，仍失败的事件移入死信列表，
+单个坏事件不会让整批事件反复放回队首而阻塞后续消费
+"""
+import hashlib
+import hmac
+import json
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django_redis import get_redis_connection
+from apps.risk.dirty import mark_dirty
+from redis.exceptions import LockError
+from .executor import LOG_TAIL_BYTES
+from .health import record_builds
+from .journal import duration_seconds
+from .models import BuildEvent, BuildRecord, BuildStageRecord, Pipeline, PipelineStage
+from .serializers import WebhookEventSerializer
+
+QUEUE_KEY = 'cicd:webhook:queue'
+PROCESSING_KEY = 'cicd:webhook:processing'
+# 无法应用的事件：{'event': 原始事件, 'error': 错误, 'failed_at': 时间}，人工排查后可重新上报
+DEAD_LETTER_KEY = 'cicd:webhook:dead'
+DELIVERY_KEY = 'cicd:webhook:delivery:'
+CONSUMER_LOCK_KEY = 'cicd:webhook:consumer'
+# 接收端每秒最多触发一次消费任务，其余事件由正在运行的消费者或定时任务处理
+TRIGGER_KEY = 'cicd:webhook:trigger'
+BATCH_SIZE = 500
+MAX_BATCHES = 100
+MAX_EVENTS_PER_REQUEST = 1000
+DEFAULT_DEDUP_SECONDS = 86400
+FINAL_STATUSES = ('success', 'failed', 'aborted')
+STAGE_FIELDS = ('status', 'started_at', 'finished_at', 'log_snippet')
+BUILD_FIELDS = ('status', 'started_at', 'finished_at', 'duration')
+logger = logging.getLogger(__name__)
+
+# KEYS[1] 为队列，KEYS[2..] 为各事件的投递 ID 键；ARGV[1] 为去重保留秒数，ARGV[2..] 为事件。返回各事件是否入队
+ENQUEUE_SCRIPT = """
+local accepted = {}
+for i = 2, #KEYS do
+    if redis.call('SET', KEYS[i], 1, 'NX', 'EX', ARGV[1]) then
+        redis.call('RPUSH', KEYS[1], ARGV[i])
+        accepted[#accepted + 1] = 1
+    else
+        accepted[#accepted + 1] = 0
+    end
+end
+return accepted
+"""
+# 从队首移出至多 ARGV[1] 个事件，追加到处理中列表
+TAKE_SCRIPT = """
+local items = redis.call('LRANGE', KEYS[1], 0, ARGV[1] - 1)
+redis.call('LTRIM', KEYS[1], #items, -1)
+for i = 1, #items do
+    redis.call('RPUSH', KEYS[2], items[i])
+end
+return items
+"""
+# 处理中列表按原顺序放回队首
+RESTORE_SCRIPT = """
+local items = redis.call('LRANGE', KEYS[2], 0, -1)
+for i = #items, 1, -1 do
+    redis.call('LPUSH', KEYS[1], items[i])
+end
+redis.call('DEL', KEYS[2])
+return #items
+"""
+
+
+def verify(body, headers):
+    """
+    校验来源：X-CICD-Token（或 GitLab 的 X-Gitlab-Token）等于共享密钥，
+    或 X-CICD-Signature 为请求体的 HMAC-SHA256（sha256=<hex>）；未配置密钥时拒绝所有请求
+    """
+    secret = getattr(settings, 'CICD_WEBHOOK_SECRET', '')
+    if not secret:
+        return False
+    token = headers.get('X-CICD-Token') or headers.get('X-Gitlab-Token')
+    if token:
+        return hmac.compare_digest(token, secret)
+    expected = 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(headers.get('X-CICD-Signature', ''), expected)
+
+
+def enqueue(events):
+    """事件按投递 ID 去重后入队，返回入队数；有新事件时触发消费任务"""
+    if not events:
+        return 0
+    redis = get_redis_connection('default')
+    script = redis.register_script(ENQUEUE_SCRIPT)
+    # 时间保留到微秒，同一毫秒内的事件也能按发生顺序应用
+    dedup_seconds = getattr(settings, 'CICD_WEBHOOK_DEDUP_SECONDS', DEFAULT_DEDUP_SECONDS)
+    flags = script(keys=[QUEUE_KEY, *(DELIVERY_KEY + event['delivery_id'] for event in events)],
+                   args=[dedup_seconds, *(json.dumps(dict(event, timestamp=event['timestamp'].isoformat())) for event in events)])
+    accepted = sum(flags)
+    if accepted and cache.add(TRIGGER_KEY, 1, timeout=1):
+        from .tasks import apply_webhook_events
+        apply_webhook_events.delay()
+    return accepted
+
+
+def queue_length():
+    return get_redis_connection('default').llen(QUEUE_KEY)
+
+
+def dead_letter_length():
+    return get_redis_connection('default').llen(DEAD_LETTER_KEY)
+
+
+def parse_event(item):
+    """解析并重新校验队列中的事件，格式错误时抛出 ValueError"""
+    serializer = WebhookEventSerializer(data=json.loads(item))
+    if not serializer.is_valid():
+        raise ValueError(f'事件格式错误: {serializer.errors}')
+    event = dict(serializer.validated_data)
+    if event['timestamp'] is None:
+        raise ValueError('事件缺少 timestamp')
+    return event
+
+
+def consume(batch_size=BATCH_SIZE, max_batches=MAX_BATCHES):
+    """
+    按批消费队列，返回应用的事件数；同一时刻只有一个消费者（阶段按名称创建，并发消费会重复创建）
+
+    达到 max_batches 仍有积压时再触发一次消费任务，单个任务不会长时间占用 worker
+    """
+    redis = get_redis_connection('default')
+    lock = redis.lock(CONSUMER_LOCK_KEY, timeout=600)
+    if not lock.acquire(blocking=False):
+        return 0
+    applied = 0
+    try:
+        restored = redis.register_script(RESTORE_SCRIPT)(keys=[QUEUE_KEY, PROCESSING_KEY])
+        if restored:
+            logger.warning('上次消费未完成，%s 个 Webhook 事件放回队列', restored)
+        take = redis.register_script(TAKE_SCRIPT)
+        for _ in range(max_batches):
+            items = take(keys=[QUEUE_KEY, PROCESSING_KEY], args=[batch_size])
+            if not items:
+                break
+            applied += _apply_items(redis, items)
+        else:
+            if redis.llen(QUEUE_KEY):
+                from .tasks import apply_webhook_events
+                apply_webhook_events.delay()
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            logger.warning('Webhook 消费锁已过期', exc_info=True)
+    return applied
+
+
+def _apply_items(redis, items):
+    """应用一批出队的事件，返回应用的事件数；投影提交后删除处理中列表，再更新健康汇总与风险待重算"""
+    events, dead = [], []
+    for item in items:
+        try:
+            events.append((item, parse_event(item)))
+        except (ValueError, TypeError) as e:
+            dead.append((item, e))
+    events.sort(key=lambda pair: pair[1]['timestamp'])
+    try:
+        applied, finished = _project([event for _, event in events])
+    except Exception:
+        # 整批回滚后逐个事件应用，定位并隔离无法应用的事件
+        logger.exception('Webhook 事件批量应用失败，逐个重试')
+        applied, finished = 0, []
+        for item, event in events:
+            try:
+                count, builds = _project([event])
+            except Exception as e:
+                dead.append((item, e))
+            else:
+                applied += count
+                finished += builds
+    if dead:
+        logger.error('%s 个 Webhook 事件无法应用，已移入死信列表 %s', len(dead), DEAD_LETTER_KEY)
+        failed_at = timezone.now().isoformat()
+        redis.rpush(DEAD_LETTER_KEY, *(json.dumps({'event': item.decode() if isinstance(item, bytes) else item,
+                                                   'error': str(e), 'failed_at': failed_at}) for item, e in dead))
+    redis.delete(PROCESSING_KEY)
+    _after_commit(finished)
+    return applied
+
+
+def apply_events(events):
+    """把一批已校验的事件（timestamp 为 datetime）投影到构建记录，返回应用的事件数"""
+    applied, finished = _project(events)
+    _after_commit(finished)
+    return applied
+
+
+def _after_commit(finished):
+    record_builds(finished)
+    mark_dirty(Pipeline.objects.filter(id__in={build.pipeline_id for build in finished}).values_list('project_id', flat=True))
+
+
+def _project(events):
+    """在一个事务中把一批事件投影到构建、阶段与阶段记录，返回 (应用的事件数, 本批结束的构建)；流水线不存在的事件丢弃"""
+    pipelines = set(Pipeline.objects.filter(id__in={event['pipeline'] for event in events}).values_list('id', flat=True))
+    dropped = [event['delivery_id'] for event in events if event['pipeline'] not in pipelines]
+    if dropped:
+        logger.warning('Webhook 事件的流水线不存在，已丢弃: %s', ', '.join(dropped))
+    # 同一构建的事件按发生时间应用，乱序到达的事件不会让已结束的构建 / 阶段回退
+    events = sorted((event for event in events if event['pipeline'] in pipelines), key=lambda event: event['timestamp'])
+    if not events:
+        return 0, []
+    finished = []
+    with transaction.atomic():
+        builds = _builds(events)
+        stages = _stages(events)
+        records = {(record.build_id, record.stage_id): record
+                   for record in BuildStageRecord.objects.filter(build_id__in=[build.id for build in builds.values()])
+                   .only('id', 'build_id', 'stage_id', *STAGE_FIELDS)}
+        created, changed_records, changed_builds, journal = [], {}, {}, []
+        for event in events:
+            build, at = builds[event['pipeline'], event['build']], event['timestamp']
+            stage = stages[event['pipeline'], event['stage']] if event['stage'] else None
+            status = event['status'] or 'running'
+            if build.status == 'pending' and event['type'] != 'build_finished':
+                build.status, build.started_at = 'running', build.started_at or at
+            if event['type'] == 'build_finished' and build.status not in FINAL_STATUSES:
+                build.status, build.finished_at, build.started_at = status, at, build.started_at or at
+                build.duration = duration_seconds(build.started_at, build.finished_at)
+                finished.append(build)
+            if stage:
+                record = records.get((build.id, stage.id))
+                if record is None:
+                    record = records[build.id, stage.id] = BuildStageRecord(build_id=build.id, stage=stage, status='pending')
+                    created.append(record)
+                elif record.pk:
+                    changed_records[record.pk] = record
+                if record.status not in FINAL_STATUSES:
+                    record.status, record.started_at = status, record.started_at or at
+                    if event['type'] == 'stage_finished':
+                        record.finished_at = at
+                        record.log_snippet = event['output'][-LOG_TAIL_BYTES:]
+            changed_builds[build.id] = build
+            journal.append(BuildEvent(build_id=build.id, type=event['type'], stage=stage, status=status, occurred_at=at,
+                                      payload={'source': 'webhook', 'delivery_id': event['delivery_id']}))
+        BuildStageRecord.objects.bulk_create(created)
+        BuildStageRecord.objects.bulk_update(list(changed_records.values()), STAGE_FIELDS)
+        BuildRecord.objects.bulk_update(list(changed_builds.values()), BUILD_FIELDS)
+        BuildEvent.objects.bulk_create(journal)
+    return len(events), finished
+
+
+def _builds(events):
+    """按 (流水线, 外部标识) 取构建，不存在的批量创建"""
+    keys = {(event['pipeline'], event['build']): event['version'] for event in events}
+    fields = ('id', 'pipeline_id', 'external_id', *BUILD_FIELDS)
+
+    def load():
+        queryset = BuildRecord.objects.filter(pipeline_id__in={pipeline for pipeline, _ in keys},
+                                              external_id__in={external_id for _, external_id in keys}).only(*fields)
+        return {(build.pipeline_id, build.external_id): build for build in queryset
+                if (build.pipeline_id, build.external_id) in keys}
+
+    builds = load()
+    missing = [key for key in keys if key not in builds]
+    if missing:
+        BuildRecord.objects.bulk_create([BuildRecord(pipeline_id=pipeline, external_id=external_id, version=keys[pipeline, external_id])
+                                         for pipeline, external_id in missing], ignore_conflicts=True)
+        builds = load()
+    return builds
+
+
+def _stages(events):
+    """按 (流水线, 阶段名) 取阶段；外部 CI 首次上报的阶段自动创建，未给出 order 时排在已有阶段之后"""
+    wanted = {}
+    for event in events:
+        if event['stage']:
+            wanted.setdefault((event['pipeline'], event['stage']), event['order'])
+    def load():
+        stages = {}
+        for stage in PipelineStage.objects.filter(pipeline_id__in={pipeline for pipeline, _ in wanted},
+                                                  name__in={name for _, name in wanted}).order_by('order', 'id'):
+            stages.setdefault((stage.pipeline_id, stage.name), stage)
+        return stages
+
+    stages = load()
+    missing = [key for key in wanted if key not in stages]
+    if missing:
+        orders = dict(PipelineStage.objects.filter(pipeline_id__in={pipeline for pipeline, _ in missing})
+                      .values_list('pipeline_id').annotate(Max('order')).order_by())
+        created = []
+        for pipeline, name in missing:
+            order = wanted[pipeline, name]
+            if order is None:
+                order = orders[pipeline] = (orders.get(pipeline) or 0) + 1
+            created.append(PipelineStage(pipeline_id=pipeline, name=name, order=order))
+        PipelineStage.objects.bulk_create(created)
+        stages = load()
+    return stages
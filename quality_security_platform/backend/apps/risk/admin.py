@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import RiskProfile, RiskAlert
+from .models import RiskProfile, RiskAlert, RiskScoreHistory
 
 @admin.register(RiskProfile)
 class RiskProfileAdmin(admin.ModelAdmin):
@@ -11,7 +11,15 @@ class RiskProfileAdmin(admin.ModelAdmin):
 
 @admin.register(RiskAlert)
 class RiskAlertAdmin(admin.ModelAdmin):
-    list_display = ('id', 'project', 'level', 'title', 'is_resolved', 'created_at')
+    list_display = ('id', 'project', 'level', 'title', 'score', 'is_resolved', 'created_at')
     search_fields = ('project__name', 'title', 'description')
     list_filter = ('project', 'level', 'is_resolved')
     ordering = ('-created_at',)
+
+
+@admin.register(RiskScoreHistory)
+class RiskScoreHistoryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'granularity', 'bucket', 'project', 'overall_score', 'code_quality_score', 'vulnerability_score', 'pipeline_health_score', 'samples')
+    search_fields = ('project__name',)
+    list_filter = ('granularity',)
+    ordering = ('granularity', '-bucket')
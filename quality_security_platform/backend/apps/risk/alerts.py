@@ -0,0 +1,98 @@
+"""
+风险阈值告警：每个评分批次结束后按综合分评估告警，新告警与负责人站内信在一个事务中批量写入
+
+- 分级阈值：综合分达到某级阈值即为该级（默认 中 50 / 高 70 / 严重 85，低于最低阈值不告警）
+- 去重：项目已有未处理的评分告警时不再重复告警，只有升级（达到更高级别）才新建告警并关闭旧告警
+- 回差：未处理告警在综合分低于其级别阈值减 hysteresis 后才自动关闭，分数在阈值附近波动不会反复开关
+- 冷却：项目在 cooldown_hours 内已有同级或更高级别的告警时不再新建（含已关闭的），升级不受冷却限制
+
+参数可在 settings.RISK_ALERTS 中覆盖
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from apps.projects.models import Project
+from apps.system.models import Notification
+from .models import RiskAlert, RiskProfile
+
+DEFAULTS = {
+    'thresholds': {'medium': 50.0, 'high': 70.0, 'critical': 85.0},
+    'hysteresis': 5.0,
+    'cooldown_hours': 24,
+}
+LEVELS = [level for level, _ in RiskAlert.LEVEL_CHOICES]
+LEVEL_NAMES = dict(RiskAlert.LEVEL_CHOICES)
+BATCH_SIZE = 500
+
+
+def options():
+    return dict(DEFAULTS, **getattr(settings, 'RISK_ALERTS', {}))
+
+
+def rank(level):
+    return LEVELS.index(level)
+
+
+def level_for(score, thresholds):
+    """综合分对应的最高告警级别，低于所有阈值时返回 None"""
+    reached = [level for level, threshold in thresholds.items() if score >= threshold]
+    return max(reached, key=rank) if reached else None
+
+
+def evaluate(project_ids, overall_scores, now=None, opts=None):
+    """
+    评估一批项目（overall_scores 与 project_ids 对齐），返回 {'created', 'resolved', 'notified'}
+
+    读取 3 条查询（锁定风险档案、相关告警、项目负责人），写入至多 3 条批量语句，全部在一个事务中
+    """
+    opts = opts or options()
+    now = now or timezone.now()
+    thresholds, hysteresis = opts['thresholds'], opts['hysteresis']
+    since = now - timedelta(hours=opts['cooldown_hours'])
+    result = {'created': 0, 'resolved': 0, 'notified': 0}
+    if not project_ids:
+        return result
+    with transaction.atomic():
+        # 锁定本批项目的风险档案，并发的评分任务对同一项目的评估串行执行，不会重复告警
+        list(RiskProfile.objects.select_for_update().filter(project_id__in=project_ids).order_by('id').values_list('id', flat=True))
+        open_alerts, recent = {}, {}
+        for alert_id, project_id, level, is_resolved, created_at in (
+                RiskAlert.objects.filter(project_id__in=project_ids, score__isnull=False)
+                .filter(Q(is_resolved=False) | Q(created_at__gte=since))
+                .values_list('id', 'project_id', 'level', 'is_resolved', 'created_at')):
+            if not is_resolved:
+                open_alerts.setdefault(project_id, []).append((alert_id, level))
+            if created_at >= since and rank(level) > recent.get(project_id, -1):
+                recent[project_id] = rank(level)
+        raised, resolved = [], []
+        for project_id, score in zip(project_ids, overall_scores):
+            target = level_for(score, thresholds)
+            alerts = open_alerts.get(project_id, [])
+            current = max((level for _, level in alerts), key=rank) if alerts else None
+            if current is not None:
+                if target is not None and rank(target) > rank(current):
+                    raised.append((project_id, target, score))
+                    resolved += [alert_id for alert_id, _ in alerts]
+                elif score < thresholds.get(current, float('inf')) - hysteresis:
+                    resolved += [alert_id for alert_id, _ in alerts]
+            elif target is not None and rank(target) > recent.get(project_id, -1):
+                raised.append((project_id, target, score))
+        if resolved:
+            result['resolved'] = RiskAlert.objects.filter(id__in=resolved).update(is_resolved=True)
+        if raised:
+            projects = {project_id: (name, owner_id) for project_id, name, owner_id in
+                        Project.objects.filter(id__in=[project_id for project_id, _, _ in raised]).values_list('id', 'name', 'owner_id')}
+            alerts, notifications = [], []
+            for project_id, level, score in raised:
+                name, owner_id = projects[project_id]
+                title = f'{LEVEL_NAMES[level]}风险: {name} 综合风险分 {score}'
+                description = f'项目 {name} 的综合风险分为 {score}，达到{LEVEL_NAMES[level]}风险阈值 {thresholds[level]}。'
+                alerts.append(RiskAlert(project_id=project_id, level=level, title=title, description=description, score=score))
+                if owner_id:
+                    notifications.append(Notification(recipient_id=owner_id, title=title, content=description))
+            RiskAlert.objects.bulk_create(alerts, batch_size=BATCH_SIZE)
+            Notification.objects.bulk_create(notifications, batch_size=BATCH_SIZE)
+            result['created'], result['notified'] = len(alerts), len(notifications)
+    return result
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class RiskConfig(AppConfig):
+    name = 'apps.risk'
+
+    def ready(self):
+        from . import signals  # noqa: F401 注册看板缓存失效的信号处理
@@ -0,0 +1,95 @@
+"""
+风险看板：分数分布直方图、风险最高的项目、按环境的平均分与未处理告警数，一次返回并缓存在 Redis
+
+缓存键带代号（generation），评分批次或告警变更提交后代号加一（见 signals），旧代号的缓存自然过期；
+正在生成中的旧数据只会写入旧代号，不会覆盖失效后的新数据。缓存缺失时只有一个请求生成，
+其余请求短暂等待结果，看板并发访问时数据库每个代号只查询一次
+"""
+import logging
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, Q
+from django.utils import timezone
+from django_redis.exceptions import ConnectionInterrupted
+from .models import RiskAlert, RiskProfile
+
+GENERATION_KEY = 'risk:dashboard:generation'
+CACHE_KEY = 'risk:dashboard:{}'
+BUILD_LOCK_KEY = 'risk:dashboard:building:{}'
+DEFAULT_CACHE_SECONDS = 300
+HISTOGRAM_BINS = 10
+TOP_N = 20
+WAIT_SECONDS = 3
+SCORE_FIELDS = ('overall_score', 'code_quality_score', 'vulnerability_score', 'pipeline_health_score')
+logger = logging.getLogger(__name__)
+
+
+def cache_seconds():
+    return getattr(settings, 'RISK_DASHBOARD_CACHE_SECONDS', DEFAULT_CACHE_SECONDS)
+
+
+def invalidate():
+    """看板数据失效；Redis 不可用时只记录日志，缓存在过期后刷新"""
+    try:
+        try:
+            cache.incr(GENERATION_KEY)
+        except ValueError:
+            cache.add(GENERATION_KEY, 1, timeout=None)
+    except ConnectionInterrupted:
+        logger.warning('风险看板缓存失效失败', exc_info=True)
+
+
+def build(top_n=TOP_N):
+    """查询看板数据，共 4 条查询"""
+    width = 100 / HISTOGRAM_BINS
+    bins = {f'bin{i}': Count('id', filter=Q(overall_score__gte=i * width) if i == HISTOGRAM_BINS - 1 else
+                              Q(overall_score__gte=i * width, overall_score__lt=(i + 1) * width))
+            for i in range(HISTOGRAM_BINS)}
+    totals = RiskProfile.objects.aggregate(projects=Count('id'), **{f'avg_{field}': Avg(field) for field in SCORE_FIELDS}, **bins)
+    histogram = [{'min': round(i * width, 1), 'max': round((i + 1) * width, 1), 'count': totals.pop(f'bin{i}')}
+                 for i in range(HISTOGRAM_BINS)]
+    top = list(RiskProfile.objects.order_by('-overall_score', 'project_id')
+               .values('project_id', 'project__name', *SCORE_FIELDS, 'updated_at')[:top_n])
+    environments = list(RiskProfile.objects.values('project__environment_id', 'project__environment__name')
+                        .annotate(projects=Count('id'), **{f'avg_{field}': Avg(field) for field in SCORE_FIELDS})
+                        .order_by('project__environment__name'))
+    alerts = dict(RiskAlert.objects.filter(is_resolved=False).values_list('level').annotate(Count('id')).order_by())
+
+    def rounded(row):
+        return {key: round(value, 1) if isinstance(value, float) else value for key, value in row.items()}
+
+    return {
+        'generated_at': timezone.now(),
+        'summary': rounded(totals),
+        'histogram': histogram,
+        'top_projects': [rounded(row) for row in top],
+        'environments': [rounded(row) for row in environments],
+        'open_alerts': {'total': sum(alerts.values()), **{level: alerts.get(level, 0) for level, _ in RiskAlert.LEVEL_CHOICES}},
+    }
+
+
+def get():
+    """读取看板数据，缓存缺失时由一个请求生成，其余请求等待至多 WAIT_SECONDS 秒后自行查询"""
+    generation = cache.get(GENERATION_KEY, 0)
+    key = CACHE_KEY.format(generation)
+    data = cache.get(key)
+    if data is not None:
+        return data
+    lock_key = BUILD_LOCK_KEY.format(generation)
+    acquired = cache.add(lock_key, 1, timeout=WAIT_SECONDS * 2)
+    if not acquired:
+        deadline = time.monotonic() + WAIT_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            data = cache.get(key)
+            if data is not None:
+                return data
+    try:
+        data = build()
+        cache.set(key, data, timeout=cache_seconds())
+    finally:
+        # 等待超时后自行查询的请求没有持有锁，不能释放生成中请求的锁
+        if acquired:
+            cache.delete(lock_key)
+    return data
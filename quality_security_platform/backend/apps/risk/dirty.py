@@ -0,0 +1,86 @@
+"""
+增量风险重算：构建结束、漏洞导入、质量门禁写回时只把项目标记为待重算（Redis 集合），由防抖任务批量重算
+
+第一次标记时安排一个延迟 DEBOUNCE 秒的重算任务，窗口内的后续标记只加入集合，
+同一项目的 500 次构建在窗口内只触发一次重算。任务先把待重算集合整体改名为处理中集合再分批重算，
+重算期间的新标记进入新的集合、由下一次任务处理；任务中途失败时处理中集合在下次运行时并回。
+重算由 Redis 锁串行执行
+"""
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from django_redis.exceptions import ConnectionInterrupted
+from kombu.exceptions import OperationalError
+from redis.exceptions import LockError, RedisError
+
+DIRTY_KEY = 'risk:dirty'
+PROCESSING_KEY = 'risk:dirty:processing'
+SCHEDULED_KEY = 'risk:recompute:scheduled'
+LOCK_KEY = 'risk:recompute:lock'
+# 重算锁的过期时间（秒），须长于一次重算的最长耗时
+LOCK_TIMEOUT = 1800
+DEFAULT_DEBOUNCE_SECONDS = 30
+BATCH_SIZE = 500
+logger = logging.getLogger(__name__)
+
+
+def debounce_seconds():
+    return getattr(settings, 'RISK_RECOMPUTE_DEBOUNCE_SECONDS', DEFAULT_DEBOUNCE_SECONDS)
+
+
+def mark_dirty(project_ids):
+    """
+    标记项目待重算并安排防抖任务；Redis 或消息代理不可用时只记录日志，不影响调用方（构建、导入），
+    遗漏的项目由定时全量重算兜底
+    """
+    project_ids = {project_id for project_id in project_ids if project_id}
+    if not project_ids:
+        return
+    try:
+        get_redis_connection('default').sadd(DIRTY_KEY, *project_ids)
+        if cache.add(SCHEDULED_KEY, 1, timeout=debounce_seconds()):
+            from .tasks import recompute_dirty_risk_scores
+            try:
+                recompute_dirty_risk_scores.apply_async(countdown=debounce_seconds())
+            except OperationalError:
+                # 任务没有发出：清除防抖标记，下一次标记时重新安排
+                cache.delete(SCHEDULED_KEY)
+                raise
+    except (RedisError, ConnectionInterrupted, OperationalError):
+        logger.warning('标记风险待重算失败: projects=%s', sorted(project_ids), exc_info=True)
+
+
+def pending_count():
+    redis = get_redis_connection('default')
+    return redis.scard(DIRTY_KEY) + redis.scard(PROCESSING_KEY)
+
+
+def recompute_dirty(batch_size=BATCH_SIZE):
+    """
+    分批重算待重算集合中的项目，返回重算的项目数；同一时刻只有一个任务重算，
+    另一个任务正在重算时延迟一个防抖窗口后再试，避免两个任务合并 / 删除同一个处理中集合
+    """
+    from .scoring import score_projects
+    redis = get_redis_connection('default')
+    lock = redis.lock(LOCK_KEY, timeout=LOCK_TIMEOUT)
+    if not lock.acquire(blocking=False):
+        from .tasks import recompute_dirty_risk_scores
+        recompute_dirty_risk_scores.apply_async(countdown=debounce_seconds())
+        return 0
+    try:
+        # 上次失败遗留的处理中集合与当前待重算集合在一个事务中合并，合并期间的新标记不会丢失
+        with redis.pipeline() as pipe:
+            pipe.sunionstore(PROCESSING_KEY, [PROCESSING_KEY, DIRTY_KEY])
+            pipe.delete(DIRTY_KEY)
+            pipe.execute()
+        project_ids = sorted(int(project_id) for project_id in redis.smembers(PROCESSING_KEY))
+        for start in range(0, len(project_ids), batch_size):
+            score_projects(project_ids[start:start + batch_size])
+        redis.delete(PROCESSING_KEY)
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            logger.warning('风险重算锁已过期', exc_info=True)
+    return len(project_ids)
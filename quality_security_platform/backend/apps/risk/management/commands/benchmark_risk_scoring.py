@@ -0,0 +1,47 @@
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from apps.risk import scoring
+
+
+class Command(BaseCommand):
+    help = '风险评分基准：按当前数据重算全部项目（结束后回滚，不写入），或用 --synthetic 生成的指标只测计算耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--synthetic', type=int, default=0, help='生成 N 个项目的随机指标，只测计算阶段')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if options['synthetic']:
+            self.synthetic(options['synthetic'], options['repeat'])
+            return
+        runs = []
+        for _ in range(options['repeat']):
+            with transaction.atomic(), CaptureQueriesContext(connection) as queries:
+                begin = time.monotonic()
+                result = scoring.score_projects()
+                elapsed = time.monotonic() - begin
+                transaction.set_rollback(True)
+            runs.append(elapsed)
+            self.stdout.write(f"项目 {result['projects']}，查询 {len(queries)} 条，"
+                              f"耗时 {elapsed:.3f}s {result['timings']}")
+        self.stdout.write(self.style.SUCCESS(f'中位耗时 {statistics.median(runs):.3f}s'))
+
+    def synthetic(self, count, repeat):
+        opts = scoring.options()
+        columns = {'project_id': list(range(count)), 'success': [random.randint(0, 200) for _ in range(count)],
+                   'failed': [random.randint(0, 50) for _ in range(count)]}
+        for severity in scoring.SEVERITIES:
+            columns[severity] = [random.randint(0, 30) for _ in range(count)]
+        for gate in opts['gate_risk']:
+            columns[f'gate_{gate}'] = [random.randint(0, 10) for _ in range(count)]
+        score_weights = {'code_quality': 0.3, 'vulnerability': 0.4, 'pipeline_health': 0.3}
+        runs = []
+        for _ in range(repeat):
+            begin = time.monotonic()
+            scoring.compute(columns, opts, score_weights)
+            runs.append(time.monotonic() - begin)
+        self.stdout.write(self.style.SUCCESS(f'{count} 个项目，计算中位耗时 {statistics.median(runs) * 1000:.2f}ms'))
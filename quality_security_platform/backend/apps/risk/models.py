@@ -17,4 +17,23 @@ class RiskAlert(models.Model):
     description = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     is_resolved = models.BooleanField(default=False)
-    class Meta: db_table = 'risk_alerts'
+    # 评分阈值告警记录触发时的综合分，手工创建的告警为空
+    score = models.FloatField('触发时综合分', null=True, blank=True)
+    class Meta:
+        db_table = 'risk_alerts'
+        indexes = [models.Index(fields=['project', 'is_resolved'])]
+class RiskScoreHistory(models.Model):
+    """风险分时间序列：每个项目每个时间桶一行，保存桶内各次评分的平均值；写入时同时更新小时 / 天 / 周三级，过期的细粒度行定期清理"""
+    GRANULARITY_CHOICES = (('hour', '小时'), ('day', '天'), ('week', '周'))
+    granularity = models.CharField(max_length=10, choices=GRANULARITY_CHOICES)
+    bucket = models.DateTimeField('时间桶起点')
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='risk_history')
+    overall_score = models.FloatField(default=0.0)
+    code_quality_score = models.FloatField(default=0.0)
+    vulnerability_score = models.FloatField(default=0.0)
+    pipeline_health_score = models.FloatField(default=0.0)
+    samples = models.IntegerField('评分次数', default=0)
+    class Meta:
+        db_table = 'risk_score_history'; ordering = ['project', 'bucket']
+        unique_together = ('granularity', 'project', 'bucket')
+        indexes = [models.Index(fields=['granularity', 'bucket'])]
@@ -0,0 +1,184 @@
+"""
+风险评分：按列批量计算全部（或指定）项目的风险档案，分数均为 0~100，越高风险越大
+
+- 输入指标每类一条聚合查询（按项目分组），不按项目逐个查询：
+  漏洞 = 未消除漏洞按严重性计数；代码质量 = 窗口内 SonarQube 质量门禁结果计数；流水线 = 窗口内天粒度健康汇总的成功 / 失败数
+- 子分数按列计算：漏洞分 = 100 × (1 - e^(-加权漏洞数 / 尺度))，质量分 = 门禁结果风险值的均值，流水线分 = 100 × 失败率
+- 综合分 = 质量分 × 权重 + 漏洞分 × 权重 + 流水线分 × 权重（constance 动态配置，默认 0.3 / 0.4 / 0.3）
+- 只写回分数有变化的档案：已有档案一次 bulk_update，缺少档案的项目一次 bulk_create（跳过并发建档的冲突行后补充更新）；每次评分同时记入风险分历史
+- 写回后按综合分评估阈值告警（见 alerts），同一批次的告警与站内信一次批量写入；完成后发送 risk_changed 信号
+
+子分数公式的参数（严重性权重、饱和尺度、门禁风险值、统计窗口）可在 settings.RISK_SCORING 中覆盖
+"""
+import math
+import time
+from datetime import timedelta
+from constance import config
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from apps.ci_cd.models import BuildRecord, PipelineHealthRollup
+from apps.projects.models import Project
+from apps.vulnerabilities.models import ArtifactVulnerability
+from . import alerts, history
+from .models import RiskProfile
+from .signals import risk_changed
+
+DEFAULTS = {
+    'window_days': 30,
+    'severity_weights': {'critical': 10.0, 'high': 5.0, 'medium': 2.0, 'low': 0.5},
+    # 加权漏洞数等于尺度时漏洞分约为 63，两倍尺度约为 86
+    'vulnerability_scale': 50.0,
+    'gate_risk': {'OK': 0.0, 'WARN': 50.0, 'ERROR': 100.0, 'FAILED': 100.0},
+    # 没有对应数据的项目的子分数
+    'missing_score': 0.0,
+}
+SEVERITIES = ('critical', 'high', 'medium', 'low')
+SCORE_FIELDS = ('overall_score', 'code_quality_score', 'vulnerability_score', 'pipeline_health_score')
+BATCH_SIZE = 500
+
+
+def options():
+    return dict(DEFAULTS, **getattr(settings, 'RISK_SCORING', {}))
+
+
+def weights():
+    return {
+        'code_quality': config.RISK_WEIGHT_CODE_QUALITY,
+        'vulnerability': config.RISK_WEIGHT_VULNERABILITY,
+        'pipeline_health': config.RISK_WEIGHT_PIPELINE_HEALTH,
+    }
+
+
+def collect(project_ids=None, opts=None):
+    """
+    读取输入指标，返回按列组织的数据：{'project_id': [...], 指标名: [...]}，各列按项目对齐
+
+    共 4 条查询：项目列表、漏洞计数、门禁结果计数、健康汇总
+    """
+    opts = opts or options()
+    since = timezone.now() - timedelta(days=opts['window_days'])
+    projects = Project.objects.order_by('id')
+    if project_ids is not None:
+        projects = projects.filter(id__in=project_ids)
+    ids = list(projects.values_list('id', flat=True))
+    index = {project_id: i for i, project_id in enumerate(ids)}
+    gates = sorted(opts['gate_risk'])
+    columns = {name: [0] * len(ids) for name in (*SEVERITIES, *(f'gate_{gate}' for gate in gates), 'success', 'failed')}
+    columns['project_id'] = ids
+    if not ids:
+        return columns
+
+    def fill(rows, names):
+        for project_id, *values in rows:
+            i = index.get(project_id)
+            if i is not None:
+                for name, value in zip(names, values):
+                    columns[name][i] = value or 0
+
+    scope = {} if project_ids is None else {'project_id__in': ids}
+    fill(ArtifactVulnerability.objects.filter(resolved_at__isnull=True, **scope).values_list('project_id')
+         .annotate(**{severity: Count('id', filter=Q(severity=severity)) for severity in SEVERITIES}).order_by(), SEVERITIES)
+    builds = BuildRecord.objects.filter(created_at__gte=since, sonar_quality_gate__in=gates)
+    if project_ids is not None:
+        builds = builds.filter(pipeline__project_id__in=ids)
+    fill(builds.values_list('pipeline__project_id')
+         .annotate(**{f'gate_{gate}': Count('id', filter=Q(sonar_quality_gate=gate)) for gate in gates}).order_by(),
+         [f'gate_{gate}' for gate in gates])
+    fill(PipelineHealthRollup.objects.filter(granularity='day', bucket__gte=since, **scope).values_list('project_id')
+         .annotate(success=Sum('success'), failed=Sum('failed')).order_by(), ('success', 'failed'))
+    return columns
+
+
+def compute(columns, opts=None, score_weights=None):
+    """按列计算子分数与综合分，返回 {分数字段: [...]}，与输入列对齐"""
+    opts = opts or options()
+    score_weights = score_weights or weights()
+    missing = opts['missing_score']
+    severity_weights = opts['severity_weights']
+    scale = opts['vulnerability_scale']
+    weighted = [0.0] * len(columns['project_id'])
+    for severity in SEVERITIES:
+        weight = severity_weights.get(severity, 0)
+        weighted = [total + count * weight for total, count in zip(weighted, columns[severity])]
+    vulnerability = [100.0 * (1.0 - math.exp(-value / scale)) for value in weighted]
+    gates = sorted(opts['gate_risk'])
+    gate_total = [0] * len(weighted)
+    gate_sum = [0.0] * len(weighted)
+    for gate in gates:
+        risk = opts['gate_risk'][gate]
+        gate_total = [total + count for total, count in zip(gate_total, columns[f'gate_{gate}'])]
+        gate_sum = [total + count * risk for total, count in zip(gate_sum, columns[f'gate_{gate}'])]
+    quality = [value / total if total else missing for value, total in zip(gate_sum, gate_total)]
+    pipeline = [100.0 * failed / (success + failed) if success + failed else missing
+                for success, failed in zip(columns['success'], columns['failed'])]
+    overall = [q * score_weights['code_quality'] + v * score_weights['vulnerability'] + p * score_weights['pipeline_health']
+               for q, v, p in zip(quality, vulnerability, pipeline)]
+    return {
+        'overall_score': [round(value, 1) for value in overall],
+        'code_quality_score': [round(value, 1) for value in quality],
+        'vulnerability_score': [round(value, 1) for value in vulnerability],
+        'pipeline_health_score': [round(value, 1) for value in pipeline],
+    }
+
+
+def _changed(profiles, values, now):
+    """分数与本次计算结果不同的档案，就地赋值后返回"""
+    changed = []
+    for profile in profiles:
+        target = values[profile.project_id]
+        if any(getattr(profile, field) != value for field, value in target.items()):
+            for field, value in target.items():
+                setattr(profile, field, value)
+            # bulk_update 不会触发 auto_now，需要显式写入更新时间
+            profile.updated_at = now
+            changed.append(profile)
+    return changed
+
+
+def write(project_ids, scores, batch_size=BATCH_SIZE):
+    """
+    写回分数有变化的档案，返回 (更新数, 新建数)
+
+    并发的评分任务可能同时为同一新项目建档：bulk_create 跳过冲突的行，再读取这些项目的档案按本次结果更新
+    """
+    now = timezone.now()
+    values = {project_id: {field: scores[field][i] for field in SCORE_FIELDS} for i, project_id in enumerate(project_ids)}
+    profiles = {profile.project_id: profile for profile in
+                RiskProfile.objects.filter(project_id__in=project_ids).only('id', 'project_id', *SCORE_FIELDS)}
+    created = [RiskProfile(project_id=project_id, **values[project_id]) for project_id in project_ids if project_id not in profiles]
+    changed = _changed(profiles.values(), values, now)
+    RiskProfile.objects.bulk_update(changed, (*SCORE_FIELDS, 'updated_at'), batch_size=batch_size)
+    conflicted = []
+    if created:
+        RiskProfile.objects.bulk_create(created, batch_size=batch_size, ignore_conflicts=True)
+        conflicted = _changed(RiskProfile.objects.filter(project_id__in=[profile.project_id for profile in created])
+                              .only('id', 'project_id', *SCORE_FIELDS), values, now)
+        RiskProfile.objects.bulk_update(conflicted, (*SCORE_FIELDS, 'updated_at'), batch_size=batch_size)
+    return len(changed) + len(conflicted), len(created) - len(conflicted)
+
+
+def score_projects(project_ids=None):
+    """重算风险档案（默认全部项目），返回处理数量与各阶段耗时"""
+    timings = {}
+    begin = time.monotonic()
+    opts = options()
+    columns = collect(project_ids, opts)
+    timings['collect'] = time.monotonic() - begin
+    begin = time.monotonic()
+    scores = compute(columns, opts)
+    timings['compute'] = time.monotonic() - begin
+    begin = time.monotonic()
+    updated, created = write(columns['project_id'], scores)
+    # 每次评分都记入历史，分数未变化的项目也保留趋势点
+    history.record(columns['project_id'], scores)
+    timings['write'] = time.monotonic() - begin
+    begin = time.monotonic()
+    raised = alerts.evaluate(columns['project_id'], scores['overall_score'])
+    timings['alerts'] = time.monotonic() - begin
+    # 批量写入不触发模型信号，提交后由信号使风险看板缓存失效
+    risk_changed.send(sender=RiskProfile)
+    return {
+        'projects': len(columns['project_id']), 'updated': updated, 'created': created, 'alerts': raised,
+        'timings': {phase: round(seconds, 4) for phase, seconds in timings.items()},
+    }
@@ -0,0 +1,20 @@
+"""
+风险数据变更信号：评分批次、告警评估等批量写入（bulk_create / bulk_update 不触发模型信号）完成后发送 risk_changed，
+单条的档案 / 告警保存与删除沿用模型信号；均在事务提交后使风险看板缓存失效
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+from . import dashboard
+from .models import RiskAlert, RiskProfile
+
+risk_changed = Signal()
+
+
+@receiver(risk_changed)
+@receiver(post_save, sender=RiskProfile)
+@receiver(post_delete, sender=RiskProfile)
+@receiver(post_save, sender=RiskAlert)
+@receiver(post_delete, sender=RiskAlert)
+def invalidate_dashboard(sender, **kwargs):
+    transaction.on_commit(dashboard.invalidate)
@@ -0,0 +1,16 @@
+from celery import shared_task
+@shared_task
+def recompute_risk_scores(project_ids=None):
+    """批量重算风险档案，project_ids 为空时重算全部项目"""
+    from .scoring import score_projects
+    return score_projects(project_ids)
+@shared_task
+def recompute_dirty_risk_scores():
+    """防抖任务：只重算被标记的项目"""
+    from .dirty import recompute_dirty
+    return recompute_dirty()
+@shared_task
+def prune_risk_history():
+    """清理超过保留期的小时 / 天粒度风险分历史"""
+    from .history import prune
+    return prune()
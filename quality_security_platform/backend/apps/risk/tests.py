@@ -0,0 +1,172 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from apps.projects.models import Environment, Project
+from apps.system.models import Notification
+from apps.users.models import User
+from kombu.exceptions import OperationalError
+from . import alerts, dashboard, dirty, history, scoring
+from .models import RiskAlert, RiskProfile
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def create_projects(count):
+    environment, _ = Environment.objects.get_or_create(name='test')
+    return [Project.objects.create(name=f'demo{index}', git_repo='https://git.example.com/demo.git', environment=environment,
+                                   deploy_dir='/opt/demo', start_script='start.sh', stop_script='stop.sh')
+            for index in range(count)]
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class MarkDirtyTests(SimpleTestCase):
+    """标记待重算不因 Redis / 消息代理故障影响调用方"""
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(dirty, 'get_redis_connection')
+        self.redis = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    @mock.patch('apps.risk.tasks.recompute_dirty_risk_scores.apply_async', side_effect=OperationalError('broker down'))
+    def test_broker_error_logged(self, apply_async):
+        with self.assertLogs('apps.risk.dirty', 'WARNING'):
+            dirty.mark_dirty([1, 2])
+        self.redis.sadd.assert_called_once_with(dirty.DIRTY_KEY, 1, 2)
+        # 任务没有发出时不保留防抖标记，下一次标记重新安排
+        self.assertIsNone(cache.get(dirty.SCHEDULED_KEY))
+        apply_async.side_effect = None
+        dirty.mark_dirty([3])
+        self.assertEqual(apply_async.call_count, 2)
+
+    @mock.patch('apps.risk.tasks.recompute_dirty_risk_scores.apply_async')
+    def test_debounced(self, apply_async):
+        for project_id in range(1, 100):
+            dirty.mark_dirty([project_id])
+        apply_async.assert_called_once_with(countdown=dirty.debounce_seconds())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class DashboardCacheTests(SimpleTestCase):
+    """看板缓存缺失时只有持锁的请求释放生成锁"""
+
+    def setUp(self):
+        cache.clear()
+
+    @mock.patch.object(dashboard, 'WAIT_SECONDS', 0.1)
+    @mock.patch.object(dashboard, 'build', return_value={'summary': {}})
+    def test_waiter_keeps_lock(self, build):
+        lock_key = dashboard.BUILD_LOCK_KEY.format(0)
+        cache.add(lock_key, 1)
+        # 等待超时后自行查询，另一个请求持有的锁保持不变
+        self.assertEqual(dashboard.get(), {'summary': {}})
+        self.assertEqual(cache.get(lock_key), 1)
+        cache.delete(lock_key)
+        cache.delete(dashboard.CACHE_KEY.format(0))
+        dashboard.get()
+        self.assertIsNone(cache.get(lock_key))
+        self.assertEqual(build.call_count, 2)
+
+class RecomputeDirtyTests(SimpleTestCase):
+    """重算持锁执行，锁被占用时延迟重试"""
+
+    def setUp(self):
+        patcher = mock.patch.object(dirty, 'get_redis_connection')
+        self.redis = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    @mock.patch('apps.risk.scoring.score_projects')
+    def test_recompute_under_lock(self, score_projects):
+        self.redis.smembers.return_value = {b'3', b'1', b'2'}
+        self.assertEqual(dirty.recompute_dirty(batch_size=2), 3)
+        self.redis.lock.assert_called_once_with(dirty.LOCK_KEY, timeout=dirty.LOCK_TIMEOUT)
+        self.assertEqual([call[0][0] for call in score_projects.call_args_list], [[1, 2], [3]])
+        self.redis.delete.assert_called_once_with(dirty.PROCESSING_KEY)
+        self.redis.lock.return_value.release.assert_called_once_with()
+
+    @mock.patch('apps.risk.tasks.recompute_dirty_risk_scores.apply_async')
+    @mock.patch('apps.risk.scoring.score_projects')
+    def test_locked_rescheduled(self, score_projects, apply_async):
+        self.redis.lock.return_value.acquire.return_value = False
+        self.assertEqual(dirty.recompute_dirty(), 0)
+        score_projects.assert_not_called()
+        self.redis.pipeline.assert_not_called()
+        apply_async.assert_called_once_with(countdown=dirty.debounce_seconds())
+
+class ScoringWriteTests(TestCase):
+    """写回档案时并发建档的冲突行按本次结果更新"""
+
+    def scores(self, *overall):
+        return {field: list(overall) if field == 'overall_score' else [0.0] * len(overall) for field in scoring.SCORE_FIELDS}
+
+    def test_concurrent_create(self):
+        first, second = create_projects(2)
+        bulk_create = RiskProfile.objects.bulk_create
+
+        def concurrent(objs, **kwargs):
+            # 读取档案之后、建档之前另一个评分任务为 first 建档
+            RiskProfile.objects.create(project=first, overall_score=10.0)
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(RiskProfile.objects, 'bulk_create', side_effect=concurrent):
+            self.assertEqual(scoring.write([first.id, second.id], self.scores(80.0, 20.0)), (1, 1))
+        self.assertEqual(dict(RiskProfile.objects.values_list('project_id', 'overall_score')), {first.id: 80.0, second.id: 20.0})
+
+
+class HistoryBucketTests(SimpleTestCase):
+    """风险分历史与流水线健康汇总按同样的本地日期划分天 / 周桶"""
+
+    @override_settings(USE_TZ=True, TIME_ZONE='Asia/Shanghai')
+    def test_local_buckets(self):
+        # UTC 周日 17:30 为东八区周一 01:30
+        value = datetime(2024, 3, 3, 17, 30, tzinfo=dt_timezone.utc)
+        local = {granularity: timezone.localtime(history.truncate(value, granularity)).replace(tzinfo=None)
+                 for granularity in history.GRANULARITIES}
+        self.assertEqual(local, {'hour': datetime(2024, 3, 4, 1), 'day': datetime(2024, 3, 4), 'week': datetime(2024, 3, 4)})
+
+    def test_naive_buckets(self):
+        self.assertEqual(history.truncate(datetime(2024, 3, 6, 13, 45), 'week'), datetime(2024, 3, 4))
+
+
+class AlertEvaluateTests(TestCase):
+    """阈值告警：升级时关闭旧告警，回差内不关闭，冷却期内不重复告警"""
+
+    def setUp(self):
+        self.project = create_projects(1)[0]
+        self.project.owner = User.objects.create_user(username='owner', password='owner')
+        self.project.save()
+
+    def evaluate(self, score):
+        return alerts.evaluate([self.project.id], [score])
+
+    def open_levels(self):
+        return list(RiskAlert.objects.filter(is_resolved=False).values_list('level', flat=True))
+
+    def test_escalation_resolves_older(self):
+        self.assertEqual(self.evaluate(55.0), {'created': 1, 'resolved': 0, 'notified': 1})
+        # 同级不重复告警
+        self.assertEqual(self.evaluate(60.0)['created'], 0)
+        self.assertEqual(self.evaluate(90.0), {'created': 1, 'resolved': 1, 'notified': 1})
+        self.assertEqual(self.open_levels(), ['critical'])
+        self.assertEqual(Notification.objects.filter(recipient=self.project.owner).count(), 2)
+
+    def test_hysteresis(self):
+        self.evaluate(72.0)
+        # 低于高风险阈值 70 但未低于 70 - 5，告警保持未处理
+        self.assertEqual(self.evaluate(66.0)['resolved'], 0)
+        self.assertEqual(self.open_levels(), ['high'])
+        self.assertEqual(self.evaluate(64.0)['resolved'], 1)
+        self.assertEqual(self.open_levels(), [])
+
+    def test_cooldown(self):
+        self.evaluate(55.0)
+        self.evaluate(40.0)
+        # 关闭后 cooldown_hours 内再次达到同级阈值不重复告警，升级不受冷却限制
+        self.assertEqual(self.evaluate(55.0)['created'], 0)
+        RiskAlert.objects.update(created_at=timezone.now() - timedelta(hours=alerts.DEFAULTS['cooldown_hours'] + 1))
+        self.assertEqual(self.evaluate(55.0)['created'], 1)
+        self.evaluate(40.0)
+        self.assertEqual(self.evaluate(75.0)['created'], 1)
+        self.assertEqual(self.open_levels(), ['high'])
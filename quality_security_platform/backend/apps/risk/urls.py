@@ -1,6 +1,7 @@
 from rest_framework.routers import SimpleRouter
-from .views import RiskProfileViewSet, RiskAlertViewSet
+from .views import RiskProfileViewSet, RiskAlertViewSet, RiskHistoryViewSet
 router = SimpleRouter()
 router.register('profiles', RiskProfileViewSet, basename='riskprofile')
 router.register('alerts', RiskAlertViewSet, basename='riskalert')
+router.register('history', RiskHistoryViewSet, basename='riskhistory')
 urlpatterns = router.urls
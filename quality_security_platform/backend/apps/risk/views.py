@@ -3,8 +3,13 @@ from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
-from .models import RiskProfile, RiskAlert
-from .serializers import RiskProfileSerializer, RiskAlertSerializer
+from datetime import datetime, timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from . import dashboard, history
+from .models import RiskProfile, RiskAlert, RiskScoreHistory
+from .serializers import RiskProfileSerializer, RiskAlertSerializer, RiskScoreHistorySerializer
+from .tasks import recompute_risk_scores
 from apps.base.viewsets import BaseModelViewSet
 
 
@@ -29,6 +34,25 @@ class RiskProfileViewSet(BaseModelViewSet):
         deleted, _ = self.get_queryset().filter(id__in=ids).delete()
         return Response({'deleted': deleted}, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=['post'])
+    def recompute(self, request):
+        """异步重算风险档案，可用 project_ids 指定项目，默认全部"""
+        project_ids = request.data.get('project_ids') or None
+        if project_ids is not None and not (isinstance(project_ids, list) and all(isinstance(i, int) for i in project_ids)):
+            return Response({'detail': 'project_ids 须为整数列表'}, status=status.HTTP_400_BAD_REQUEST)
+        task = recompute_risk_scores.delay(project_ids)
+        return Response({'task_id': task.id}, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['get'])
+    def dashboard(self, request):
+        """风险看板：分数分布、风险最高的项目（top 默认 10，至多 20）、按环境平均分、未处理告警数；数据来自缓存"""
+        try:
+            top = min(max(int(request.query_params.get('top', 10)), 1), dashboard.TOP_N)
+        except ValueError:
+            return Response({'detail': 'top 须为整数'}, status=status.HTTP_400_BAD_REQUEST)
+        data = dashboard.get()
+        return Response(dict(data, top_projects=data['top_projects'][:top]))
+
 
 class RiskAlertViewSet(BaseModelViewSet):
     """
@@ -49,4 +73,53 @@ class RiskAlertViewSet(BaseModelViewSet):
         if not ids:
             return Response({'detail': '请提供要删除的ID列表'}, status=status.HTTP_400_BAD_REQUEST)
         deleted, _ = self.get_queryset().filter(id__in=ids).delete()
-        return Response({'deleted': deleted}, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response({'deleted': deleted}, status=status.HTTP_200_OK)
+
+
+def _time_param(value):
+    """日期或日期时间参数，无法解析时抛出 ValueError"""
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'无效的时间: {value}')
+        parsed = datetime(day.year, day.month, day.day)
+    if timezone.is_aware(timezone.now()) and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class RiskHistoryViewSet(BaseModelViewSet):
+    """
+    风险分历史：小时 / 天 / 周粒度，只读
+    """
+    queryset = RiskScoreHistory.objects.all()
+    serializer_class = RiskScoreHistorySerializer
+    http_method_names = ['get', 'head', 'options']
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['granularity', 'project']
+    ordering_fields = ['bucket', 'overall_score']
+
+    @action(detail=False, methods=['get'])
+    def series(self, request):
+        """
+        多个项目的趋势：projects 为逗号分隔的项目主键（省略时为全部项目），start/end 或 days（默认 30 天）指定范围，
+        granularity 省略时按范围自动选择，fields 可只取部分分数；按列返回，每个项目一组等长数组
+        """
+        params = request.query_params
+        try:
+            project_ids = [int(value) for value in params['projects'].split(',') if value] if params.get('projects') else None
+            end = _time_param(params.get('end')) or timezone.now()
+            start = _time_param(params.get('start')) or end - timedelta(days=int(params.get('days') or 30))
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        granularity = params.get('granularity') or None
+        if granularity and granularity not in history.GRANULARITIES:
+            return Response({'detail': 'granularity 只能为 hour、day 或 week'}, status=status.HTTP_400_BAD_REQUEST)
+        fields = [field for field in params.get('fields', '').split(',') if field] or history.SCORE_FIELDS
+        if not set(fields) <= set(history.SCORE_FIELDS):
+            return Response({'detail': f'fields 只能为 {", ".join(history.SCORE_FIELDS)}'}, status=status.HTTP_400_BAD_REQUEST)
+        granularity, data = history.series(start, end, project_ids, granularity, fields)
+        return Response({'granularity': granularity, 'start': start, 'end': end, 'series': data})
@@ -0,0 +1,66 @@
+from django.contrib import admin
+from .models import Artifact, Vulnerability, DependencyCheckScan, ArtifactVulnerability, ProjectArtifact, ArtifactChangeNotice, NvdCve, NvdFeed
+
+
+@admin.register(Artifact)
+class ArtifactAdmin(admin.ModelAdmin):
+    list_display = ('id', 'group', 'name', 'version', 'hash', 'created_at')
+    search_fields = ('group', 'name', 'version')
+    ordering = ('group', 'name', 'version')
+
+
+@admin.register(Vulnerability)
+class VulnerabilityAdmin(admin.ModelAdmin):
+    list_display = ('id', 'cve_id', 'severity', 'cvss_score', 'created_at')
+    search_fields = ('cve_id', 'description')
+    list_filter = ('severity',)
+    ordering = ('-id',)
+
+
+@admin.register(NvdCve)
+class NvdCveAdmin(admin.ModelAdmin):
+    list_display = ('id', 'cve_id', 'severity', 'cvss_score', 'cvss_vector', 'published_at', 'last_modified_at')
+    search_fields = ('cve_id',)
+    list_filter = ('severity',)
+    ordering = ('-last_modified_at',)
+
+
+@admin.register(NvdFeed)
+class NvdFeedAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'cve_count', 'created_count', 'updated_count', 'duration', 'loaded_at')
+    search_fields = ('name',)
+    ordering = ('name',)
+
+
+@admin.register(DependencyCheckScan)
+class DependencyCheckScanAdmin(admin.ModelAdmin):
+    list_display = ('id', 'project', 'report_format', 'status', 'dependency_count', 'finding_count', 'added_count', 'removed_count', 'file_size', 'duration', 'uploaded_by', 'created_at')
+    search_fields = ('project__name', 'report_file', 'batch_id')
+    list_filter = ('status', 'report_format', 'project')
+    ordering = ('-created_at',)
+
+
+@admin.register(ArtifactVulnerability)
+class ArtifactVulnerabilityAdmin(admin.ModelAdmin):
+    list_display = ('id', 'project', 'artifact', 'vulnerability', 'severity', 'first_seen_at', 'last_seen_at', 'resolved_at')
+    search_fields = ('project__name', 'artifact__name', 'artifact__version', 'vulnerability__cve_id')
+    list_filter = ('severity', 'project')
+    list_select_related = ('project', 'artifact', 'vulnerability')
+    raw_id_fields = ('artifact', 'vulnerability', 'first_seen_scan', 'resolved_scan')
+
+
+@admin.register(ProjectArtifact)
+class ProjectArtifactAdmin(admin.ModelAdmin):
+    list_display = ('id', 'project', 'artifact', 'worst_severity', 'vulnerability_count', 'updated_at')
+    search_fields = ('project__name', 'artifact__name')
+    list_filter = ('worst_severity', 'project')
+    list_select_related = ('project', 'artifact')
+    raw_id_fields = ('artifact',)
+
+
+@admin.register(ArtifactChangeNotice)
+class ArtifactChangeNoticeAdmin(admin.ModelAdmin):
+    list_display = ('id', 'release_version', 'artifact_group', 'artifact_name', 'new_version', 'notify_method', 'status', 'affected_count', 'notified_count', 'requested_by', 'created_at')
+    search_fields = ('artifact_group', 'artifact_name', 'new_version')
+    list_filter = ('status', 'notify_method', 'release_version')
+    ordering = ('-created_at',)
@@ -0,0 +1,74 @@
+"""
+工件/漏洞目录：按内容哈希驻留，同一工件坐标与 CVE 在所有项目、所有扫描间只存一行
+"""
+import hashlib
+from .models import Artifact, Vulnerability
+
+
+def content_hash(*parts):
+    return hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+def artifact_hash(group, name, version):
+    return content_hash(group, name, version)
+
+
+def vulnerability_hash(cve_id):
+    return content_hash(cve_id.upper())
+
+
+class Catalog:
+    """
+    单次导入内的 哈希 -> 主键 缓存；未命中的工件与漏洞按批 upsert（ON CONFLICT DO NOTHING）后回查主键
+
+    缓存规模取决于去重后的工件/CVE 数量（数千级），与报告大小无关
+    """
+
+    def __init__(self):
+        self.artifact_ids = {}
+        self.vulnerability_ids = {}
+
+    def intern(self, batch):
+        """为批次中每行补充 artifact_id / vulnerability_id"""
+        artifacts, vulnerabilities = {}, {}
+        for row in batch:
+            row['artifact_hash'] = key = artifact_hash(row['group'], row['name'], row['version'])
+            if key not in self.artifact_ids:
+                artifacts[key] = row
+            row['vulnerability_hash'] = key = vulnerability_hash(row['cve_id'])
+            if key not in self.vulnerability_ids:
+                vulnerabilities[key] = row
+        if artifacts:
+            self._upsert(Artifact, self.artifact_ids, artifacts, lambda key, row: Artifact(
+                hash=key, group=row['group'], name=row['name'], version=row['version']))
+        if vulnerabilities:
+            self._upsert(Vulnerability, self.vulnerability_ids, vulnerabilities, lambda key, row: Vulnerability(
+                hash=key, cve_id=row['cve_id'], severity=row['severity'], cvss_score=row['cvss_score'],
+                cvss_vector=row['cvss_vector'], description=row['description']))
+        for row in batch:
+            row['artifact_id'] = self.artifact_ids[row['artifact_hash']]
+            row['vulnerability_id'] = self.vulnerability_ids[row['vulnerability_hash']]
+        return batch
+
+    def intern_artifacts(self, coordinates):
+        """驻留 (组织名, 工件名, 版本) 集合，返回对应的主键列表"""
+        keys = {artifact_hash(*coords): coords for coords in coordinates}
+        pending = {key: coords for key, coords in keys.items() if key not in self.artifact_ids}
+        if pending:
+            self._upsert(Artifact, self.artifact_ids, pending, lambda key, coords: Artifact(
+                hash=key, group=coords[0], name=coords[1], version=coords[2]))
+        return [self.artifact_ids[key] for key in keys]
+
+    @staticmethod
+    def _upsert(model, ids, pending, build):
+        # 先查后插：目录趋于稳定后，重复导入只读不写
+        ids.update(model.objects.filter(hash__in=list(pending)).values_list('hash', 'id'))
+        missing = [key for key in pending if key not in ids]
+        if missing:
+            model.objects.bulk_create([build(key, pending[key]) for key in missing], ignore_conflicts=True)
+            ids.update(model.objects.filter(hash__in=missing).values_list('hash', 'id'))
+
+
+def finding_fingerprint(artifact_key, vulnerability_key, severity):
+    """漏洞指纹：工件 + CVE + 严重性，用于与上一次扫描做差异比对"""
+    return content_hash(artifact_key, vulnerability_key, severity)
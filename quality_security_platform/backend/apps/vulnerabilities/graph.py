@@ -0,0 +1,222 @@
+"""
+项目-工件关系图谱（AV03/AV04）：维护邻接索引，并以紧凑的节点/边数组输出
+"""
+import base64
+import json
+from django.db.models import Q
+from apps.projects.models import Project
+from .models import SEVERITY_CHOICES, Artifact, ProjectArtifact
+
+SEVERITY_LEVELS = [value for value, _ in SEVERITY_CHOICES]
+NODE_FIELDS = ['id', 'type', 'label', 'version', 'severity', 'vulns']
+DEFAULT_NODE_LIMIT = 500
+MAX_NODE_LIMIT = 5000
+MAX_DEPTH = 3
+DEFAULT_FANOUT = 20
+MAX_FANOUT = 200
+
+
+def update_project_edges(project_id, artifact_stats):
+    """
+    用一次导入的结果刷新项目的邻接索引
+
+    artifact_stats: {artifact_id: (最高严重性等级, 漏洞数)}；只写入有变化的边
+    """
+    existing = {
+        artifact_id: (pk, severity, count)
+        for pk, artifact_id, severity, count in ProjectArtifact.objects.filter(project_id=project_id)
+        .values_list('id', 'artifact_id', 'worst_severity', 'vulnerability_count').iterator()
+    }
+    created, changed = [], []
+    for artifact_id, (severity, count) in artifact_stats.items():
+        edge = existing.get(artifact_id)
+        if edge is None:
+            created.append(ProjectArtifact(project_id=project_id, artifact_id=artifact_id, worst_severity=severity, vulnerability_count=count))
+        elif edge[1:] != (severity, count):
+            changed.append(ProjectArtifact(id=edge[0], worst_severity=severity, vulnerability_count=count))
+    removed = [edge[0] for artifact_id, edge in existing.items() if artifact_id not in artifact_stats]
+    if created:
+        ProjectArtifact.objects.bulk_create(created, batch_size=1000, ignore_conflicts=True)
+    if changed:
+        ProjectArtifact.objects.bulk_update(changed, ['worst_severity', 'vulnerability_count'], batch_size=1000)
+    for start in range(0, len(removed), 1000):
+        ProjectArtifact.objects.filter(id__in=removed[start:start + 1000]).delete()
+    return {'created': len(created), 'updated': len(changed), 'deleted': len(removed)}
+
+
+def clamp_limit(value, default=DEFAULT_NODE_LIMIT, maximum=MAX_NODE_LIMIT):
+    try:
+        return max(1, min(int(value), maximum))
+    except (TypeError, ValueError):
+        return default
+
+
+def artifact_label(group, name):
+    return f'{group}:{name}' if group else name
+
+
+def project_graph(project, limit=DEFAULT_NODE_LIMIT):
+    """以项目为中心：节点 0 为项目，其余为依赖工件，按严重性降序截断"""
+    rows = list(
+        ProjectArtifact.objects.filter(project_id=project.id).order_by('-worst_severity', '-vulnerability_count')
+        .values_list('artifact_id', 'artifact__group', 'artifact__name', 'artifact__version', 'worst_severity', 'vulnerability_count')[:limit + 1]
+    )
+    truncated = len(rows) > limit
+    rows = rows[:limit]
+    # 按严重性降序截断，中心节点的最高严重性仍准确，漏洞数为返回节点之和
+    nodes = [[f'p{project.id}', 'project', project.name, None,
+              max((row[4] for row in rows), default=0), sum(row[5] for row in rows)]]
+    nodes += [[f'a{artifact_id}', 'artifact', artifact_label(group, name), version, severity, count]
+              for artifact_id, group, name, version, severity, count in rows]
+    return _payload(nodes, truncated)
+
+
+def artifact_graph(artifact, limit=DEFAULT_NODE_LIMIT):
+    """以工件为中心：节点 0 为工件，其余为引用该工件的项目"""
+    rows = list(
+        ProjectArtifact.objects.filter(artifact_id=artifact.id).order_by('-worst_severity', 'project_id')
+        .values_list('project_id', 'project__name', 'worst_severity', 'vulnerability_count')[:limit + 1]
+    )
+    truncated = len(rows) > limit
+    rows = rows[:limit]
+    nodes = [[f'a{artifact.id}', 'artifact', artifact_label(artifact.group, artifact.name), artifact.version,
+              max((row[2] for row in rows), default=0), max((row[3] for row in rows), default=0)]]
+    nodes += [[f'p{project_id}', 'project', name, None, severity, count] for project_id, name, severity, count in rows]
+    return _payload(nodes, truncated)
+
+
+def _payload(nodes, truncated):
+    return {
+        'severity_levels': SEVERITY_LEVELS,
+        'node_fields': NODE_FIELDS,
+        'nodes': nodes,
+        # 边为节点数组下标对：星形图的中心固定为 0
+        'edges': [[0, index] for index in range(1, len(nodes))],
+        'truncated': truncated,
+    }
+
+
+def parse_node(node_id):
+    """节点标识：p<项目主键> / a<工件主键>"""
+    node_id = str(node_id or '')
+    if node_id[:1] not in ('p', 'a') or not node_id[1:].isdigit():
+        raise ValueError(f'无效的节点标识: {node_id}')
+    return node_id[0], int(node_id[1:])
+
+
+def encode_cursor(node_id, severity, other_id):
+    return base64.urlsafe_b64encode(json.dumps([node_id, severity, other_id]).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        node_id, severity, other_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return node_id, int(severity), int(other_id)
+    except (ValueError, TypeError):
+        raise ValueError('无效的游标')
+
+
+def _root_node(node_type, pk):
+    if node_type == 'p':
+        project = Project.objects.only('id', 'name').get(pk=pk)
+        return [f'p{project.id}', 'project', project.name, None, 0, 0]
+    artifact = Artifact.objects.get(pk=pk)
+    return [f'a{artifact.id}', 'artifact', artifact_label(artifact.group, artifact.name), artifact.version, 0, 0]
+
+
+def _neighbours(node_type, pk, limit, after=None):
+    """
+    读取一页邻居：按 (严重性降序, 对端主键升序) 走 (project|artifact, worst_severity) 索引，多取一条判断是否有下一页
+    """
+    if node_type == 'a':
+        queryset, other = ProjectArtifact.objects.filter(artifact_id=pk), 'project_id'
+        fields = ('project_id', 'project__name', 'worst_severity', 'vulnerability_count')
+    else:
+        queryset, other = ProjectArtifact.objects.filter(project_id=pk), 'artifact_id'
+        fields = ('artifact_id', 'artifact__group', 'artifact__name', 'artifact__version', 'worst_severity', 'vulnerability_count')
+    if after is not None:
+        severity, other_id = after
+        queryset = queryset.filter(Q(worst_severity__lt=severity) | Q(worst_severity=severity, **{f'{other}__gt': other_id}))
+    rows = list(queryset.order_by('-worst_severity', other).values_list(*fields)[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if node_type == 'a':
+        nodes = [[f'p{row[0]}', 'project', row[1], None, row[2], row[3]] for row in rows]
+    else:
+        nodes = [[f'a{row[0]}', 'artifact', artifact_label(row[1], row[2]), row[3], row[4], row[5]] for row in rows]
+    cursor = encode_cursor(f'{node_type}{pk}', nodes[-1][4], int(nodes[-1][0][1:])) if has_more else None
+    return nodes, cursor
+
+
+class _GraphBuilder:
+    def __init__(self, root):
+        self.nodes = [root]
+        self.index = {root[0]: 0}
+        self.edges = []
+        self.edge_keys = set()
+
+    def link(self, source, node):
+        """加入节点与边，返回是否为新节点；节点严重性取所见边的最大值"""
+        position = self.index.get(node[0])
+        is_new = position is None
+        if is_new:
+            position = self.index[node[0]] = len(self.nodes)
+            self.nodes.append(node)
+        else:
+            self.nodes[position][4] = max(self.nodes[position][4], node[4])
+        origin = self.index[source]
+        self.nodes[origin][4] = max(self.nodes[origin][4], node[4])
+        # 二部图无向：回指父节点的边只记录一次
+        key = (min(origin, position), max(origin, position))
+        if key not in self.edge_keys:
+            self.edge_keys.add(key)
+            self.edges.append([origin, position])
+        return is_new
+
+    def payload(self, cursors):
+        return {'severity_levels': SEVERITY_LEVELS, 'node_fields': NODE_FIELDS, 'nodes': self.nodes,
+                'edges': self.edges, 'cursors': cursors}
+
+
+def neighbourhood(node_id, depth=1, fanout=DEFAULT_FANOUT, max_nodes=DEFAULT_NODE_LIMIT):
+    """
+    有界 k 跳邻域：每个节点只展开严重性最高的 fanout 个邻居，总节点数不超过 max_nodes
+
+    未展开完的节点在 cursors 中给出游标（null 表示因节点预算未展开），前端按需调用 expand 继续加载
+    """
+    node_type, pk = parse_node(node_id)
+    builder = _GraphBuilder(_root_node(node_type, pk))
+    cursors = {}
+    frontier = [builder.nodes[0][0]]
+    for _ in range(min(depth, MAX_DEPTH)):
+        next_frontier = []
+        for current in frontier:
+            budget = min(fanout, max_nodes - len(builder.nodes))
+            if budget <= 0:
+                cursors[current] = None
+                continue
+            current_type, current_pk = parse_node(current)
+            nodes, cursor = _neighbours(current_type, current_pk, budget)
+            for node in nodes:
+                if builder.link(current, node):
+                    next_frontier.append(node[0])
+            if cursor:
+                cursors[current] = cursor
+        frontier = next_frontier
+    return builder.payload(cursors)
+
+
+def expand(node_id, cursor=None, fanout=DEFAULT_FANOUT):
+    """继续展开单个节点的下一页邻居（一跳）"""
+    node_type, pk = parse_node(node_id)
+    after = None
+    if cursor:
+        cursor_node, severity, other_id = decode_cursor(cursor)
+        if cursor_node != node_id:
+            raise ValueError('游标与节点不匹配')
+        after = (severity, other_id)
+    builder = _GraphBuilder(_root_node(node_type, pk))
+    nodes, next_cursor = _neighbours(node_type, pk, fanout, after)
+    for node in nodes:
+        builder.link(node_id, node)
+    return builder.payload({node_id: next_cursor} if next_cursor else {})
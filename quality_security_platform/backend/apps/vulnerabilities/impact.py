@@ -0,0 +1,80 @@
+"""
+工件版本变更影响分析（AV05）：集合查询受影响的版本登记，并批量通知应用负责人
+"""
+from collections import defaultdict
+from django.core.mail import get_connection, send_mass_mail
+from apps.system.models import Notification
+from apps.users.models import User
+from apps.versions.models import VersionRegistration
+from .versioning import VersionIndex, compile_range
+
+IMPACT_FIELDS = ['registration_id', 'project_id', 'project_name', 'app_version', 'owner_id', 'artifact_version', 'worst_severity']
+
+
+def analyze_impact(release_version_id, group, name, version_range=''):
+    """
+    发布版本 X 中哪些登记应用依赖工件 G:A，分别是哪个版本
+
+    一条查询：版本登记 ⨝ 项目 ⨝ 邻接索引 ⨝ 工件，过滤走 (group, name) 索引；
+    给出 version_range 时对去重后的工件版本建一次有序索引，按区间 bisect 过滤
+    """
+    rows = (
+        VersionRegistration.objects
+        .filter(release_version_id=release_version_id,
+                project__artifact_edges__artifact__group=group,
+                project__artifact_edges__artifact__name=name)
+        .order_by('project__name', 'project__artifact_edges__artifact__version')
+        .values_list('id', 'project_id', 'project__name', 'app_version', 'project__owner_id',
+                     'project__artifact_edges__artifact__version', 'project__artifact_edges__worst_severity')
+    )
+    impacts = [dict(zip(IMPACT_FIELDS, row)) for row in rows]
+    if version_range:
+        matched = VersionIndex(impact['artifact_version'] for impact in impacts).match(compile_range(version_range))
+        impacts = [impact for impact in impacts if impact['artifact_version'] in matched]
+    return impacts
+
+
+def summarize_versions(impacts):
+    """按工件版本汇总受影响的应用数"""
+    counts = defaultdict(int)
+    for impact in impacts:
+        counts[impact['artifact_version']] += 1
+    return dict(counts)
+
+
+def notify_owners(notice, impacts, progress=None, batch_size=500):
+    """
+    按负责人去重后批量发送通知：站内信一次 bulk_create，邮件复用同一个 SMTP 连接
+
+    返回通知的负责人数
+    """
+    apps_by_owner = defaultdict(list)
+    for impact in impacts:
+        if impact['owner_id']:
+            apps_by_owner[impact['owner_id']].append(f"{impact['project_name']} {impact['app_version']}（当前 {impact['artifact_version']}）")
+    if not apps_by_owner:
+        return 0
+    coordinate = f'{notice.artifact_group}:{notice.artifact_name}' if notice.artifact_group else notice.artifact_name
+    title = f'工件版本变更: {coordinate} -> {notice.new_version}'
+    contents = {
+        owner_id: f'发布版本 {notice.release_version.version} 中您负责的以下应用依赖 {coordinate}，请升级至 {notice.new_version}：\n' + '\n'.join(apps)
+        for owner_id, apps in apps_by_owner.items()
+    }
+    owner_ids = list(contents)
+    if notice.notify_method in ('message', 'both'):
+        for start in range(0, len(owner_ids), batch_size):
+            Notification.objects.bulk_create([
+                Notification(recipient_id=owner_id, sender_id=notice.requested_by_id, title=title, content=contents[owner_id])
+                for owner_id in owner_ids[start:start + batch_size]
+            ])
+            if progress:
+                progress(min(start + batch_size, len(owner_ids)), len(owner_ids))
+    if notice.notify_method in ('email', 'both'):
+        from constance import config
+        emails = dict(User.objects.filter(id__in=owner_ids).exclude(email='').values_list('id', 'email'))
+        messages = [(title, contents[owner_id], config.SENDER_EMAIL, [email]) for owner_id, email in emails.items()]
+        if messages:
+            connection = get_connection(host=config.SMTP_SERVER, port=config.SMTP_PORT, username=config.SMTP_USERNAME,
+                                        password=config.SMTP_PASSWORD, use_tls=config.SMTP_PORT == 587)
+            send_mass_mail(messages, fail_silently=True, connection=connection)
+    return len(owner_ids)
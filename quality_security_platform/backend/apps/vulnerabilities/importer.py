@@ -0,0 +1,175 @@
+"""
+漏洞报告导入：流式解析 + 与上一次扫描差异比对，只写入新增/消除的漏洞
+
+批量导入时报告在进程池中并行解析，标准化后的数据回到主进程由同一个写入器按扫描依次落库
+"""
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from django.db import transaction
+from django.utils import timezone
+from .catalog import Catalog, finding_fingerprint
+from .graph import update_project_edges
+from .models import SEVERITY_RANK, DependencyCheckScan, ArtifactVulnerability
+from .nvd import NvdEnricher
+from .parsers import chunked, get_parser
+
+BATCH_SIZE = 1000
+logger = logging.getLogger(__name__)
+
+
+def import_report(scan, progress=None, batch_size=BATCH_SIZE):
+    """按扫描记录的报告格式流式解析并导入"""
+    with open(scan.report_file, 'rb') as fp:
+        return write_findings(scan, get_parser(scan.report_format)(fp), progress, batch_size)
+
+
+def write_findings(scan, parser, progress=None, batch_size=BATCH_SIZE, catalog=None, enricher=None):
+    """
+    将解析器产出的漏洞与该项目现有漏洞做差异比对
+
+    新指纹按批 bulk_create；重新出现与已消除的漏洞在解析完成后统一更新，未变化的漏洞不产生写入。
+    progress(bytes_read, finding_count) 在每批处理后回调（finding_count 为去重后的漏洞数），返回统计信息；
+    批量导入时传入共享的 catalog/enricher，跨报告复用工件与 CVE 的主键缓存
+    """
+    now = timezone.now()
+    previous = (DependencyCheckScan.objects.filter(project_id=scan.project_id, status='success')
+                .exclude(id=scan.id).order_by('-created_at').values_list('created_at', flat=True).first())
+    # 项目已知漏洞：指纹 -> (主键, 是否仍存在)
+    known = {
+        fingerprint: (pk, resolved_at is None)
+        for fingerprint, pk, resolved_at in ArtifactVulnerability.objects.filter(project_id=scan.project_id)
+        .values_list('fingerprint', 'id', 'resolved_at').iterator()
+    }
+    seen, reopened = set(), []
+    # 邻接索引：工件主键 -> [最高严重性等级, 漏洞数]
+    artifact_stats = {}
+    catalog = catalog or Catalog()
+    enricher = enricher or NvdEnricher()
+    try:
+        for batch in chunked(parser.iter_findings(), batch_size):
+            # 缺失的评分/描述先按批从本地 NVD 数据补全，再将工件坐标与 CVE 文本写入共享目录，扫描只保存关联行
+            enricher.enrich(batch)
+            catalog.intern(batch)
+            created = []
+            for row in batch:
+                fingerprint = finding_fingerprint(row['artifact_hash'], row['vulnerability_hash'], row['severity'])
+                if fingerprint in seen:
+                    continue
+                seen.add(fingerprint)
+                stats = artifact_stats.setdefault(row['artifact_id'], [0, 0])
+                stats[0] = max(stats[0], SEVERITY_RANK[row['severity']])
+                stats[1] += 1
+                entry = known.get(fingerprint)
+                if entry is None:
+                    created.append(ArtifactVulnerability(
+                        project_id=scan.project_id, artifact_id=row['artifact_id'], vulnerability_id=row['vulnerability_id'],
+                        severity=row['severity'], fingerprint=fingerprint, first_seen_scan_id=scan.id, first_seen_at=now,
+                    ))
+                elif not entry[1]:
+                    reopened.append(entry[0])
+            if created:
+                ArtifactVulnerability.objects.bulk_create(created, batch_size=batch_size, ignore_conflicts=True)
+            if progress:
+                progress(parser.bytes_read, len(seen))
+        removed = [pk for fingerprint, (pk, active) in known.items() if active and fingerprint not in seen]
+        for coordinates in chunked(parser.artifacts, batch_size):
+            for artifact_id in catalog.intern_artifacts(coordinates):
+                artifact_stats.setdefault(artifact_id, [0, 0])
+        with transaction.atomic():
+            for ids in chunked(reopened, batch_size):
+                ArtifactVulnerability.objects.filter(id__in=ids).update(resolved_at=None, resolved_scan=None, last_seen_at=None)
+            for ids in chunked(removed, batch_size):
+                ArtifactVulnerability.objects.filter(id__in=ids).update(resolved_at=now, resolved_scan=scan, last_seen_at=previous)
+            edges = update_project_edges(scan.project_id, {key: tuple(value) for key, value in artifact_stats.items()})
+        # 实际新增数：新指纹中由本次扫描写入的行；并发导入已先写入的指纹被 ignore_conflicts 跳过，不计入新增
+        added_count = ArtifactVulnerability.objects.filter(project_id=scan.project_id, first_seen_scan_id=scan.id).count()
+    except Exception:
+        ArtifactVulnerability.objects.filter(first_seen_scan_id=scan.id).delete()
+        raise
+    return {
+        'dependency_count': parser.dependency_count,
+        'finding_count': len(seen),
+        'added_count': added_count + len(reopened),
+        'removed_count': len(removed),
+        'unchanged_count': len(seen) - added_count - len(reopened),
+        'artifact_count': len(artifact_stats),
+        'edge_changes': edges,
+        'bytes_read': parser.bytes_read,
+    }
+
+
+class ParsedReport:
+    """在子进程中完整解析的报告，接口与流式解析器一致，可跨进程传递"""
+
+    def __init__(self, dependency_count, artifacts, findings, bytes_read, parse_seconds):
+        self.dependency_count = dependency_count
+        self.artifacts = artifacts
+        self.findings = findings
+        self.bytes_read = bytes_read
+        self.parse_seconds = parse_seconds
+
+    def iter_findings(self):
+        return iter(self.findings)
+
+
+def parse_report(path, report_format):
+    """进程池任务：只做 CPU 密集的解析，不访问数据库"""
+    begin = time.monotonic()
+    with open(path, 'rb') as fp:
+        parser = get_parser(report_format)(fp)
+        findings = list(parser.iter_findings())
+    return ParsedReport(parser.dependency_count, parser.artifacts, findings, parser.bytes_read, round(time.monotonic() - begin, 3))
+
+
+def pool_size(workers=None):
+    """Celery prefork 子进程是守护进程，不能再创建子进程，此时退化为进程内解析"""
+    if multiprocessing.current_process().daemon:
+        return 0
+    return workers or min(os.cpu_count() or 1, 8)
+
+
+def import_batch(scans, workers=None, batch_size=BATCH_SIZE):
+    """
+    批量导入：报告在进程池中并行解析，主进程按提交顺序逐个写入（先完成的解析结果等待前面的写入）
+
+    同时在途的解析结果不超过 2 倍进程数，内存占用与批次大小无关。
+    逐个产出 (scan, 统计信息, 异常)，由调用方更新扫描状态
+    """
+    catalog, enricher = Catalog(), NvdEnricher()
+
+    def write(scan, parsed):
+        begin = time.monotonic()
+        stats = write_findings(scan, parsed, batch_size=batch_size, catalog=catalog, enricher=enricher)
+        stats['parse_seconds'] = parsed.parse_seconds
+        stats['write_seconds'] = round(time.monotonic() - begin, 3)
+        return stats
+
+    workers = pool_size(workers)
+    if not workers:
+        for scan in scans:
+            try:
+                yield scan, write(scan, parse_report(scan.report_file, scan.report_format)), None
+            except Exception as e:
+                logger.exception('报告导入失败: scan=%s', scan.id)
+                yield scan, None, e
+        return
+    # 按提交顺序写入：同一项目的多次扫描在批次中先后出现时，先提交的先写入，后写入的结果决定漏洞的最终状态
+    pending, queue = deque(), iter(scans)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            for scan in queue:
+                pending.append((executor.submit(parse_report, scan.report_file, scan.report_format), scan))
+                if len(pending) >= workers * 2:
+                    break
+            if not pending:
+                return
+            future, scan = pending.popleft()
+            try:
+                yield scan, write(scan, future.result()), None
+            except Exception as e:
+                logger.exception('报告导入失败: scan=%s', scan.id)
+                yield scan, None, e
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from apps.vulnerabilities.search import build_index
+
+
+class Command(BaseCommand):
+    help = '创建漏洞搜索索引（PostgreSQL pg_trgm GIN 索引 / SQLite FTS5 trigram 表），可重复执行'
+
+    def handle(self, *args, **options):
+        count = build_index()
+        if not count:
+            self.stdout.write(self.style.WARNING(f'{connection.vendor} 不支持专用搜索索引，搜索将使用 icontains'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'{connection.vendor} 搜索索引已就绪（{count} 条语句）'))
@@ -0,0 +1,60 @@
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from apps.vulnerabilities.models import NvdFeed
+from apps.vulnerabilities.nvd import BATCH_SIZE, enrich_catalog, file_digest, load_feed, open_feed
+
+FEED_SUFFIXES = ('.json', '.json.gz')
+
+
+class Command(BaseCommand):
+    help = '从本地磁盘流式导入 NVD JSON feed（1.1/2.0 版，支持 .gz），并用其补全漏洞目录'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='feed 文件或包含 feed 文件的目录')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--force', action='store_true', help='忽略内容摘要，重新导入未变化的文件')
+        parser.add_argument('--skip-enrich', action='store_true', help='导入后不回填漏洞目录')
+
+    def handle(self, *args, **options):
+        files = self.collect(options['paths'])
+        if not files:
+            raise CommandError('未找到 NVD feed 文件（*.json / *.json.gz）')
+        for path in files:
+            self.load(path, options['batch_size'], options['force'])
+        if not options['skip_enrich']:
+            self.stdout.write(f'漏洞目录补全 {enrich_catalog(options["batch_size"])} 条')
+
+    @staticmethod
+    def collect(paths):
+        """年度 feed 在前，modified/recent 增量 feed 在后"""
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                files += [os.path.join(path, name) for name in os.listdir(path) if name.endswith(FEED_SUFFIXES)]
+            elif os.path.isfile(path):
+                files.append(path)
+            else:
+                raise CommandError(f'路径不存在: {path}')
+        return sorted(files, key=lambda path: (any(tag in os.path.basename(path) for tag in ('modified', 'recent')), path))
+
+    def load(self, path, batch_size, force):
+        name = os.path.basename(path)
+        digest = file_digest(path)
+        feed = NvdFeed.objects.filter(name=name).first()
+        if feed and feed.sha256 == digest and not force:
+            self.stdout.write(f'{name}: 未变化，跳过')
+            return
+        begin = time.monotonic()
+
+        def report(bytes_read, count):
+            self.stdout.write(f'\r{name}: {count} 条，已读取 {bytes_read / 1048576:.1f} MB', ending='')
+            self.stdout.flush()
+
+        with open_feed(path) as fp:
+            total, created, updated = load_feed(fp, batch_size, progress=report if self.stdout.isatty() else None)
+        duration = round(time.monotonic() - begin, 3)
+        NvdFeed.objects.update_or_create(name=name, defaults={
+            'sha256': digest, 'cve_count': total, 'created_count': created, 'updated_count': updated, 'duration': duration,
+        })
+        self.stdout.write(self.style.SUCCESS(f'\r{name}: {total} 条（新增 {created}，更新 {updated}），耗时 {duration}s'))
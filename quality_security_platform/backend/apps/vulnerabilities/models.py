@@ -0,0 +1,123 @@
+from django.db import models
+from apps.projects.models import Project
+from apps.users.models import User
+from apps.versions.models import ReleaseVersion
+SEVERITY_CHOICES = (('none','无'),('low','低'),('medium','中'),('high','高'),('critical','严重'))
+SEVERITY_RANK = {value: rank for rank, (value, _) in enumerate(SEVERITY_CHOICES)}
+REPORT_FORMAT_CHOICES = (('dependency-check','Dependency-Check'),('cyclonedx','CycloneDX'),('spdx','SPDX'))
+class Artifact(models.Model):
+    hash = models.CharField('内容哈希', max_length=40, unique=True)
+    group = models.CharField('工件组织名', max_length=255, blank=True)
+    name = models.CharField('工件名', max_length=255)
+    version = models.CharField('工件版本', max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        db_table = 'vuln_artifacts'
+        indexes = [models.Index(fields=['group', 'name'])]
+    def __str__(self):
+        return f'{self.group}:{self.name}:{self.version}' if self.group else f'{self.name}:{self.version}'
+class Vulnerability(models.Model):
+    hash = models.CharField('内容哈希', max_length=40, unique=True)
+    cve_id = models.CharField('漏洞编号', max_length=100, unique=True)
+    severity = models.CharField(max_length=20, choices=SEVERITY_CHOICES, default='none')
+    cvss_score = models.FloatField(null=True, blank=True)
+    cvss_vector = models.CharField('CVSS 向量', max_length=200, blank=True)
+    description = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    class Meta: db_table = 'vuln_vulnerabilities'
+    def __str__(self):
+        return self.cve_id
+class NvdCve(models.Model):
+    """NVD 离线数据（本地镜像），由 load_nvd_feed 命令导入，用于补全扫描结果中缺失的评分与描述"""
+    cve_id = models.CharField('漏洞编号', max_length=100, unique=True)
+    severity = models.CharField(max_length=20, choices=SEVERITY_CHOICES, default='none')
+    cvss_score = models.FloatField(null=True, blank=True)
+    cvss_vector = models.CharField('CVSS 向量', max_length=200, blank=True)
+    description = models.TextField(blank=True)
+    published_at = models.DateTimeField('发布时间', null=True, blank=True)
+    last_modified_at = models.DateTimeField('最后修改', null=True, blank=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    class Meta: db_table = 'vuln_nvd_cves'
+    def __str__(self):
+        return self.cve_id
+class NvdFeed(models.Model):
+    """已导入的 NVD feed 文件，内容摘要未变化时跳过"""
+    name = models.CharField('文件名', max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64)
+    cve_count = models.IntegerField('CVE 数', default=0)
+    created_count = models.IntegerField('新增', default=0)
+    updated_count = models.IntegerField('更新', default=0)
+    duration = models.FloatField('耗时(秒)', null=True, blank=True)
+    loaded_at = models.DateTimeField(auto_now=True)
+    class Meta: db_table = 'vuln_nvd_feeds'; ordering = ['name']
+class DependencyCheckScan(models.Model):
+    STATUS_CHOICES = (('pending','等待中'),('running','解析中'),('success','成功'),('failed','失败'))
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='dependency_scans')
+    report_file = models.CharField('报告文件', max_length=500)
+    report_format = models.CharField('报告格式', max_length=20, choices=REPORT_FORMAT_CHOICES, default='dependency-check')
+    batch_id = models.CharField('批次号', max_length=32, blank=True, db_index=True)
+    file_size = models.BigIntegerField('文件大小(字节)', default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    dependency_count = models.IntegerField('依赖数', default=0)
+    finding_count = models.IntegerField('漏洞数', default=0)
+    added_count = models.IntegerField('新增漏洞', default=0)
+    removed_count = models.IntegerField('消除漏洞', default=0)
+    unchanged_count = models.IntegerField('未变漏洞', default=0)
+    uploaded_by = models.ForeignKey(User, null=True, on_delete=models.SET_NULL)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration = models.FloatField('耗时(秒)', null=True, blank=True)
+    error_message = models.TextField(blank=True)
+    task_id = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    class Meta: db_table = 'vuln_dependency_scans'; ordering = ['-created_at']
+class ArtifactVulnerability(models.Model):
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='artifact_vulnerabilities')
+    artifact = models.ForeignKey(Artifact, on_delete=models.CASCADE, related_name='findings')
+    vulnerability = models.ForeignKey(Vulnerability, on_delete=models.CASCADE, related_name='findings')
+    severity = models.CharField(max_length=20, choices=SEVERITY_CHOICES, default='none')
+    fingerprint = models.CharField('指纹', max_length=40)
+    first_seen_scan = models.ForeignKey(DependencyCheckScan, null=True, on_delete=models.SET_NULL, related_name='new_findings')
+    first_seen_at = models.DateTimeField('首次发现')
+    # 仍存在的漏洞 last_seen_at 为空，表示在该项目最近一次扫描中仍被发现
+    last_seen_at = models.DateTimeField('最后发现', null=True, blank=True)
+    resolved_scan = models.ForeignKey(DependencyCheckScan, null=True, blank=True, on_delete=models.SET_NULL, related_name='resolved_findings')
+    resolved_at = models.DateTimeField('消除时间', null=True, blank=True)
+    class Meta:
+        db_table = 'vuln_artifact_vulnerabilities'
+        unique_together = ('project', 'fingerprint')
+        indexes = [models.Index(fields=['project', 'severity']), models.Index(fields=['project', 'resolved_at'])]
+    @property
+    def is_active(self):
+        return self.resolved_at is None
+class ProjectArtifact(models.Model):
+    """项目-工件邻接索引（读模型），由导入任务维护，供关系图谱直接读取"""
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='artifact_edges')
+    artifact = models.ForeignKey(Artifact, on_delete=models.CASCADE, related_name='project_edges')
+    worst_severity = models.SmallIntegerField('最高严重性', default=0)
+    vulnerability_count = models.IntegerField('漏洞数', default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    class Meta:
+        db_table = 'vuln_project_artifacts'
+        unique_together = ('project', 'artifact')
+        indexes = [models.Index(fields=['project', 'worst_severity']), models.Index(fields=['artifact', 'worst_severity'])]
+class ArtifactChangeNotice(models.Model):
+    """工件版本变更通知（AV05）：分析发布版本中受影响的应用并通知负责人"""
+    NOTIFY_CHOICES = (('message','站内信'),('email','邮件'),('both','站内信+邮件'))
+    STATUS_CHOICES = (('pending','等待中'),('running','分析中'),('success','完成'),('failed','失败'))
+    release_version = models.ForeignKey(ReleaseVersion, on_delete=models.CASCADE, related_name='artifact_notices')
+    artifact_group = models.CharField('工件组织名', max_length=255, blank=True)
+    artifact_name = models.CharField('工件名', max_length=255)
+    new_version = models.CharField('新版本号', max_length=100)
+    version_range = models.CharField('受影响版本范围', max_length=255, blank=True, help_text='如 [1.2,2.0)、^1.4.0，留空表示全部版本')
+    notify_method = models.CharField('通知方式', max_length=20, choices=NOTIFY_CHOICES, default='message')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    affected_count = models.IntegerField('受影响应用数', default=0)
+    notified_count = models.IntegerField('通知人数', default=0)
+    result = models.JSONField('分析结果', default=list, blank=True)
+    error_message = models.TextField(blank=True)
+    task_id = models.CharField(max_length=100, blank=True)
+    requested_by = models.ForeignKey(User, null=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    class Meta: db_table = 'vuln_artifact_change_notices'; ordering = ['-created_at']
@@ -0,0 +1,143 @@
+"""
+NVD 离线数据：流式导入本地 feed 文件到 NvdCve，并按批补全扫描结果/漏洞目录中缺失的评分与描述
+"""
+import gzip
+import hashlib
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import NvdCve, Vulnerability
+from .parsers import NvdFeedParser, chunked
+
+BATCH_SIZE = 1000
+ENRICH_FIELDS = ('severity', 'cvss_score', 'cvss_vector', 'description')
+
+
+def open_feed(path):
+    return gzip.open(path, 'rb') if str(path).endswith('.gz') else open(path, 'rb')
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fp:
+        for block in iter(lambda: fp.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def to_datetime(value, local_tz=None):
+    """
+    NVD 时间戳（1.1 版带 Z，2.0 版不带时区，均为 UTC）转为与 USE_TZ 一致的时间
+
+    local_tz 为 USE_TZ=False 时的本地时区，由调用方取一次后传入，避免逐行查询当前时区
+    """
+    parsed = parse_datetime(value) if value else None
+    if parsed is None:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(local_tz).replace(tzinfo=None) if local_tz else parsed
+
+
+def load_feed(fp, batch_size=BATCH_SIZE, progress=None):
+    """
+    将一个 feed 文件 upsert 到 NvdCve：每批一次查询取已有记录的最后修改时间，
+    新 CVE bulk_create，仅当 feed 中的 lastModified 更新时才 bulk_update；modified feed 可重复导入
+
+    progress(bytes_read, cve_count) 在每批处理后回调，返回 (CVE 数, 新增, 更新)
+    """
+    parser = NvdFeedParser(fp)
+    local_tz = None if settings.USE_TZ else timezone.get_default_timezone()
+    total = created_count = updated_count = 0
+    for batch in chunked(parser.iter_records(), batch_size):
+        records = {}
+        for record in batch:
+            record['published_at'] = to_datetime(record['published_at'], local_tz)
+            record['last_modified_at'] = to_datetime(record['last_modified_at'], local_tz)
+            records[record['cve_id']] = record
+        existing = {
+            cve_id: (pk, last_modified)
+            for cve_id, pk, last_modified in NvdCve.objects.filter(cve_id__in=list(records))
+            .values_list('cve_id', 'id', 'last_modified_at')
+        }
+        created, changed = [], []
+        for cve_id, record in records.items():
+            entry = existing.get(cve_id)
+            if entry is None:
+                created.append(NvdCve(**record))
+            elif entry[1] is None or (record['last_modified_at'] and record['last_modified_at'] > entry[1]):
+                changed.append(NvdCve(id=entry[0], **record))
+        if created:
+            NvdCve.objects.bulk_create(created, batch_size=batch_size, ignore_conflicts=True)
+        if changed:
+            NvdCve.objects.bulk_update(changed, [*ENRICH_FIELDS, 'published_at', 'last_modified_at'], batch_size=batch_size)
+        total += len(records)
+        created_count += len(created)
+        updated_count += len(changed)
+        if progress:
+            progress(parser.bytes_read, total)
+    return total, created_count, updated_count
+
+
+def lookup(cve_ids):
+    """批量查询 NVD 数据：CVE 编号 -> {severity, cvss_score, cvss_vector, description}"""
+    return {
+        row['cve_id']: row
+        for row in NvdCve.objects.filter(cve_id__in=list(cve_ids)).values('cve_id', *ENRICH_FIELDS)
+    }
+
+
+def merge(target, record):
+    """只补全缺失字段，扫描报告自带的数据优先；返回是否有字段被补全"""
+    changed = False
+    if record['cvss_score'] is not None and target.get('cvss_score') is None:
+        target['cvss_score'] = record['cvss_score']
+        changed = True
+    if record['severity'] != 'none' and target.get('severity', 'none') == 'none':
+        target['severity'] = record['severity']
+        changed = True
+    for field in ('cvss_vector', 'description'):
+        if record[field] and not target.get(field):
+            target[field] = record[field]
+            changed = True
+    return changed
+
+
+class NvdEnricher:
+    """
+    导入时的批量补全：每批对缺失数据的 CVE 做一次 IN 查询，结果（含未命中）在单次导入内缓存
+    """
+
+    def __init__(self):
+        self.cache = {}
+
+    def enrich(self, batch):
+        pending = {
+            row['cve_id'].upper() for row in batch
+            if row['cve_id'].upper() not in self.cache
+            and (row['cvss_score'] is None or row['severity'] == 'none' or not row['description'] or not row['cvss_vector'])
+        }
+        if pending:
+            found = lookup(pending)
+            for cve_id in pending:
+                self.cache[cve_id] = found.get(cve_id)
+        for row in batch:
+            record = self.cache.get(row['cve_id'].upper())
+            if record:
+                merge(row, record)
+        return batch
+
+
+def enrich_catalog(batch_size=BATCH_SIZE):
+    """用 NVD 数据回填漏洞目录中评分或描述缺失的记录，返回更新的行数"""
+    queryset = (Vulnerability.objects.filter(cvss_score__isnull=True) | Vulnerability.objects.filter(description='')
+                | Vulnerability.objects.filter(cvss_vector='') | Vulnerability.objects.filter(severity='none'))
+    updated = 0
+    rows = queryset.order_by('id').values('id', 'cve_id', *ENRICH_FIELDS).iterator(chunk_size=batch_size)
+    for batch in chunked(rows, batch_size):
+        found = lookup(row['cve_id'].upper() for row in batch)
+        changed = [Vulnerability(**row) for row in batch if row['cve_id'].upper() in found and merge(row, found[row['cve_id'].upper()])]
+        if changed:
+            Vulnerability.objects.bulk_update(changed, ENRICH_FIELDS, batch_size=batch_size)
+            updated += len(changed)
+    return updated
@@ -0,0 +1,413 @@
+"""
+漏洞报告流式解析：逐个解码 JSON 数组元素，内存占用与报告大小无关
+"""
+import codecs
+import json
+import re
+from itertools import islice
+from urllib.parse import unquote
+
+CHUNK_SIZE = 64 * 1024
+_DECODER = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+_NUMBER_CHARS_RE = re.compile(r'[0-9.eE+\-]*')
+_FILE_NAME_RE = re.compile(r'^(?P<name>.+?)-(?P<version>\d[\w.\-+]*?)\.(?:jar|war|ear|aar|zip|tgz|tar\.gz|whl|egg|dll|exe|so)$')
+_SEVERITY_ALIASES = {'critical': 'critical', 'high': 'high', 'medium': 'medium', 'moderate': 'medium', 'low': 'low'}
+_CVE_RE = re.compile(r'(?:CVE|GHSA)-[\w-]+', re.I)
+# CycloneDX 评分方法优先级，越靠前越优先
+_RATING_METHODS = ('CVSSv4', 'CVSSv31', 'CVSSv3', 'CVSSv2', 'OWASP', 'SSVC', 'other')
+
+
+def chunked(iterable, size):
+    """按固定大小切分可迭代对象，每次只物化一批"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class JSONStream:
+    """
+    增量 JSON 读取器：按块读取文件，用 raw_decode 解码单个值后丢弃已消费的缓冲区
+    """
+
+    def __init__(self, fp, chunk_size=CHUNK_SIZE):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.bytes_read = 0
+
+    def _fill(self, size=None):
+        if self.eof:
+            return False
+        data = self.fp.read(size or self.chunk_size)
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.bytes_read += len(data)
+        text = self.decoder.decode(data, final=not data)
+        self.buf = self.buf[self.pos:] + text
+        self.pos = 0
+        if not data:
+            self.eof = True
+            return False
+        return True
+
+    def peek(self):
+        """跳过空白，返回下一个字符（文件结束返回空串）"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f'JSON 格式错误：期望 {char!r}，实际 {found!r}（偏移 {self.bytes_read}）')
+        self.pos += 1
+
+    def value(self):
+        """解码下一个完整的 JSON 值；缓冲区不足时成倍追加读取"""
+        self.peek()
+        grow = self.chunk_size
+        while True:
+            try:
+                obj, end = _DECODER.raw_decode(self.buf, self.pos)
+                # 数字可能被块边界截断，必须看到数字之后的分隔符或文件结束
+                if self.eof or not isinstance(obj, (int, float)) or _NUMBER_CHARS_RE.match(self.buf, end).end() < len(self.buf):
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill(grow)
+            grow *= 2
+
+    def iter_items(self, *keys):
+        """遍历顶层对象中 keys 对应数组的元素，产出 (key, 元素)；其它顶层字段解码后丢弃"""
+        self.expect('{')
+        if self.peek() == '}':
+            return
+        while True:
+            name = self.value()
+            self.expect(':')
+            if name in keys and self.peek() == '[':
+                self.pos += 1
+                if self.peek() == ']':
+                    self.pos += 1
+                else:
+                    while True:
+                        yield name, self.value()
+                        if self.peek() == ']':
+                            self.pos += 1
+                            break
+                        self.expect(',')
+            else:
+                self.value()
+            if self.peek() == '}':
+                return
+            self.expect(',')
+
+    def iter_array(self, *keys):
+        for _, item in self.iter_items(*keys):
+            yield item
+
+
+def parse_purl(purl):
+    """解析 Package URL（pkg:type/namespace/name@version）为 (组织名, 工件名, 版本)"""
+    body = purl[4:] if purl.startswith('pkg:') else purl
+    body = body.split('#', 1)[0].split('?', 1)[0]
+    _, _, path = body.partition('/')
+    version = ''
+    if '@' in path:
+        path, _, version = path.rpartition('@')
+    namespace, _, name = path.rpartition('/')
+    return unquote(namespace).replace('/', '.'), unquote(name), unquote(version)
+
+
+def normalize_severity(severity, score=None):
+    severity = _SEVERITY_ALIASES.get(str(severity or '').strip().lower())
+    if severity:
+        return severity
+    if score is None:
+        return 'none'
+    if score >= 9.0:
+        return 'critical'
+    if score >= 7.0:
+        return 'high'
+    if score >= 4.0:
+        return 'medium'
+    return 'low' if score > 0 else 'none'
+
+
+def _float(value):
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class ReportParser:
+    """
+    扫描报告解析器接口：iter_findings() 逐个产出标准化漏洞行，解析过程中累积依赖数与全部工件坐标
+
+    标准化行字段：group, name, version, cve_id, severity, cvss_score, cvss_vector, description
+    """
+    format = None
+
+    def __init__(self, fp, chunk_size=CHUNK_SIZE):
+        self.stream = JSONStream(fp, chunk_size)
+        self.dependency_count = 0
+        # 报告中出现的全部工件坐标（含无漏洞工件），规模为去重后的依赖数
+        self.artifacts = set()
+
+    @property
+    def bytes_read(self):
+        return self.stream.bytes_read
+
+    def iter_findings(self):
+        raise NotImplementedError
+
+    def add_artifact(self, group, name, version):
+        coordinates = (group or '')[:255], (name or '')[:255], (version or '')[:100]
+        if coordinates[1]:
+            self.artifacts.add(coordinates)
+        return coordinates
+
+    @staticmethod
+    def finding(coordinates, cve_id, severity, score, vector, description):
+        group, name, version = coordinates
+        return {
+            'group': group,
+            'name': name,
+            'version': version,
+            'cve_id': cve_id[:100],
+            'severity': normalize_severity(severity, score),
+            'cvss_score': score,
+            'cvss_vector': (vector or '')[:200],
+            'description': description or '',
+        }
+
+
+class DependencyCheckParser(ReportParser):
+    """
+    OWASP Dependency-Check JSON 报告解析器
+    """
+    format = 'dependency-check'
+
+    def iter_dependencies(self):
+        for dependency in self.stream.iter_array('dependencies'):
+            self.dependency_count += 1
+            yield dependency
+
+    def iter_findings(self):
+        """展开 dependencies[].vulnerabilities[]，每个漏洞产出一行标准化数据"""
+        for dependency in self.iter_dependencies():
+            coordinates = self.add_artifact(*self.artifact_coordinates(dependency))
+            for vuln in dependency.get('vulnerabilities') or []:
+                cve_id = (vuln.get('name') or '').strip()
+                if not cve_id:
+                    continue
+                vector = (vuln.get('cvssv3') or {}).get('vectorString') or (vuln.get('cvssv2') or {}).get('vectorString')
+                yield self.finding(coordinates, cve_id, vuln.get('severity'), self.cvss_score(vuln), vector, vuln.get('description'))
+
+    @staticmethod
+    def artifact_coordinates(dependency):
+        for package in dependency.get('packages') or []:
+            purl = package.get('id') or ''
+            if purl.startswith('pkg:'):
+                return parse_purl(purl)
+        file_name = dependency.get('fileName') or ''
+        match = _FILE_NAME_RE.match(file_name)
+        if match:
+            return '', match.group('name'), match.group('version')
+        return '', file_name, ''
+
+    @staticmethod
+    def cvss_score(vuln):
+        for key, field in (('cvssv3', 'baseScore'), ('cvssv2', 'score')):
+            value = _float((vuln.get(key) or {}).get(field))
+            if value is not None:
+                return value
+        return None
+
+
+class CycloneDXParser(ReportParser):
+    """
+    CycloneDX JSON SBOM 解析器：components（含嵌套）为工件，vulnerabilities[].affects[].ref 指向组件的 bom-ref
+
+    漏洞通常位于组件之后；若先出现则暂存，待组件读完后再展开
+    """
+    format = 'cyclonedx'
+
+    def __init__(self, fp, chunk_size=CHUNK_SIZE):
+        super().__init__(fp, chunk_size)
+        self.refs = {}
+
+    def iter_findings(self):
+        pending = []
+        for key, item in self.stream.iter_items('components', 'vulnerabilities'):
+            if key == 'components':
+                self.add_component(item)
+            elif self.dependency_count:
+                yield from self.expand(item)
+            else:
+                pending.append(item)
+        for item in pending:
+            yield from self.expand(item)
+
+    def add_component(self, component):
+        self.dependency_count += 1
+        purl = component.get('purl') or ''
+        coordinates = parse_purl(purl) if purl.startswith('pkg:') else (component.get('group'), component.get('name'), component.get('version'))
+        coordinates = self.add_artifact(*coordinates)
+        self.refs[component.get('bom-ref') or purl] = coordinates
+        for child in component.get('components') or []:
+            self.add_component(child)
+
+    def expand(self, vuln):
+        cve_id = (vuln.get('id') or '').strip()
+        if not cve_id:
+            return
+        rating = self.best_rating(vuln.get('ratings') or [])
+        description = vuln.get('description') or vuln.get('detail')
+        for affect in vuln.get('affects') or []:
+            ref = affect.get('ref') or ''
+            coordinates = self.refs.get(ref)
+            if coordinates is None and ref.startswith('pkg:'):
+                coordinates = self.refs[ref] = self.add_artifact(*parse_purl(ref))
+            if coordinates and coordinates[1]:
+                yield self.finding(coordinates, cve_id, rating.get('severity'), _float(rating.get('score')), rating.get('vector'), description)
+
+    @staticmethod
+    def best_rating(ratings):
+        scored = [rating for rating in ratings if rating.get('score') is not None] or ratings
+        if not scored:
+            return {}
+        rank = {method: index for index, method in enumerate(_RATING_METHODS)}
+        return min(scored, key=lambda rating: rank.get(rating.get('method'), len(rank)))
+
+
+class SpdxParser(ReportParser):
+    """
+    SPDX JSON（2.2/2.3）解析器：packages 为工件，漏洞取自 SECURITY 类外部引用中的 CVE/GHSA 编号
+
+    SPDX 不携带评分，严重性与描述由本地 NVD 数据补全
+    """
+    format = 'spdx'
+
+    def iter_findings(self):
+        for package in self.stream.iter_array('packages'):
+            self.dependency_count += 1
+            refs = package.get('externalRefs') or []
+            purl = next((ref.get('referenceLocator') for ref in refs
+                         if ref.get('referenceType') == 'purl' and (ref.get('referenceLocator') or '').startswith('pkg:')), None)
+            coordinates = self.add_artifact(*(parse_purl(purl) if purl else ('', package.get('name'), package.get('versionInfo'))))
+            if not coordinates[1]:
+                continue
+            cve_ids = {
+                match.upper() for ref in refs if (ref.get('referenceCategory') or '').upper() == 'SECURITY'
+                for match in _CVE_RE.findall(ref.get('referenceLocator') or '')
+            }
+            for cve_id in sorted(cve_ids):
+                yield self.finding(coordinates, cve_id, None, None, None, None)
+
+
+REPORT_PARSERS = {parser.format: parser for parser in (DependencyCheckParser, CycloneDXParser, SpdxParser)}
+
+
+def get_parser(report_format):
+    try:
+        return REPORT_PARSERS[report_format]
+    except KeyError:
+        raise ValueError(f'不支持的报告格式: {report_format}')
+
+
+def detect_format(path, size=CHUNK_SIZE):
+    """根据文件开头的特征字段识别报告格式，无法识别时按 Dependency-Check 处理"""
+    with open(path, 'rb') as fp:
+        head = fp.read(size)
+    if b'"bomFormat"' in head and b'CycloneDX' in head:
+        return 'cyclonedx'
+    if b'"spdxVersion"' in head:
+        return 'spdx'
+    return 'dependency-check'
+
+
+class NvdFeedParser:
+    """
+    NVD 离线数据源解析器，兼容 1.1 版（CVE_Items）与 2.0 版（vulnerabilities）JSON feed
+    """
+
+    def __init__(self, fp, chunk_size=CHUNK_SIZE):
+        self.stream = JSONStream(fp, chunk_size)
+
+    @property
+    def bytes_read(self):
+        return self.stream.bytes_read
+
+    def iter_records(self):
+        """每个 CVE 产出一行标准化数据，时间字段保留原始字符串"""
+        for item in self.stream.iter_array('CVE_Items', 'vulnerabilities'):
+            cve = item.get('cve') or {}
+            record = self.parse_item(cve, item) if 'CVE_data_meta' in cve else self.parse_cve(cve)
+            if record['cve_id']:
+                yield record
+
+    @staticmethod
+    def parse_item(cve, item):
+        """1.1 版：cve.CVE_data_meta.ID，评分在 impact.baseMetricV3/V2"""
+        impact = item.get('impact') or {}
+        score, vector, severity = None, '', ''
+        if impact.get('baseMetricV3'):
+            metric = impact['baseMetricV3'].get('cvssV3') or {}
+            score, vector, severity = metric.get('baseScore'), metric.get('vectorString'), metric.get('baseSeverity')
+        elif impact.get('baseMetricV2'):
+            metric = impact['baseMetricV2']
+            data = metric.get('cvssV2') or {}
+            score, vector, severity = data.get('baseScore'), data.get('vectorString'), metric.get('severity')
+        descriptions = (cve.get('description') or {}).get('description_data') or []
+        return NvdFeedParser._record(
+            (cve.get('CVE_data_meta') or {}).get('ID'), score, vector, severity,
+            NvdFeedParser._english(descriptions), item.get('publishedDate'), item.get('lastModifiedDate'))
+
+    @staticmethod
+    def parse_cve(cve):
+        """2.0 版：cve.id，评分在 metrics.cvssMetricV31/V30/V2 的主评分（Primary）"""
+        metrics = cve.get('metrics') or {}
+        score, vector, severity = None, '', ''
+        for key in ('cvssMetricV40', 'cvssMetricV31', 'cvssMetricV30', 'cvssMetricV2'):
+            entries = metrics.get(key) or []
+            if entries:
+                metric = next((entry for entry in entries if entry.get('type') == 'Primary'), entries[0])
+                data = metric.get('cvssData') or {}
+                score, vector = data.get('baseScore'), data.get('vectorString')
+                severity = data.get('baseSeverity') or metric.get('baseSeverity')
+                break
+        return NvdFeedParser._record(cve.get('id'), score, vector, severity, NvdFeedParser._english(cve.get('descriptions') or []),
+                                     cve.get('published'), cve.get('lastModified'))
+
+    @staticmethod
+    def _english(descriptions):
+        return next((entry.get('value') for entry in descriptions if entry.get('lang') == 'en'),
+                    descriptions[0].get('value') if descriptions else '') or ''
+
+    @staticmethod
+    def _record(cve_id, score, vector, severity, description, published, last_modified):
+        score = _float(score)
+        return {
+            'cve_id': str(cve_id or '').strip().upper()[:100],
+            'severity': normalize_severity(severity, score),
+            'cvss_score': score,
+            'cvss_vector': (vector or '')[:200],
+            'description': description,
+            'published_at': published,
+            'last_modified_at': last_modified,
+        }
@@ -0,0 +1,184 @@
+"""
+漏洞搜索（AV02）：先在工件/项目目录上做索引匹配，再按主键游标分页读取漏洞，不做 COUNT
+
+匹配的目录行较少时以 IN 列表走漏洞表的外键索引；匹配过宽（如 "lib"）时大部分漏洞都命中，
+改为按主键降序分块扫描并在内存中判断归属，扫描预算用尽时返回不足一页的结果和续扫游标
+
+PostgreSQL 使用 pg_trgm 的 GIN 表达式索引（与 icontains 生成的 UPPER(col) LIKE 一致），
+SQLite 使用 FTS5 trigram 外部内容表，其它数据库退化为 icontains。索引由 build_search_index 命令创建
+"""
+import base64
+import json
+import re
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from apps.projects.models import Project
+from .models import Artifact, ArtifactVulnerability, Vulnerability
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# trigram 索引只对长度 >= 3 的片段有效
+MIN_TOKEN_LENGTH = 3
+SELECTIVE_LIMIT = 5000
+SCAN_CHUNK = 5000
+SCAN_BUDGET = 200000
+_CVE_RE = re.compile(r'^(CVE|GHSA)-[\w-]+$', re.I)
+
+# PostgreSQL：pg_trgm GIN 索引，表达式与 Django icontains 的 UPPER("col"::text) 一致
+POSTGRES_INDEXES = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS vuln_artifacts_group_trgm ON vuln_artifacts USING gin (UPPER("group") gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS vuln_artifacts_name_trgm ON vuln_artifacts USING gin (UPPER(name) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS vuln_artifacts_version_trgm ON vuln_artifacts USING gin (UPPER(version) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS projects_name_trgm ON projects USING gin (UPPER(name) gin_trgm_ops)',
+]
+# SQLite：FTS5 trigram 外部内容表 + 触发器，目录写入（含 bulk_create）时由数据库同步
+SQLITE_FTS_TABLES = {
+    'vuln_artifact_fts': ('vuln_artifacts', ['"group"', 'name', 'version']),
+    'project_fts': ('projects', ['name']),
+}
+
+
+def _sqlite_statements():
+    statements = []
+    for fts_table, (table, columns) in SQLITE_FTS_TABLES.items():
+        column_list = ', '.join(columns)
+        new_values = ', '.join(f'new.{column}' for column in columns)
+        old_values = ', '.join(f'old.{column}' for column in columns)
+        statements += [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5({column_list}, content='{table}', content_rowid='id', tokenize='trigram')",
+            f'CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {table} BEGIN '
+            f'INSERT INTO {fts_table}(rowid, {column_list}) VALUES (new.id, {new_values}); END',
+            f'CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {table} BEGIN '
+            f"INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); END",
+            f'CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE ON {table} BEGIN '
+            f"INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); "
+            f'INSERT INTO {fts_table}(rowid, {column_list}) VALUES (new.id, {new_values}); END',
+            f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')",
+        ]
+    return statements
+
+
+def build_index():
+    """创建（或重建）当前数据库的搜索索引，返回执行的语句数"""
+    if connection.vendor == 'postgresql':
+        statements = POSTGRES_INDEXES
+    elif connection.vendor == 'sqlite':
+        statements = _sqlite_statements()
+    else:
+        return 0
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+    return len(statements)
+
+
+def _sqlite_fts_ready():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name IN (%s, %s)", list(SQLITE_FTS_TABLES))
+        return cursor.fetchone()[0] == len(SQLITE_FTS_TABLES)
+
+
+def tokenize(text):
+    return [token for token in re.split(r'[\s:@/]+', (text or '').strip()) if token]
+
+
+def _fts_phrase(token):
+    return '"' + token.replace('"', '""') + '"'
+
+
+def _match(model, fts_table, fields, tokens):
+    """
+    返回匹配全部片段的目录主键子查询
+
+    SQLite 上长度足够的片段走 FTS5 MATCH，过短的片段与其它数据库一样按 icontains 过滤
+    """
+    queryset = model.objects.all()
+    long_tokens = [token for token in tokens if len(token) >= MIN_TOKEN_LENGTH]
+    if connection.vendor == 'sqlite' and long_tokens and _sqlite_fts_ready():
+        expression = ' AND '.join(_fts_phrase(token) for token in long_tokens)
+        queryset = queryset.filter(id__in=RawSQL(f'SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH %s', [expression]))
+        tokens = [token for token in tokens if len(token) < MIN_TOKEN_LENGTH]
+    for token in tokens:
+        condition = Q()
+        for field in fields:
+            condition |= Q(**{f'{field}__icontains': token})
+        queryset = queryset.filter(condition)
+    return queryset.values('id')
+
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(json.dumps([last_id]).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        (last_id,) = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return int(last_id)
+    except (ValueError, TypeError):
+        raise ValueError('无效的游标')
+
+
+def _scan(queryset, artifact_ids, project_ids, limit):
+    """宽匹配：按主键降序分块扫描，返回 (命中的主键, 是否扫描完毕, 最后扫描到的主键)"""
+    matched, scanned, last_id = [], 0, None
+    while scanned < SCAN_BUDGET:
+        chunk = queryset if last_id is None else queryset.filter(id__lt=last_id)
+        rows = list(chunk.order_by('-id').values_list('id', 'artifact_id', 'project_id')[:SCAN_CHUNK])
+        for pk, artifact_id, project_id in rows:
+            last_id = pk
+            if artifact_id in artifact_ids or project_id in project_ids:
+                matched.append(pk)
+                if len(matched) > limit:
+                    return matched, False, last_id
+        scanned += len(rows)
+        if len(rows) < SCAN_CHUNK:
+            return matched, True, last_id
+    return matched, False, last_id
+
+
+def search_findings(q='', project_id=None, severities=None, version='', active=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    按项目名 / 工件坐标 / CVE 编号搜索漏洞，按主键降序游标分页
+
+    返回 (漏洞列表, 下一页游标)；多取一条判断是否还有下一页
+    """
+    queryset = ArtifactVulnerability.objects.all()
+    if version:
+        queryset = queryset.filter(artifact__version__startswith=version)
+    if project_id:
+        queryset = queryset.filter(project_id=project_id)
+    if severities:
+        queryset = queryset.filter(severity__in=severities)
+    if active is not None:
+        queryset = queryset.filter(resolved_at__isnull=active)
+    if cursor:
+        queryset = queryset.filter(id__lt=decode_cursor(cursor))
+    tokens = tokenize(q)
+    scan_cursor = None
+    if len(tokens) == 1 and _CVE_RE.match(tokens[0]):
+        cve_ids = {tokens[0], tokens[0].upper()}
+        queryset = queryset.filter(vulnerability_id__in=Vulnerability.objects.filter(cve_id__in=cve_ids).values('id'))
+    elif tokens:
+        artifact_ids = list(_match(Artifact, 'vuln_artifact_fts', ['group', 'name', 'version'], tokens)
+                            .values_list('id', flat=True)[:SELECTIVE_LIMIT + 1])
+        project_ids = list(_match(Project, 'project_fts', ['name'], tokens).values_list('id', flat=True)[:SELECTIVE_LIMIT + 1])
+        if len(artifact_ids) <= SELECTIVE_LIMIT and len(project_ids) <= SELECTIVE_LIMIT:
+            queryset = queryset.filter(Q(artifact_id__in=artifact_ids) | Q(project_id__in=project_ids))
+        else:
+            if len(artifact_ids) > SELECTIVE_LIMIT:
+                artifact_ids = _match(Artifact, 'vuln_artifact_fts', ['group', 'name', 'version'], tokens).values_list('id', flat=True)
+            if len(project_ids) > SELECTIVE_LIMIT:
+                project_ids = _match(Project, 'project_fts', ['name'], tokens).values_list('id', flat=True)
+            matched, finished, last_id = _scan(queryset, set(artifact_ids), set(project_ids), limit)
+            if not finished and len(matched) <= limit:
+                # 预算用尽仍不足一页：从最后扫描的位置续扫
+                scan_cursor = encode_cursor(last_id)
+            queryset = ArtifactVulnerability.objects.filter(id__in=matched)
+    rows = list(queryset.select_related('project', 'artifact', 'vulnerability').order_by('-id')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if scan_cursor:
+        return rows, scan_cursor
+    return rows, encode_cursor(rows[-1].id) if has_more else None
@@ -0,0 +1,44 @@
+from rest_framework import serializers
+from .models import REPORT_FORMAT_CHOICES, Artifact, Vulnerability, DependencyCheckScan, ArtifactVulnerability, ArtifactChangeNotice
+class DependencyCheckScanSerializer(serializers.ModelSerializer):
+    project_name = serializers.CharField(source='project.name', read_only=True)
+    class Meta:
+        model = DependencyCheckScan
+        fields = '__all__'
+        read_only_fields = ('report_file', 'report_format', 'batch_id', 'file_size', 'status', 'dependency_count', 'finding_count', 'added_count',
+                            'removed_count', 'unchanged_count', 'uploaded_by',
+                            'started_at', 'finished_at', 'duration', 'error_message', 'task_id')
+class DependencyCheckUploadSerializer(serializers.Serializer):
+    project = serializers.IntegerField()
+    file = serializers.FileField()
+    format = serializers.ChoiceField(choices=REPORT_FORMAT_CHOICES, required=False, help_text='留空时按文件内容自动识别')
+class ReportBatchUploadSerializer(serializers.Serializer):
+    """批量上传：project 与 file 按提交顺序一一对应"""
+    project = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    file = serializers.ListField(child=serializers.FileField(), allow_empty=False)
+    format = serializers.ChoiceField(choices=REPORT_FORMAT_CHOICES, required=False, help_text='留空时逐个文件自动识别')
+    def validate(self, attrs):
+        if len(attrs['project']) != len(attrs['file']):
+            raise serializers.ValidationError('project 与 file 数量不一致')
+        return attrs
+class ArtifactSerializer(serializers.ModelSerializer):
+    class Meta: model = Artifact; fields = '__all__'
+class VulnerabilitySerializer(serializers.ModelSerializer):
+    class Meta: model = Vulnerability; fields = '__all__'
+class ArtifactVulnerabilitySerializer(serializers.ModelSerializer):
+    project_name = serializers.CharField(source='project.name', read_only=True)
+    artifact_group = serializers.CharField(source='artifact.group', read_only=True)
+    artifact_name = serializers.CharField(source='artifact.name', read_only=True)
+    artifact_version = serializers.CharField(source='artifact.version', read_only=True)
+    cve_id = serializers.CharField(source='vulnerability.cve_id', read_only=True)
+    cvss_score = serializers.FloatField(source='vulnerability.cvss_score', read_only=True)
+    cvss_vector = serializers.CharField(source='vulnerability.cvss_vector', read_only=True)
+    description = serializers.CharField(source='vulnerability.description', read_only=True)
+    is_active = serializers.BooleanField(read_only=True)
+    class Meta: model = ArtifactVulnerability; fields = '__all__'
+class ArtifactChangeNoticeSerializer(serializers.ModelSerializer):
+    release_version_name = serializers.CharField(source='release_version.version', read_only=True)
+    class Meta:
+        model = ArtifactChangeNotice
+        fields = '__all__'
+        read_only_fields = ('status', 'affected_count', 'notified_count', 'result', 'error_message', 'task_id', 'requested_by', 'finished_at')
@@ -0,0 +1,112 @@
+from celery import shared_task
+import logging
+import time
+logger = logging.getLogger(__name__)
+@shared_task(bind=True)
+def import_dependency_check(self, scan_id):
+    """异步导入扫描报告（Dependency-Check / CycloneDX / SPDX），按批次上报进度与吞吐量"""
+    from .models import DependencyCheckScan
+    from .importer import import_report as run_import
+    from apps.risk.dirty import mark_dirty
+    from django.utils import timezone
+    scan = DependencyCheckScan.objects.get(id=scan_id)
+    scan.status = 'running'
+    scan.started_at = timezone.now()
+    scan.save(update_fields=['status', 'started_at'])
+    begin = time.monotonic()
+
+    def report(bytes_read, finding_count):
+        elapsed = max(time.monotonic() - begin, 1e-6)
+        self.update_state(state='PROGRESS', meta={
+            'scan_id': scan_id,
+            'bytes_read': bytes_read,
+            'total_bytes': scan.file_size,
+            'percent': round(bytes_read * 100.0 / scan.file_size, 1) if scan.file_size else None,
+            'finding_count': finding_count,
+            'rows_per_second': round(finding_count / elapsed, 1),
+            'mb_per_second': round(bytes_read / elapsed / 1048576, 2),
+        })
+
+    try:
+        stats = run_import(scan, progress=report if not self.request.called_directly else None)
+        scan.status = 'success'
+        for field in ('dependency_count', 'finding_count', 'added_count', 'removed_count', 'unchanged_count'):
+            setattr(scan, field, stats[field])
+    except Exception as e:
+        logger.exception('扫描报告导入失败: scan=%s', scan_id)
+        scan.status = 'failed'
+        scan.error_message = str(e)
+        stats = {}
+    finally:
+        scan.finished_at = timezone.now()
+        scan.duration = round(time.monotonic() - begin, 3)
+        scan.save(update_fields=['status', 'dependency_count', 'finding_count', 'added_count', 'removed_count', 'unchanged_count',
+                                 'error_message', 'finished_at', 'duration'])
+    if scan.duration and stats:
+        stats['rows_per_second'] = round(stats['finding_count'] / scan.duration, 1)
+    logger.info('扫描报告导入完成: scan=%s status=%s stats=%s', scan_id, scan.status, stats)
+    if scan.status == 'success':
+        mark_dirty([scan.project_id])
+    return {'scan_id': scan_id, 'status': scan.status, **stats}
+@shared_task(bind=True)
+def import_report_batch(self, scan_ids, workers=None):
+    """批量导入一批扫描报告：进程池并行解析，单个写入器依次落库，按完成数上报进度"""
+    from .models import DependencyCheckScan
+    from .importer import import_batch
+    from apps.risk.dirty import mark_dirty
+    from django.utils import timezone
+    scans = list(DependencyCheckScan.objects.filter(id__in=scan_ids).order_by('id'))
+    DependencyCheckScan.objects.filter(id__in=[scan.id for scan in scans]).update(status='running', started_at=timezone.now())
+    begin = time.monotonic()
+    succeeded = failed = 0
+    for done, (scan, stats, error) in enumerate(import_batch(scans, workers=workers), 1):
+        if error is None:
+            scan.status = 'success'
+            for field in ('dependency_count', 'finding_count', 'added_count', 'removed_count', 'unchanged_count'):
+                setattr(scan, field, stats[field])
+            scan.duration = round(stats['parse_seconds'] + stats['write_seconds'], 3)
+            succeeded += 1
+        else:
+            scan.status = 'failed'
+            scan.error_message = str(error)
+            failed += 1
+        scan.finished_at = timezone.now()
+        scan.save(update_fields=['status', 'dependency_count', 'finding_count', 'added_count', 'removed_count', 'unchanged_count',
+                                 'error_message', 'finished_at', 'duration'])
+        if not self.request.called_directly:
+            self.update_state(state='PROGRESS', meta={'done': done, 'total': len(scans), 'succeeded': succeeded, 'failed': failed,
+                                                      'elapsed': round(time.monotonic() - begin, 1)})
+    mark_dirty([scan.project_id for scan in scans if scan.status == 'success'])
+    duration = round(time.monotonic() - begin, 3)
+    logger.info('批量导入完成: scans=%s succeeded=%s failed=%s duration=%ss', len(scans), succeeded, failed, duration)
+    return {'total': len(scans), 'succeeded': succeeded, 'failed': failed, 'duration': duration}
+@shared_task(bind=True)
+def analyze_artifact_change(self, notice_id):
+    """工件版本变更：集合查询受影响应用，再按负责人批量通知"""
+    from .models import ArtifactChangeNotice
+    from .impact import analyze_impact, notify_owners
+    from django.utils import timezone
+    notice = ArtifactChangeNotice.objects.select_related('release_version').get(id=notice_id)
+    notice.status = 'running'
+    notice.save(update_fields=['status'])
+
+    def report(stage, done=0, total=0):
+        if not self.request.called_directly:
+            self.update_state(state='PROGRESS', meta={'notice_id': notice_id, 'stage': stage, 'done': done, 'total': total})
+
+    try:
+        report('analyzing')
+        impacts = analyze_impact(notice.release_version_id, notice.artifact_group, notice.artifact_name, notice.version_range)
+        report('notifying', 0, len(impacts))
+        notice.notified_count = notify_owners(notice, impacts, progress=lambda done, total: report('notifying', done, total))
+        notice.affected_count = len(impacts)
+        notice.result = impacts
+        notice.status = 'success'
+    except Exception as e:
+        logger.exception('工件版本变更分析失败: notice=%s', notice_id)
+        notice.status = 'failed'
+        notice.error_message = str(e)
+    finally:
+        notice.finished_at = timezone.now()
+        notice.save(update_fields=['status', 'affected_count', 'notified_count', 'result', 'error_message', 'finished_at'])
+    return {'notice_id': notice_id, 'status': notice.status, 'affected_count': notice.affected_count, 'notified_count': notice.notified_count}
@@ -0,0 +1,151 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APITestCase
+from apps.projects.models import Environment, Project
+from apps.users.models import User
+from .catalog import Catalog, finding_fingerprint
+from .importer import ParsedReport, import_batch, write_findings
+from .models import ArtifactVulnerability, DependencyCheckScan
+from .versioning import VersionIndex, compile_range, version_key
+
+
+def finding(cve_id, version='1.0', severity='high'):
+    return {'group': 'org.example', 'name': 'demo-lib', 'version': version, 'cve_id': cve_id, 'severity': severity,
+            'cvss_score': 7.5, 'cvss_vector': 'AV:N', 'description': cve_id}
+
+
+class WriteFindingsCountTests(TestCase):
+    """扫描记录的统计与实际落库的漏洞一致"""
+
+    def setUp(self):
+        environment = Environment.objects.create(name='test')
+        self.project = Project.objects.create(name='demo', git_repo='https://git.example.com/demo.git', environment=environment,
+                                              deploy_dir='/opt/demo', start_script='start.sh', stop_script='stop.sh')
+        self.scan = DependencyCheckScan.objects.create(project=self.project, report_file='report.json')
+
+    def report(self, findings):
+        return ParsedReport(1, {('org.example', 'demo-lib', '1.0')}, findings, 100, 0.0)
+
+    def test_duplicates_counted_once(self):
+        progress = []
+        rows = [finding('CVE-2024-0001'), finding('CVE-2024-0001'), finding('CVE-2024-0002')]
+        stats = write_findings(self.scan, self.report(rows), progress=lambda _, count: progress.append(count), batch_size=2)
+        self.assertEqual((stats['finding_count'], stats['added_count'], stats['unchanged_count']), (2, 2, 0))
+        self.assertEqual(progress[-1], 2)
+        self.assertEqual(ArtifactVulnerability.objects.filter(project=self.project).count(), 2)
+
+    def test_conflicting_rows_not_added(self):
+        rows = [finding('CVE-2024-0001'), finding('CVE-2024-0002')]
+        other = DependencyCheckScan.objects.create(project=self.project, report_file='other.json')
+
+        def findings():
+            # 解析期间并发导入先写入了同一指纹，本次的 bulk_create 被 ignore_conflicts 跳过
+            row = Catalog().intern([finding('CVE-2024-0001')])[0]
+            ArtifactVulnerability.objects.create(
+                project=self.project, artifact_id=row['artifact_id'], vulnerability_id=row['vulnerability_id'], severity='high',
+                fingerprint=finding_fingerprint(row['artifact_hash'], row['vulnerability_hash'], 'high'),
+                first_seen_scan=other, first_seen_at=other.created_at)
+            yield from rows
+
+        report = self.report(rows)
+        report.iter_findings = findings
+        stats = write_findings(self.scan, report)
+        self.assertEqual((stats['finding_count'], stats['added_count'], stats['unchanged_count']), (2, 1, 1))
+        self.assertEqual(ArtifactVulnerability.objects.filter(first_seen_scan=self.scan).count(), 1)
+
+
+class ScanApiTests(APITestCase):
+    """扫描记录只能上传报告创建，统计与状态不能通过接口修改"""
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user(username='tester', password='tester'))
+        environment = Environment.objects.create(name='test')
+        self.project = Project.objects.create(name='demo', git_repo='https://git.example.com/demo.git', environment=environment,
+                                              deploy_dir='/opt/demo', start_script='start.sh', stop_script='stop.sh')
+        self.scan = DependencyCheckScan.objects.create(project=self.project, report_file='report.json', status='success',
+                                                       finding_count=3)
+
+    def test_write_methods_rejected(self):
+        url = f'/api/vulnerabilities/scans/{self.scan.id}/'
+        self.assertEqual(self.client.patch(url, {'finding_count': 0, 'status': 'failed'}).status_code, 405)
+        self.assertEqual(self.client.put(url, {'project': self.project.id}).status_code, 405)
+        self.assertEqual(self.client.post('/api/vulnerabilities/scans/', {'project': self.project.id}).status_code, 405)
+        self.scan.refresh_from_db()
+        self.assertEqual((self.scan.status, self.scan.finding_count), ('success', 3))
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+
+class ImportBatchOrderTests(TestCase):
+    """批量导入按提交顺序写入，先解析完成的报告不会先写入"""
+
+    def test_written_in_submission_order(self):
+        scans = [mock.Mock(id=index, report_file=f'{index}.json', report_format='json') for index in range(4)]
+        written = []
+
+        def parse(report_file, report_format):
+            # 越早提交的报告解析越慢
+            time.sleep((4 - int(report_file.split('.')[0])) * 0.05)
+            return ParsedReport(0, set(), [], 0, 0.0)
+
+        def write(scan, parsed, **kwargs):
+            written.append(scan.id)
+            return {}
+
+        with mock.patch('apps.vulnerabilities.importer.ProcessPoolExecutor', ThreadPoolExecutor), \
+                mock.patch('apps.vulnerabilities.importer.parse_report', parse), \
+                mock.patch('apps.vulnerabilities.importer.write_findings', write):
+            results = list(import_batch(scans, workers=4))
+        self.assertEqual(written, [0, 1, 2, 3])
+        self.assertEqual([scan.id for scan, _, error in results if error is None], [0, 1, 2, 3])
+
+
+class VersionRangeTests(SimpleTestCase):
+    """Maven 区间与 npm 范围的边界；VersionIndex 的批量匹配与逐个判断一致"""
+
+    def assertRange(self, spec, included, excluded):
+        version_range = compile_range(spec)
+        for version in included:
+            self.assertIn(version, version_range, f'{version} 应在 {spec} 内')
+        for version in excluded:
+            self.assertNotIn(version, version_range, f'{version} 不应在 {spec} 内')
+        self.assertEqual(VersionIndex([*included, *excluded]).match(spec), set(included))
+
+    def test_version_key(self):
+        self.assertEqual(version_key('1.0'), version_key('1.0.0'))
+        self.assertEqual(version_key('v1.2.3'), version_key('1.2.3+build.5'))
+        self.assertLess(version_key('1.0-alpha'), version_key('1.0-beta2'))
+        self.assertLess(version_key('1.0-rc1'), version_key('1.0-rc2'))
+        self.assertLess(version_key('1.0-rc2'), version_key('1.0'))
+        self.assertLess(version_key('1.0'), version_key('1.0-sp1'))
+        self.assertLess(version_key('1.9'), version_key('1.10'))
+
+    def test_maven(self):
+        self.assertRange('[1.2,2.0)', ['1.2', '1.2.0', '1.9.9', '2.0-rc1'], ['1.2-rc1', '1.1', '2.0', '2.0.0'])
+        self.assertRange('(,1.0]', ['0.1', '1.0', '1.0.0'], ['1.0.1', '1.0-sp1'])
+        self.assertRange('(1.0,)', ['1.0.1', '1.0-sp1', '10'], ['1.0', '1.0-rc1'])
+        self.assertRange('[1.5]', ['1.5', '1.5.0'], ['1.5.1', '1.4'])
+        self.assertRange('(,1.0],[1.2,)', ['1.0', '1.2', '3'], ['1.1', '1.1.9'])
+
+    def test_maven_invalid(self):
+        with self.assertRaises(ValueError):
+            compile_range('[1.0')
+
+    def test_npm_caret_tilde(self):
+        self.assertRange('^1.4.0', ['1.4.0', '1.9.9'], ['1.3.9', '1.4.0-beta', '2.0.0', '2.0.0-rc.1'])
+        self.assertRange('^0.2.3', ['0.2.3', '0.2.9'], ['0.2.2', '0.3.0'])
+        self.assertRange('^0.0.3', ['0.0.3'], ['0.0.4', '0.1.0'])
+        self.assertRange('~1.2', ['1.2.0', '1.2.9'], ['1.1.9', '1.3.0'])
+        self.assertRange('~1', ['1.0.0', '1.9'], ['0.9', '2.0.0'])
+        self.assertRange('1.x', ['1.0.0', '1.99'], ['0.9', '2.0.0'])
+
+    def test_npm_comparators(self):
+        self.assertRange('>=1.0 <2.0', ['1.0', '1.5'], ['0.9', '2.0', '2.0.0-alpha'])
+        self.assertRange('>1.2.3 <=1.3.0', ['1.2.4', '1.3.0'], ['1.2.3', '1.3.1'])
+        self.assertRange('<1.0.0 || >=3', ['0.9', '3.0.0'], ['1.0', '2.9', '1.0.0-rc.1'])
+        self.assertRange('1.0 - 2.3', ['1.0', '2.3.9'], ['0.9', '2.4.0'])
+        self.assertRange('1.0.0 - 2.3.4', ['2.3.4'], ['2.3.5'])
+        self.assertRange('=1.2.3', ['1.2.3'], ['1.2.4'])
+        for spec in ('', '*', 'x', 'latest'):
+            self.assertRange(spec, ['0.0.1', '99'], [])
@@ -1 +1,16 @@
-urlpatterns = []
+from django.urls import path
+from rest_framework.routers import SimpleRouter
+from .views import ArtifactViewSet, VulnerabilityViewSet, DependencyCheckScanViewSet, ArtifactVulnerabilityViewSet, ArtifactChangeNoticeViewSet, RelationGraphViewSet
+router = SimpleRouter()
+router.register('artifacts', ArtifactViewSet, basename='artifact')
+router.register('cves', VulnerabilityViewSet, basename='vulnerability')
+router.register('scans', DependencyCheckScanViewSet, basename='dependencyscan')
+router.register('findings', ArtifactVulnerabilityViewSet, basename='artifactvulnerability')
+router.register('change-notices', ArtifactChangeNoticeViewSet, basename='artifactchangenotice')
+urlpatterns = [
+    path('graph/project/<int:pk>/', RelationGraphViewSet.as_view({'get': 'project'}), name='graph-project'),
+    path('graph/artifact/<int:pk>/', RelationGraphViewSet.as_view({'get': 'artifact'}), name='graph-artifact'),
+    path('graph/neighbourhood/', RelationGraphViewSet.as_view({'get': 'neighbourhood'}), name='graph-neighbourhood'),
+    path('graph/expand/', RelationGraphViewSet.as_view({'get': 'expand'}), name='graph-expand'),
+]
+urlpatterns += router.urls
@@ -0,0 +1,206 @@
+"""
+版本号与版本范围匹配：版本解析为可排序的元组键（带缓存），范围编译为区间，
+对排好序的版本数组用 bisect 批量匹配
+
+支持 Maven 区间（[1.2,2.0)、(,1.0],[1.2,)）、npm/semver（^1.4.0、~1.2、1.x、>=1.0 <2.0、a - b、||）
+"""
+import re
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+
+_VERSION_RE = re.compile(r'(\d+(?:\.\d+)*)?(.*)', re.S)
+_TOKEN_RE = re.compile(r'\d+|[a-z]+')
+_COMPARATOR_RE = re.compile(r'(>=|<=|>|<|==|=)?\s*v?([^\s<>=]+)')
+# 限定词排序：预发布 < 正式版 < 服务包；未知限定词按预发布处理并按字母序比较
+_QUALIFIER_RANK = {
+    'alpha': 1, 'a': 1, 'beta': 2, 'b': 2, 'milestone': 3, 'm': 3, 'rc': 4, 'cr': 4, 'pre': 4, 'preview': 4,
+    'snapshot': 5, 'dev': 0, '': 6, 'ga': 6, 'final': 6, 'release': 6, 'sp': 7,
+}
+_UNKNOWN_QUALIFIER_RANK = 0
+_FLOOR = (-1, 0, '')
+
+
+@lru_cache(maxsize=65536)
+def version_key(version):
+    """
+    版本 -> 排序键 (数字段元组, (限定词等级, 限定词序号, 限定词文本))
+
+    数字段去掉末尾的 0，使 1.0 == 1.0.0；1.0-rc1 < 1.0 < 1.0-sp1
+    """
+    text = str(version or '').strip().lower().lstrip('v')
+    release, rest = _VERSION_RE.match(text.split('+', 1)[0]).groups()
+    numbers = [int(part) for part in release.split('.')] if release else []
+    while numbers and numbers[-1] == 0:
+        numbers.pop()
+    tokens = _TOKEN_RE.findall(rest)
+    qualifier = next((token for token in tokens if not token.isdigit()), '')
+    sequence = next((int(token) for token in tokens if token.isdigit()), 0)
+    rank = _QUALIFIER_RANK.get(qualifier, _UNKNOWN_QUALIFIER_RANK)
+    return tuple(numbers), (rank, sequence, qualifier if rank == _UNKNOWN_QUALIFIER_RANK else '')
+
+
+def _floor_key(numbers):
+    """某个数字版本的最小键（低于它的任何预发布版本），用于 npm 的排他上界"""
+    numbers = list(numbers)
+    while numbers and numbers[-1] == 0:
+        numbers.pop()
+    return tuple(numbers), _FLOOR
+
+
+class VersionRange:
+    """
+    编译后的版本范围：区间列表 [(下界键, 含下界, 上界键, 含上界)]，None 表示无界
+    """
+
+    def __init__(self, spec, intervals):
+        self.spec = spec
+        self.intervals = intervals
+
+    def __contains__(self, version):
+        key = version_key(version)
+        for low, low_inclusive, high, high_inclusive in self.intervals:
+            if low is not None and (key < low or (key == low and not low_inclusive)):
+                continue
+            if high is not None and (key > high or (key == high and not high_inclusive)):
+                continue
+            return True
+        return False
+
+    def __repr__(self):
+        return f'VersionRange({self.spec!r})'
+
+
+@lru_cache(maxsize=4096)
+def compile_range(spec):
+    spec = (spec or '').strip()
+    if not spec or spec in ('*', 'x', 'latest'):
+        return VersionRange(spec, [(None, True, None, True)])
+    if spec[0] in '[(':
+        return VersionRange(spec, _parse_maven(spec))
+    intervals = []
+    for part in spec.split('||'):
+        intervals.extend(_parse_npm(part.strip()))
+    return VersionRange(spec, intervals)
+
+
+def _parse_maven(spec):
+    intervals = []
+    for match in re.finditer(r'([\[(])([^\])]*)([\])])', spec):
+        opening, body, closing = match.groups()
+        if ',' not in body:
+            key = version_key(body)
+            intervals.append((key, True, key, True))
+            continue
+        low, high = (value.strip() for value in body.split(',', 1))
+        intervals.append((version_key(low) if low else None, opening == '[', version_key(high) if high else None, closing == ']'))
+    if not intervals:
+        raise ValueError(f'无法解析的 Maven 版本范围: {spec}')
+    return intervals
+
+
+def _numbers(version):
+    """提取 npm 版本的数字段，x/*/缺省段返回 None 截断"""
+    parts = []
+    for part in version.lstrip('v=').split('-', 1)[0].split('.'):
+        if part in ('x', 'X', '*', ''):
+            break
+        if not part.isdigit():
+            break
+        parts.append(int(part))
+    return parts
+
+
+def _parse_npm(part):
+    if not part or part in ('*', 'x', 'X'):
+        return [(None, True, None, True)]
+    if ' - ' in part:
+        low, high = (value.strip() for value in part.split(' - ', 1))
+        high_numbers = _numbers(high)
+        if len(high_numbers) < 3 and high_numbers:
+            # 1.0 - 2.3 等价于 >=1.0 <2.4.0
+            bumped = high_numbers[:-1] + [high_numbers[-1] + 1]
+            return [(version_key(low), True, _floor_key(bumped), False)]
+        return [(version_key(low), True, version_key(high), True)]
+    low, low_inclusive, high, high_inclusive = None, True, None, True
+    for operator, version in _COMPARATOR_RE.findall(part):
+        if version.startswith('^') or version.startswith('~'):
+            operator, version = version[0], version[1:]
+        numbers = _numbers(version)
+        if operator in ('^', '~') or (not operator and len(numbers) < 3 and not _has_qualifier(version)):
+            bounds = _caret_tilde_x(operator, version, numbers)
+        elif operator in ('', '=', '=='):
+            key = version_key(version)
+            bounds = (key, True, key, True)
+        elif operator in ('>', '>='):
+            bounds = (version_key(version), operator == '>=', None, True)
+        elif operator == '<' and numbers and not _has_qualifier(version):
+            # <2.0.0 不包含 2.0.0 的预发布版本，与 ^ / ~ 的排他上界一致
+            bounds = (None, True, _floor_key(numbers), False)
+        else:
+            bounds = (None, True, version_key(version), operator == '<=')
+        low, low_inclusive = _tighter_low(low, low_inclusive, bounds[0], bounds[1])
+        high, high_inclusive = _tighter_high(high, high_inclusive, bounds[2], bounds[3])
+    return [(low, low_inclusive, high, high_inclusive)]
+
+
+def _has_qualifier(version):
+    return '-' in version
+
+
+def _caret_tilde_x(operator, version, numbers):
+    if not numbers:
+        return None, True, None, True
+    low = version_key(version) if len(numbers) >= 3 else _floor_key(numbers)
+    if operator == '^':
+        # ^1.2.3 -> <2.0.0；^0.2.3 -> <0.3.0；^0.0.3 -> <0.0.4
+        index = next((i for i, value in enumerate(numbers) if value != 0), len(numbers) - 1)
+    elif operator == '~':
+        # ~1.2.3 -> <1.3.0；~1 -> <2.0.0
+        index = min(1, len(numbers) - 1) if len(numbers) > 1 else 0
+    else:
+        # 1.x / 1.2 -> 末位数字段 +1
+        index = len(numbers) - 1
+    upper = numbers[:index] + [numbers[index] + 1]
+    return low, True, _floor_key(upper), False
+
+
+def _tighter_low(current, inclusive, candidate, candidate_inclusive):
+    if candidate is None:
+        return current, inclusive
+    if current is None or candidate > current or (candidate == current and not candidate_inclusive):
+        return candidate, candidate_inclusive
+    return current, inclusive
+
+
+def _tighter_high(current, inclusive, candidate, candidate_inclusive):
+    if candidate is None:
+        return current, inclusive
+    if current is None or candidate < current or (candidate == current and not candidate_inclusive):
+        return candidate, candidate_inclusive
+    return current, inclusive
+
+
+class VersionIndex:
+    """
+    一组版本的有序索引：构建时排序一次，之后每个范围的匹配只需对每个区间做两次 bisect
+    """
+
+    def __init__(self, versions):
+        pairs = sorted((version_key(version), version) for version in set(versions))
+        self.keys = [key for key, _ in pairs]
+        self.versions = [version for _, version in pairs]
+
+    def _slice(self, low, low_inclusive, high, high_inclusive):
+        start = 0 if low is None else (bisect_left if low_inclusive else bisect_right)(self.keys, low)
+        end = len(self.keys) if high is None else (bisect_right if high_inclusive else bisect_left)(self.keys, high)
+        return start, end
+
+    def match(self, version_range):
+        """返回落在范围内的版本集合"""
+        if isinstance(version_range, str):
+            version_range = compile_range(version_range)
+        matched = set()
+        for interval in version_range.intervals:
+            start, end = self._slice(*interval)
+            matched.update(self.versions[start:end])
+        return matched
@@ -0,0 +1,260 @@
+import os
+import uuid
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.shortcuts import get_object_or_404
+from rest_framework import filters, status, viewsets
+from rest_framework.permissions import IsAuthenticated
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.response import Response
+from celery.result import AsyncResult
+from apps.base.viewsets import BaseModelViewSet
+from apps.projects.models import Project
+from . import graph, search
+from .impact import analyze_impact, summarize_versions
+from .models import Artifact, Vulnerability, DependencyCheckScan, ArtifactVulnerability, ArtifactChangeNotice
+from .parsers import detect_format
+from .serializers import (ArtifactSerializer, VulnerabilitySerializer, DependencyCheckScanSerializer,
+                          DependencyCheckUploadSerializer, ReportBatchUploadSerializer, ArtifactVulnerabilitySerializer,
+                          ArtifactChangeNoticeSerializer)
+from .tasks import import_dependency_check, import_report_batch, analyze_artifact_change
+
+REPORT_UPLOAD_DIR = 'dependency_check'
+
+
+def save_report(report):
+    """直接落盘，由 Celery 任务流式解析，避免在请求线程中加载整个报告"""
+    upload_dir = os.path.join(settings.MEDIA_ROOT, REPORT_UPLOAD_DIR)
+    os.makedirs(upload_dir, exist_ok=True)
+    filename = FileSystemStorage(location=upload_dir).save(f'{uuid.uuid4().hex}.json', report)
+    return os.path.join(upload_dir, filename)
+
+
+class DependencyCheckScanViewSet(BaseModelViewSet):
+    """
+    扫描记录：上传 Dependency-Check / CycloneDX / SPDX 报告后异步导入，支持批量上传与查询导入进度
+    """
+    queryset = DependencyCheckScan.objects.select_related('project').all()
+    serializer_class = DependencyCheckScanSerializer
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filterset_fields = ['project', 'status', 'report_format', 'batch_id']
+    search_fields = ['project__name']
+    ordering_fields = ['id', 'created_at', 'finding_count', 'duration']
+    # 统计与状态由导入任务写入，不提供修改；POST 只用于上传报告
+    http_method_names = ['get', 'post', 'head', 'options', 'delete']
+
+    def create(self, request, *args, **kwargs):
+        return Response({'detail': '请通过 upload / batch_upload 上传报告创建扫描记录'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser, FormParser])
+    def upload(self, request):
+        serializer = DependencyCheckUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        project = Project.objects.filter(id=serializer.validated_data['project']).first()
+        if project is None:
+            return Response({'detail': '项目不存在'}, status=status.HTTP_400_BAD_REQUEST)
+        report = serializer.validated_data['file']
+        report_file = save_report(report)
+        scan = DependencyCheckScan.objects.create(
+            project=project,
+            report_file=report_file,
+            report_format=serializer.validated_data.get('format') or detect_format(report_file),
+            file_size=report.size,
+            uploaded_by=request.user,
+        )
+        result = import_dependency_check.delay(scan.id)
+        DependencyCheckScan.objects.filter(id=scan.id).update(task_id=result.id)
+        scan.task_id = result.id
+        return Response(self.get_serializer(scan).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser, FormParser])
+    def batch_upload(self, request):
+        """批量上传（如版本冻结后的全部 SBOM），一个任务在进程池中并行解析"""
+        serializer = ReportBatchUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        project_ids = serializer.validated_data['project']
+        existing = set(Project.objects.filter(id__in=project_ids).values_list('id', flat=True))
+        missing = sorted(set(project_ids) - existing)
+        if missing:
+            return Response({'detail': f'项目不存在: {missing}'}, status=status.HTTP_400_BAD_REQUEST)
+        batch_id = uuid.uuid4().hex
+        scans = []
+        for project_id, report in zip(project_ids, serializer.validated_data['file']):
+            report_file = save_report(report)
+            scans.append(DependencyCheckScan(
+                project_id=project_id, report_file=report_file, file_size=report.size, batch_id=batch_id, uploaded_by=request.user,
+                report_format=serializer.validated_data.get('format') or detect_format(report_file),
+            ))
+        DependencyCheckScan.objects.bulk_create(scans)
+        scan_ids = list(DependencyCheckScan.objects.filter(batch_id=batch_id).values_list('id', flat=True))
+        result = import_report_batch.delay(scan_ids)
+        DependencyCheckScan.objects.filter(batch_id=batch_id).update(task_id=result.id)
+        return Response({'batch_id': batch_id, 'task_id': result.id, 'count': len(scan_ids), 'scan_ids': scan_ids},
+                        status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'])
+    def progress(self, request, pk=None):
+        scan = self.get_object()
+        data = {'scan_id': scan.id, 'status': scan.status, 'finding_count': scan.finding_count, 'duration': scan.duration}
+        if scan.status == 'running' and scan.task_id:
+            result = AsyncResult(scan.task_id)
+            if result.state == 'PROGRESS' and isinstance(result.info, dict):
+                data.update(result.info)
+        return Response(data)
+
+    @action(detail=False, methods=['delete'])
+    def bulk_delete(self, request):
+        if not request.user.is_superuser:
+            return Response({'detail': '无权限'}, status=status.HTTP_403_FORBIDDEN)
+        ids = request.data.get('ids', [])
+        if not ids:
+            return Response({'detail': '请提供要删除的ID列表'}, status=status.HTTP_400_BAD_REQUEST)
+        deleted, _ = self.get_queryset().filter(id__in=ids).delete()
+        return Response({'deleted': deleted}, status=status.HTTP_200_OK)
+
+
+class ArtifactVulnerabilityViewSet(BaseModelViewSet):
+    """
+    工件漏洞：支持过滤、搜索、排序
+    """
+    queryset = ArtifactVulnerability.objects.select_related('project', 'artifact', 'vulnerability').order_by('-id')
+    serializer_class = ArtifactVulnerabilitySerializer
+    http_method_names = ['get', 'head', 'options', 'delete']
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filterset_fields = ['project', 'severity', 'first_seen_scan', 'resolved_scan']
+    search_fields = ['project__name', 'artifact__name', 'artifact__version', 'vulnerability__cve_id']
+    ordering_fields = ['id', 'vulnerability__cvss_score', 'severity', 'first_seen_at', 'resolved_at']
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        active = self.request.query_params.get('active')
+        if active is not None:
+            queryset = queryset.filter(resolved_at__isnull=active.lower() in ('1', 'true'))
+        return queryset
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        AV02 搜索：q 匹配项目名/工件坐标/CVE 编号，version 按前缀过滤，可按 project、severity（逗号分隔）、active 过滤
+
+        游标分页（cursor/limit），不返回总数
+        """
+        params = request.query_params
+        active = params.get('active')
+        severities = [value for value in params.get('severity', '').split(',') if value]
+        try:
+            rows, next_cursor = search.search_findings(
+                q=params.get('q', ''), project_id=params.get('project') or None, severities=severities,
+                version=params.get('version', ''), active=None if active is None else active.lower() in ('1', 'true'),
+                cursor=params.get('cursor'), limit=graph.clamp_limit(params.get('limit'), search.DEFAULT_PAGE_SIZE, search.MAX_PAGE_SIZE),
+            )
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'next': next_cursor, 'results': self.get_serializer(rows, many=True).data})
+
+
+class ArtifactViewSet(BaseModelViewSet):
+    """
+    工件目录：只读，按内容哈希全局去重
+    """
+    queryset = Artifact.objects.order_by('group', 'name', 'version')
+    serializer_class = ArtifactSerializer
+    http_method_names = ['get', 'head', 'options']
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filterset_fields = ['group', 'name', 'version']
+    search_fields = ['group', 'name', 'version']
+    ordering_fields = ['id', 'name', 'created_at']
+
+
+class VulnerabilityViewSet(BaseModelViewSet):
+    """
+    漏洞目录：只读，按 CVE 编号全局去重
+    """
+    queryset = Vulnerability.objects.order_by('-id')
+    serializer_class = VulnerabilitySerializer
+    http_method_names = ['get', 'head', 'options']
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filterset_fields = ['cve_id', 'severity']
+    search_fields = ['cve_id', 'description']
+    ordering_fields = ['id', 'cvss_score']
+
+
+class ArtifactChangeNoticeViewSet(BaseModelViewSet):
+    """
+    工件版本变更通知：创建后异步分析受影响应用并通知负责人
+    """
+    queryset = ArtifactChangeNotice.objects.select_related('release_version').all()
+    serializer_class = ArtifactChangeNoticeSerializer
+    http_method_names = ['get', 'post', 'head', 'options', 'delete']
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filterset_fields = ['release_version', 'status', 'requested_by']
+    search_fields = ['artifact_group', 'artifact_name', 'new_version']
+    ordering_fields = ['id', 'created_at', 'affected_count']
+
+    def perform_create(self, serializer):
+        notice = serializer.save(requested_by=self.request.user)
+        result = analyze_artifact_change.delay(notice.id)
+        ArtifactChangeNotice.objects.filter(id=notice.id).update(task_id=result.id)
+        notice.task_id = result.id
+
+    @action(detail=False, methods=['get'])
+    def impact(self, request):
+        """预览影响范围：release、name 必填，group、range（受影响版本范围）可选"""
+        release, name = request.query_params.get('release'), request.query_params.get('name')
+        if not release or not name:
+            return Response({'detail': '请提供 release 和 name 参数'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            impacts = analyze_impact(release, request.query_params.get('group', ''), name, request.query_params.get('range', ''))
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'count': len(impacts), 'versions': summarize_versions(impacts), 'results': impacts})
+
+    @action(detail=True, methods=['get'])
+    def progress(self, request, pk=None):
+        notice = self.get_object()
+        data = {'notice_id': notice.id, 'status': notice.status, 'affected_count': notice.affected_count,
+                'notified_count': notice.notified_count}
+        if notice.status == 'running' and notice.task_id:
+            result = AsyncResult(notice.task_id)
+            if result.state == 'PROGRESS' and isinstance(result.info, dict):
+                data.update(result.info)
+        return Response(data)
+
+
+class RelationGraphViewSet(viewsets.ViewSet):
+    """
+    项目-工件关系图谱：直接读取邻接索引，返回节点/边数组
+    """
+    permission_classes = [IsAuthenticated]
+
+    def project(self, request, pk=None):
+        project = get_object_or_404(Project.objects.only('id', 'name'), pk=pk)
+        return Response(graph.project_graph(project, graph.clamp_limit(request.query_params.get('limit'))))
+
+    def artifact(self, request, pk=None):
+        artifact = get_object_or_404(Artifact, pk=pk)
+        return Response(graph.artifact_graph(artifact, graph.clamp_limit(request.query_params.get('limit'))))
+
+    def neighbourhood(self, request):
+        params = request.query_params
+        try:
+            payload = graph.neighbourhood(
+                params.get('node'),
+                depth=graph.clamp_limit(params.get('depth'), 1, graph.MAX_DEPTH),
+                fanout=graph.clamp_limit(params.get('limit'), graph.DEFAULT_FANOUT, graph.MAX_FANOUT),
+                max_nodes=graph.clamp_limit(params.get('max_nodes')),
+            )
+        except (ValueError, Project.DoesNotExist, Artifact.DoesNotExist) as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(payload)
+
+    def expand(self, request):
+        params = request.query_params
+        try:
+            payload = graph.expand(params.get('node'), params.get('cursor'),
+                                   fanout=graph.clamp_limit(params.get('limit'), graph.DEFAULT_FANOUT, graph.MAX_FANOUT))
+        except (ValueError, Project.DoesNotExist, Artifact.DoesNotExist) as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(payload)
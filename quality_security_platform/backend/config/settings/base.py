@@ -113,6 +113,8 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# 批量上传扫描报告（版本冻结后一次数百个 SBOM）
+DATA_UPLOAD_MAX_NUMBER_FILES = env.int('DATA_UPLOAD_MAX_NUMBER_FILES', default=1000)
 
 # Celery
 CELERY_BROKER_URL = env('CELERY_BROKER_URL', default='redis://localhost:6379/1')
@@ -121,6 +123,50 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'Asia/Shanghai'
+CELERY_BEAT_SCHEDULE = {
+    # 构建调度兜底：构建结束时会立即调度，定时任务负责回收派发后未启动的构建
+    'schedule-builds': {'task': 'apps.ci_cd.tasks.schedule_builds', 'schedule': 30.0},
+    'prune-stage-cache': {'task': 'apps.ci_cd.tasks.prune_stage_cache', 'schedule': 3600.0},
+    'archive-builds': {'task': 'apps.ci_cd.tasks.archive_old_builds', 'schedule': 86400.0},
+    'poll-sonar-quality-gates': {'task': 'apps.ci_cd.tasks.poll_sonar_quality_gates', 'schedule': 60.0},
+    'apply-webhook-events': {'task': 'apps.ci_cd.tasks.apply_webhook_events', 'schedule': 30.0},
+    # 风险分由构建 / 导入 / 门禁结果触发增量重算，全量重算只作兜底
+    'recompute-risk-scores': {'task': 'apps.risk.tasks.recompute_risk_scores', 'schedule': 86400.0},
+    'prune-risk-history': {'task': 'apps.risk.tasks.prune_risk_history', 'schedule': 86400.0},
+}
+
+# CI/CD 执行器：每个构建在独立工作目录中执行，同一层内最多并行的阶段数
+CICD_WORKSPACE_ROOT = env('CICD_WORKSPACE_ROOT', default=str(BASE_DIR / 'workspace'))
+CICD_MAX_PARALLEL_STAGES = env.int('CICD_MAX_PARALLEL_STAGES', default=8)
+# 构建日志按块追加存储，块大小（字节）及是否 zlib 压缩
+CICD_LOG_CHUNK_SIZE = env.int('CICD_LOG_CHUNK_SIZE', default=256 * 1024)
+CICD_LOG_COMPRESS = env.bool('CICD_LOG_COMPRESS', True)
+# SSE 日志跟踪单次连接的最长时间（秒），每个连接占用一个 worker，到期后客户端按 Last-Event-ID 重连
+CICD_LOG_STREAM_SECONDS = env.int('CICD_LOG_STREAM_SECONDS', default=30)
+# 阶段结果缓存：条目有效期（天）与最多保留的条目数（按最近使用淘汰）
+CICD_STAGE_CACHE_TTL_DAYS = env.int('CICD_STAGE_CACHE_TTL_DAYS', default=7)
+CICD_STAGE_CACHE_MAX_ENTRIES = env.int('CICD_STAGE_CACHE_MAX_ENTRIES', default=10000)
+# 构建归档：超过保留天数的构建（每条流水线保留最近 N 个）移出热表，写入归档目录下的 jsonl.gz 文件
+CICD_ARCHIVE_ROOT = env('CICD_ARCHIVE_ROOT', default=str(BASE_DIR / 'archive'))
+CICD_ARCHIVE_AFTER_DAYS = env.int('CICD_ARCHIVE_AFTER_DAYS', default=90)
+CICD_ARCHIVE_KEEP_LAST = env.int('CICD_ARCHIVE_KEEP_LAST', default=20)
+# SonarQube 质量门禁轮询：并发请求数（连接池大小），超过该小时数仍未完成分析的任务记为 TIMEOUT
+CICD_SONAR_CONCURRENCY = env.int('CICD_SONAR_CONCURRENCY', default=10)
+CICD_SONAR_POLL_TIMEOUT_HOURS = env.int('CICD_SONAR_POLL_TIMEOUT_HOURS', default=24)
+# 外部 CI Webhook：共享密钥（令牌或 HMAC 签名），投递 ID 去重保留秒数
+CICD_WEBHOOK_SECRET = env('CICD_WEBHOOK_SECRET', default='')
+CICD_WEBHOOK_DEDUP_SECONDS = env.int('CICD_WEBHOOK_DEDUP_SECONDS', default=86400)
+# 风险评分子分数参数，未配置的项使用 apps.risk.scoring.DEFAULTS
+RISK_SCORING = {}
+# 风险阈值告警的分级阈值、回差与冷却时间，未配置的项使用 apps.risk.alerts.DEFAULTS
+RISK_ALERTS = {}
+# 风险看板缓存秒数，评分批次与告警变更提交后立即失效，过期时间只作兜底
+RISK_DASHBOARD_CACHE_SECONDS = env.int('RISK_DASHBOARD_CACHE_SECONDS', default=300)
+# 项目被标记待重算后延迟该秒数批量重算，窗口内的重复标记合并为一次
+RISK_RECOMPUTE_DEBOUNCE_SECONDS = env.int('RISK_RECOMPUTE_DEBOUNCE_SECONDS', default=30)
+# 风险分历史：小时 / 天粒度的保留天数，周粒度长期保留
+RISK_HISTORY_HOUR_DAYS = env.int('RISK_HISTORY_HOUR_DAYS', default=7)
+RISK_HISTORY_DAY_DAYS = env.int('RISK_HISTORY_DAY_DAYS', default=180)
 
 # Constance（动态配置）
 CONSTANCE_BACKEND = 'constance.backends.database.DatabaseBackend'
@@ -134,6 +180,13 @@ CONSTANCE_CONFIG = {
     'SENDER_EMAIL': ('noreply@example.com', '发送人邮箱'),
     'SONAR_HOST_URL': ('http://localhost:9000', 'SonarQube地址'),
     'SONAR_TOKEN': ('', 'SonarQube Token'),
+    # 构建调度：全局 / 单项目同时运行（含已派发）的构建数上限
+    'CICD_MAX_CONCURRENT_BUILDS': (20, '全局最大并发构建数', int),
+    'CICD_MAX_PROJECT_BUILDS': (3, '单项目最大并发构建数', int),
+    # 风险评分：综合分 = 代码质量分 × 权重 + 漏洞分 × 权重 + 流水线健康分 × 权重
+    'RISK_WEIGHT_CODE_QUALITY': (0.3, '代码质量分权重', float),
+    'RISK_WEIGHT_VULNERABILITY': (0.4, '漏洞风险分权重', float),
+    'RISK_WEIGHT_PIPELINE_HEALTH': (0.3, '流水线健康分权重', float),
     # 主题设置
     'LOGIN_THEME': ('default', '登录页面主题'),
     'HOME_THEME': ('default', '首页主题'),
@@ -54,11 +54,30 @@ export default {
   getRoles(params) { return apiClient.get('/roles/', { params }) },
   getPermissions(params) { return apiClient.get('/permissions/', { params }) },
 
+  // ========== 安全漏洞 ==========
+  uploadDependencyCheck(formData) { return apiClient.post('/vulnerabilities/scans/upload/', formData, { headers: { 'Content-Type': 'multipart/form-data' } }) },
+  batchUploadReports(formData) { return apiClient.post('/vulnerabilities/scans/batch_upload/', formData, { headers: { 'Content-Type': 'multipart/form-data' } }) },
+  getScanProgress(id) { return apiClient.get(`/vulnerabilities/scans/${id}/progress/`) },
+  getFindings(params) { return apiClient.get('/vulnerabilities/findings/', { params }) },
+  searchFindings(params) { return apiClient.get('/vulnerabilities/findings/search/', { params }) },
+  getProjectGraph(id, params) { return apiClient.get(`/vulnerabilities/graph/project/${id}/`, { params }) },
+  getArtifactGraph(id, params) { return apiClient.get(`/vulnerabilities/graph/artifact/${id}/`, { params }) },
+  getGraphNeighbourhood(params) { return apiClient.get('/vulnerabilities/graph/neighbourhood/', { params }) },
+  expandGraphNode(params) { return apiClient.get('/vulnerabilities/graph/expand/', { params }) },
+
   // ========== CI/CD ==========
   getPipelines(params) { return apiClient.get('/pipelines/', { params }) },
   getBuilds(params) { return apiClient.get('/builds/', { params }) },
   triggerPipeline(id, data) { return apiClient.post(`/pipelines/${id}/trigger/`, data) },
   cancelBuild(id) { return apiClient.post(`/builds/${id}/cancel/`) },
+  getBuildQueuePosition(id) { return apiClient.get(`/cicd/builds/${id}/queue/`) },
+  getBuildQueue() { return apiClient.get('/cicd/builds/queue/') },
+  getStageCacheStats(params) { return apiClient.get('/cicd/stage-cache/stats/', { params }) },
+  clearStageCache(params) { return apiClient.delete('/cicd/stage-cache/clear/', { params }) },
+  getPipelineHealthTrends(params) { return apiClient.get('/cicd/health/trends/', { params }) },
+  getPipelineHealthSummary(params) { return apiClient.get('/cicd/health/summary/', { params }) },
+  getBuildLog(id, params) { return apiClient.get(`/cicd/builds/${id}/log/`, { params }) },
+  buildLogStreamUrl(id, offset = 0) { return `${apiClient.defaults.baseURL}/cicd/builds/${id}/log/stream/?offset=${offset}` },
 
   // ========== 风险 ==========
   getRiskProfiles(params) { return apiClient.get('/risk/profiles/', { params }) },